@@ -0,0 +1,312 @@
+from __future__ import annotations
+
+import getopt
+import glob
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+from typing import Callable, List, Tuple
+
+from lib.hal_backend import select_simulated_hal
+
+# NOTE: the benchmark always runs on the simulated hardware (selected before the hardware modules are imported)
+select_simulated_hal()
+
+from app.cnc_programmer.cnc_runner import CNCRunner
+from app.cnc_programmer.config.config import CNCProgrammerConfig
+from app.cnc_programmer.config.config_parser import CNCProgrammerConfigParser
+from app.cnc_programmer.config.firmware import FirmwareConfig
+from app.cnc_programmer.config.plate import PlateConfig
+from app.cnc_programmer.dps_log import DPSLog
+from app.cnc_programmer.icsp import ICSPProgrammer
+from app.cnc_programmer.simulation import SimulatedDPS
+from lib.pipeline import simulate_plate
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+RESOURCES_DIR = f"{ROOT_DIR}/resources"
+
+# End-to-end plate cycle benchmark on the simulated board:
+# full CNCRunner.cycle for every plate and firmware of the config files, wall time split into phases
+#   python -m app.cnc_programmer.benchmark [-d] [-c config.conf] [-r rows] [--columns columns] [-k heads] [-p] [--pipeline-model]
+#                                          [-o results.json] [--compare previous.json]
+
+# phases of the cycle (the time of a phase excludes the time of the phases nested in it),
+# NOTE: the time of the phases running in other threads (e.g. the offset calibration during the motion) overlaps the motion
+PHASE_MOTION = "motion"
+PHASE_PREPARE_DPS = "prepare_dps"
+PHASE_PROGRAMMING = "programming"
+PHASE_ADC = "adc"
+PHASE_BUTTON = "button"
+PHASE_TESTING = "testing"  # the rest of the DPS test (fixed settle sleeps)
+PHASE_OTHER = "other"
+
+# pipeline model: the measured phases of a run replayed by the pipeline scheduler with the resources of other stage layouts
+# (time scaled down), e.g. a second test station where the DPS stay powered while the fixture moves on
+STAGE_PHASES: dict[str, Tuple[str, ...]] = {
+    CNCRunner.STAGE_MOTION: (PHASE_MOTION,),
+    CNCRunner.STAGE_PROGRAM: (PHASE_PREPARE_DPS, PHASE_PROGRAMMING),
+    CNCRunner.STAGE_MEASURE: (PHASE_ADC, PHASE_BUTTON, PHASE_TESTING),
+    CNCRunner.STAGE_REPORT: (PHASE_OTHER,),
+}
+PIPELINE_LAYOUTS: dict[str, dict[str, Tuple[str, ...]]] = {
+    "serial": {stage: ("cycle",) for stage in STAGE_PHASES},
+    "fixture": dict(CNCRunner.PIPELINE_STAGES),
+    "test station": {
+        CNCRunner.STAGE_MOTION: (CNCRunner.RESOURCE_FIXTURE,),
+        CNCRunner.STAGE_PROGRAM: (CNCRunner.RESOURCE_FIXTURE, CNCRunner.RESOURCE_POWER),
+        CNCRunner.STAGE_MEASURE: ("station", "station_adc"),
+        CNCRunner.STAGE_REPORT: (),
+    },
+}
+PIPELINE_MODEL_TIME_SCALE: float = 0.01
+
+
+class PhaseProfiler:
+    # Wall time of the phases, measured by wrapping the methods of the runner's components
+
+    def __init__(self) -> None:
+        self.totals_s: dict[str, float] = {}
+        # (phase, start, time of the nested phases) of every thread
+        self.stacks: threading.local = threading.local()
+
+    def instrument(self, obj: object, method_name: str, phase: str) -> None:
+        method: Callable = getattr(obj, method_name)
+
+        def timed(*args, **kwargs):
+            if not hasattr(self.stacks, "stack"):
+                self.stacks.stack = []
+            stack: List[List] = self.stacks.stack
+            stack.append([phase, time.perf_counter(), 0.0])
+            try:
+                return method(*args, **kwargs)
+            finally:
+                _, start, nested_s = stack.pop()
+                elapsed_s: float = time.perf_counter() - start
+                self.totals_s[phase] = self.totals_s.get(phase, 0.0) + elapsed_s - nested_s
+                if stack:
+                    stack[-1][2] += elapsed_s
+
+        setattr(obj, method_name, timed)
+
+    def snapshot(self) -> dict[str, float]:
+        return dict(self.totals_s)
+
+
+class HeadlessController:
+    # Replaces the GUI controller of the runner, records the time of every processed DPS
+
+    def __init__(self, on_dps_log: Callable[[DPSLog], None]) -> None:
+        self.on_dps_log: Callable[[DPSLog], None] = on_dps_log
+
+    def ex_evt_update_current_pos(self, x: int, y: int) -> None:
+        pass
+
+    def ex_evt_update_current_pos_mm(self, pos_mm: [float, float, float]) -> None:
+        pass
+
+    def ex_evt_update_state(self, state) -> None:
+        pass
+
+    def ex_evt_update_dps_log(self, dps_log: DPSLog) -> None:
+        self.on_dps_log(dps_log)
+
+    def ex_evt_automatic_cycle_completed(self) -> None:
+        pass
+
+    def ex_evt_process_completed(self) -> None:
+        pass
+
+
+def _resolve_firmware_path(firmware_config: FirmwareConfig) -> str:
+    # config files contain the paths of the Raspberry Pi, fall back to the firmware of the same name in the resources
+    if os.path.isfile(os.path.expanduser(firmware_config.path)):
+        return firmware_config.path
+    return f"{RESOURCES_DIR}/{os.path.basename(firmware_config.path)}"
+
+
+def _phase_delta(after: dict[str, float], before: dict[str, float]) -> dict[str, float]:
+    return {phase: after.get(phase, 0.0) - before.get(phase, 0.0) for phase in after if after.get(phase, 0.0) - before.get(phase, 0.0) > 0}
+
+
+def run_plate_cycle(config: CNCProgrammerConfig, plate_config: PlateConfig, firmware_config: FirmwareConfig, heads: int | None = None,
+                    pipeline: bool | None = None) -> dict:
+    # heads, pipeline: heads of the fixture and the pipelined cycle, those of the config when None
+    runner = CNCRunner()
+    runner.set_config(config)
+    if heads is not None:
+        if heads > 1:
+            # the heads are programmed over their own ICSP pins
+            runner.set_programmer(ICSPProgrammer.NAME)
+        runner.set_heads(heads)
+    if pipeline is not None:
+        runner.pipeline = pipeline
+    runner.selected_plate_config = plate_config
+    # the simulated fixture has the heads at the column spacing of the plate
+    runner.head_pitch_mm = plate_config.x_spacing
+    runner.selected_firmware_config = firmware_config
+    runner.programmer.set_config(config.pickle_default_path, _resolve_firmware_path(firmware_config))
+    simulated_dps: List[SimulatedDPS] = [SimulatedDPS(lambda: runner.selected_firmware_config.type, pins=head.board.pins, adc_address=head.board.adc_address)
+                                           for head in runner.heads]
+
+    profiler = PhaseProfiler()
+    for method_name in ("execute_segments", "go_to_pos_mm", "go_to_pos_mm_xyz", "move"):
+        profiler.instrument(runner.stepper_driver, method_name, PHASE_MOTION)
+    profiler.instrument(runner.tester, "prepare_dps", PHASE_PREPARE_DPS)
+    profiler.instrument(runner.programmer, "load", PHASE_PROGRAMMING)
+    profiler.instrument(runner.programmer, "verify", PHASE_PROGRAMMING)
+    profiler.instrument(runner.tester, "test_dps_flash", PHASE_TESTING)
+    profiler.instrument(runner.tester, "test_dps_maxonly", PHASE_TESTING)
+    profiler.instrument(runner.board, "dps_button_hold", PHASE_BUTTON)
+    for method_name in dir(runner.tester.adc):
+        if method_name.startswith("measure_"):
+            profiler.instrument(runner.tester.adc, method_name, PHASE_ADC)
+
+    dps_results: List[dict] = []
+    last: List = [time.perf_counter(), profiler.snapshot()]
+
+    def on_dps_log(dps_log: DPSLog) -> None:
+        now, phases = time.perf_counter(), profiler.snapshot()
+        dps_phases: dict[str, float] = _phase_delta(phases, last[1])
+        dps_phases[PHASE_OTHER] = (now - last[0]) - sum(dps_phases.values())
+        dps_results.append({"x": dps_log.x, "y": dps_log.y, "time_s": now - last[0], "passed": bool(dps_log.operation_successful), "phases_s": dps_phases})
+        last[:] = [now, phases]
+
+    runner.set_controller(HeadlessController(on_dps_log))
+    runner.set_in_automatic_cycle(0, 0)
+    start: float = time.perf_counter()
+    runner.cycle(0, 0)
+    plate_time_s: float = time.perf_counter() - start
+    runner.board.deinit()
+    for dps in simulated_dps:
+        dps.disconnect()
+
+    phases: dict[str, float] = profiler.snapshot()
+    phases[PHASE_OTHER] = plate_time_s - sum(phases.values())
+    return {
+        "plate": plate_config.name,
+        "firmware": firmware_config.name,
+        "heads": len(runner.heads),
+        "pipeline": runner.pipeline,
+        "plunges": len(runner.generate_position_sequence(0, 0)),
+        "positions": len(dps_results),
+        "plate_time_s": plate_time_s,
+        "plates_per_hour": 3600 / plate_time_s,
+        "dps_time_s": plate_time_s / max(len(dps_results), 1),
+        "phases_s": phases,
+        "dps": dps_results,
+    }
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def model_pipelines(run: dict) -> dict[str, float]:
+    # plate time [s] of every layout of PIPELINE_LAYOUTS, the stages of a plunge take the mean time of their phases in the run
+    stage_durations_s: dict[str, float] = {stage: sum(run["phases_s"].get(phase, 0.0) for phase in phases) / run["plunges"] * PIPELINE_MODEL_TIME_SCALE
+                                           for stage, phases in STAGE_PHASES.items()}
+    return {layout: simulate_plate(stage_durations_s, resources, run["plunges"]) / PIPELINE_MODEL_TIME_SCALE for layout, resources in PIPELINE_LAYOUTS.items()}
+
+
+def run_benchmark(config_paths: List[str], rows: int | None = None, columns: int | None = None, heads: int | None = None,
+                  pipeline: bool | None = None, pipeline_model: bool = False) -> dict:
+    runs: List[dict] = []
+    for config_path in config_paths:
+        config: CNCProgrammerConfig = CNCProgrammerConfigParser(config_path).parse_config()
+        for plate_config in config.plate_configs.values():
+            if rows is not None or columns is not None:
+                # smaller (or wider) plate (the same snake pattern), plates per hour are those of this plate
+                plate_config = PlateConfig(plate_config.name, plate_config.columns if columns is None else columns,
+                                           plate_config.rows if rows is None else min(rows, plate_config.rows),
+                                           plate_config.x_offset, plate_config.y_offset, plate_config.x_spacing, plate_config.y_spacing)
+            for firmware_config in config.firmware_configs.values():
+                logging.info(f"[BENCHMARK]: {os.path.basename(config_path)}: plate {plate_config.name}, firmware {firmware_config.name}")
+                run: dict = run_plate_cycle(config, plate_config, firmware_config, heads, pipeline)
+                run["config"] = os.path.basename(config_path)
+                if pipeline_model:
+                    run["pipeline_model_s"] = model_pipelines(run)
+                runs.append(run)
+    return {"revision": _git_revision(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "rows": rows, "columns": columns, "heads": heads, "pipeline": pipeline, "runs": runs}
+
+
+def print_results(results: dict, previous: dict | None = None) -> None:
+    # previous: results of another version, the differences are printed next to the values
+    previous_runs: dict[Tuple[str, str, str], dict] = {} if previous is None else {
+        (run["config"], run["plate"], run["firmware"]): run for run in previous["runs"]}
+
+    for run in results["runs"]:
+        previous_run: dict | None = previous_runs.get((run["config"], run["plate"], run["firmware"]))
+
+        def delta(value: float, previous_value: float | None) -> str:
+            return "" if previous_value is None else f"({value - previous_value:+.2f})"
+
+        print(f"{run['config']}: plate {run['plate']}, firmware {run['firmware']}, {run['positions']} positions, {run.get('heads', 1)} heads"
+              f"{', pipelined' if run.get('pipeline') else ''}")
+        print("  {:<14}{:>10.2f} s {}".format("plate", run["plate_time_s"], delta(run["plate_time_s"], previous_run and previous_run["plate_time_s"])))
+        print("  {:<14}{:>10.2f} s {}".format("per DPS", run["dps_time_s"], delta(run["dps_time_s"], previous_run and previous_run["dps_time_s"])))
+        print("  {:<14}{:>10.2f}   {}".format("plates/hour", run["plates_per_hour"], delta(run["plates_per_hour"], previous_run and previous_run["plates_per_hour"])))
+        for phase, phase_s in sorted(run["phases_s"].items(), key=lambda item: -item[1]):
+            previous_phase_s: float | None = previous_run["phases_s"].get(phase, 0.0) if previous_run else None
+            print("    {:<12}{:>10.2f} s {:>5.1f} % {}".format(phase, phase_s, 100 * phase_s / run["plate_time_s"], delta(phase_s, previous_phase_s)))
+        if "pipeline_model_s" in run:
+            print("  pipeline model (plate time)")
+            for layout, plate_time_s in run["pipeline_model_s"].items():
+                print("    {:<12}{:>10.2f} s {:>7.1f} plates/hour".format(layout, plate_time_s, 3600 / plate_time_s))
+
+
+def main(argv):
+    logging.getLogger().setLevel(logging.WARNING)
+    try:
+        opts, args = getopt.getopt(argv, "hdc:r:k:po:", ["help", "debug", "config=", "rows=", "columns=", "heads=", "pipeline", "pipeline-model", "output=", "compare="])
+    except getopt.GetoptError:
+        sys.exit(2)
+
+    config_paths: List[str] = []
+    rows: int | None = None
+    columns: int | None = None
+    heads: int | None = None
+    pipeline: bool | None = None
+    pipeline_model: bool = False
+    output_path: str | None = None
+    previous: dict | None = None
+    for opt, arg in opts:
+        if opt in ("-h", "--help"):
+            print("python -m app.cnc_programmer.benchmark [-d] [-c config.conf] [-r rows] [--columns columns] [-k heads] [-p] [--pipeline-model] "
+                  "[-o results.json] [--compare previous.json]")
+            sys.exit(0)
+        elif opt in ("-d", "--debug"):
+            logging.getLogger().setLevel(logging.INFO)
+        elif opt in ("-c", "--config"):
+            config_paths.append(arg)
+        elif opt in ("-r", "--rows"):
+            rows = int(arg)
+        elif opt == "--columns":
+            columns = int(arg)
+        elif opt in ("-k", "--heads"):
+            heads = int(arg)
+        elif opt in ("-p", "--pipeline"):
+            pipeline = True
+        elif opt == "--pipeline-model":
+            pipeline_model = True
+        elif opt in ("-o", "--output"):
+            output_path = arg
+        elif opt == "--compare":
+            with open(arg) as previous_file:
+                previous = json.load(previous_file)
+
+    results: dict = run_benchmark(config_paths or sorted(glob.glob(f"{RESOURCES_DIR}/*.conf")), rows, columns, heads, pipeline, pipeline_model)
+    print_results(results, previous)
+    if output_path is not None:
+        with open(output_path, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
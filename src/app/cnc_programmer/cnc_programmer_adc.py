@@ -1,12 +1,95 @@
 from __future__ import annotations
 
 import time
-
-import adafruit_ads1x15.ads1115 as ADS
-from adafruit_ads1x15.analog_in import AnalogIn
+import unittest
+from enum import Enum
 
 from app.cnc_programmer.rpi_board import RPiBoard
-from lib.adc import ADC, GAIN
+from lib.adc import ADC, GAIN, MeasurementPlan, MeasurementResult, SequentialTest, lsb_V
+from lib.hal import ADS, AnalogIn
+from lib.tracing import tracer
+
+
+class Quantity(Enum):
+    BUTTON_LED_VOLTAGE = "button_led_voltage"
+    R_FEEDBACK_VOLTAGE = "r_feedback_voltage"
+    ACS723_VOLTAGE = "acs723_voltage"
+    LED_CURRENT_ON_ACS723 = "led_current_on_acs723"
+    SHUNT_VOLTAGE = "shunt_voltage"
+    LED_CURRENT_ON_SHUNT = "led_current_on_shunt"
+
+
+class DPSMeasurement:
+    # Quantities of one measurement plan (CNCProgrammerADC.measure_all), None when not measured
+
+    def __init__(self, result: MeasurementResult, acs723_voltage_offset_mV: float) -> None:
+        self._result: MeasurementResult = result
+        self._acs723_voltage_offset_mV: float = acs723_voltage_offset_mV
+
+    @property
+    def result(self) -> MeasurementResult:
+        return self._result
+
+    def _mV(self, name: str) -> float | None:
+        return self._result[name] * 1000 if name in self._result else None
+
+    @property
+    def button_led_voltage_mV(self) -> float | None:
+        return self._mV(CNCProgrammerADC.READING_BUTTON_LED)
+
+    @property
+    def r_feedback_voltage_mV(self) -> float | None:
+        return self._mV(CNCProgrammerADC.READING_FEEDBACK_RESISTOR)
+
+    @property
+    def acs723_voltage_mV(self) -> float | None:
+        return self._mV(CNCProgrammerADC.READING_ACS723)
+
+    @property
+    def led_current_on_acs723_mA(self) -> float | None:
+        acs723_voltage_mV: float | None = self.acs723_voltage_mV
+        if acs723_voltage_mV is None:
+            return None
+        return (acs723_voltage_mV - self._acs723_voltage_offset_mV) * CNCProgrammerADC.ACS723_VOLTAGE_TO_CURRENT_RATIO  # 2.5 A/V = 2500 mA/V
+
+    @property
+    def shunt_voltage_mV(self) -> float | None:
+        shunt_0_mV, shunt_1_mV = self._mV(CNCProgrammerADC.READING_SHUNT_0), self._mV(CNCProgrammerADC.READING_SHUNT_1)
+        if shunt_0_mV is None or shunt_1_mV is None:
+            return None
+        return shunt_0_mV - shunt_1_mV
+
+    @property
+    def led_current_on_shunt_mA(self) -> float | None:
+        shunt_voltage_mV: float | None = self.shunt_voltage_mV
+        return None if shunt_voltage_mV is None else shunt_voltage_mV / CNCProgrammerADC.SHUNT_RESISTENCE
+
+    @property
+    def samples(self) -> int:
+        # samples taken by the plan
+        return sum(self._result.samples.values())
+
+    def standard_error(self, quantity: Quantity) -> float | None:
+        # standard error of the value of the quantity (in its unit), None for the quantities of several readings
+        readings: [str] = CNCProgrammerADC.QUANTITY_READING.get(quantity)
+        if readings is None or readings not in self._result.standard_errors:
+            return None
+        return self._result.standard_errors[readings] * CNCProgrammerADC.QUANTITY_SCALES[quantity]
+
+    def sample_count(self, quantity: Quantity) -> int | None:
+        # samples the value of the quantity is averaged from, None for the quantities of several readings
+        reading: str | None = CNCProgrammerADC.QUANTITY_READING.get(quantity)
+        return None if reading is None else self._result.samples.get(reading)
+
+    def value(self, quantity: Quantity) -> float | None:
+        return {
+            Quantity.BUTTON_LED_VOLTAGE: lambda: self.button_led_voltage_mV,
+            Quantity.R_FEEDBACK_VOLTAGE: lambda: self.r_feedback_voltage_mV,
+            Quantity.ACS723_VOLTAGE: lambda: self.acs723_voltage_mV,
+            Quantity.LED_CURRENT_ON_ACS723: lambda: self.led_current_on_acs723_mA,
+            Quantity.SHUNT_VOLTAGE: lambda: self.shunt_voltage_mV,
+            Quantity.LED_CURRENT_ON_SHUNT: lambda: self.led_current_on_shunt_mA,
+        }[quantity]()
 
 
 class CNCProgrammerADC(ADC):
@@ -25,8 +108,30 @@ class CNCProgrammerADC(ADC):
     R_FEEDBACK_CHANNEL: int = ADS.P2
     BUTTON_LED_CHANNEL: int = ADS.P3
 
+    # readings of the measurement plans
+    READING_BUTTON_LED: str = "button_led"
+    READING_FEEDBACK_RESISTOR: str = "feedback_resistor"
+    READING_ACS723: str = "acs723_D"
+    READING_SHUNT_0: str = "shunt_0"
+    READING_SHUNT_1: str = "shunt_1"
+
+    # quantities of one reading: value = scale * voltage [V] + offset
+    QUANTITY_READING: dict[Quantity, str] = {
+        Quantity.BUTTON_LED_VOLTAGE: READING_BUTTON_LED,
+        Quantity.R_FEEDBACK_VOLTAGE: READING_FEEDBACK_RESISTOR,
+        Quantity.ACS723_VOLTAGE: READING_ACS723,
+        Quantity.LED_CURRENT_ON_ACS723: READING_ACS723,
+    }
+    QUANTITY_SCALES: dict[Quantity, float] = {
+        Quantity.BUTTON_LED_VOLTAGE: 1000,
+        Quantity.R_FEEDBACK_VOLTAGE: 1000,
+        Quantity.ACS723_VOLTAGE: 1000,
+        Quantity.LED_CURRENT_ON_ACS723: 1000 * ACS723_VOLTAGE_TO_CURRENT_RATIO,
+    }
+
     def __init__(self, board: RPiBoard) -> None:
-        super().__init__(board)
+        # the ADS1115 of the head of the board
+        super().__init__(board, board.adc_address)
 
         self.channel_acs723_D: AnalogIn = AnalogIn(self.adc, CNCProgrammerADC.ACS723_OUTPUT_CHANNEL, CNCProgrammerADC.REFERENCE_CHANNEL)
         # self.channel_acs723: AnalogIn = AnalogIn(self.adc, ADC.ACS723_OUTPUT_CHANNEL)
@@ -42,62 +147,125 @@ class CNCProgrammerADC(ADC):
         # self.channel_ref2: AnalogIn = AnalogIn(self.adc, ADC.REFERENCE_CHANNEL)
         self.acs723_voltage_offset_mV: float = CNCProgrammerADC.DEFAULT_ACS723_VOLTAGE_OFFSET_MV
 
+        # quantity --> readings (name, channel, gain)
+        self.quantity_readings: dict[Quantity, [(str, AnalogIn, float)]] = {
+            Quantity.BUTTON_LED_VOLTAGE: [(CNCProgrammerADC.READING_BUTTON_LED, self.channel_button_led, GAIN.GAIN_23.value)],
+            Quantity.R_FEEDBACK_VOLTAGE: [(CNCProgrammerADC.READING_FEEDBACK_RESISTOR, self.channel_feedback_resistor, GAIN.GAIN_8.value)],
+            Quantity.ACS723_VOLTAGE: [(CNCProgrammerADC.READING_ACS723, self.channel_acs723_D, GAIN.GAIN_8.value)],
+            Quantity.LED_CURRENT_ON_ACS723: [(CNCProgrammerADC.READING_ACS723, self.channel_acs723_D, GAIN.GAIN_8.value)],
+            Quantity.SHUNT_VOLTAGE: [(CNCProgrammerADC.READING_SHUNT_0, self.channel_shunt_0, GAIN.GAIN_1.value),
+                                     (CNCProgrammerADC.READING_SHUNT_1, self.channel_shunt_1, GAIN.GAIN_4.value)],
+        }
+        self.quantity_readings[Quantity.LED_CURRENT_ON_SHUNT] = self.quantity_readings[Quantity.SHUNT_VOLTAGE]
+
+        # (min samples, max samples) of the sequential sampling, None --> SAMPLES_TO_AVERAGE samples
+        self.sequential_samples: (int, int) | None = None
+
+    def set_sequential_sampling(self, enabled: bool, min_samples: int, max_samples: int) -> None:
+        self.sequential_samples = (min_samples, max_samples) if enabled else None
+
+    def _quantity_offset(self, quantity: Quantity) -> float:
+        if quantity == Quantity.LED_CURRENT_ON_ACS723:
+            return -self.acs723_voltage_offset_mV * CNCProgrammerADC.ACS723_VOLTAGE_TO_CURRENT_RATIO
+        return 0.0
+
+    def _create_sequential_test(self, quantity: Quantity, limits: (float, float)) -> SequentialTest | None:
+        # the limits of the quantity converted to the voltage of its reading
+        if self.sequential_samples is None or quantity not in CNCProgrammerADC.QUANTITY_SCALES:
+            return None
+        scale, offset = CNCProgrammerADC.QUANTITY_SCALES[quantity], self._quantity_offset(quantity)
+        lsb: float = max(lsb_V(gain) for _, _, gain in self.quantity_readings[quantity])
+        return SequentialTest(((limits[0] - offset) / scale, (limits[1] - offset) / scale), *self.sequential_samples, lsb=lsb)
+
+    def create_plan(self, *quantities: Quantity, limits: dict[Quantity, (float, float)] | None = None) -> MeasurementPlan:
+        # limits: the quantities with limits are sampled sequentially when enabled (see set_sequential_sampling)
+        plan: MeasurementPlan = MeasurementPlan()
+        for quantity in quantities:
+            test: SequentialTest | None = None if limits is None or quantity not in limits else self._create_sequential_test(quantity, limits[quantity])
+            for name, channel, gain in self.quantity_readings[quantity]:
+                plan.add(name, channel, gain, CNCProgrammerADC.SAMPLES_TO_AVERAGE, test)
+        return plan
+
+    @tracer.traced("adc")
+    def measure_all(self, *quantities: Quantity, limits: dict[Quantity, (float, float)] | None = None) -> DPSMeasurement | None:
+        # all the quantities in one pass (grouped by the gain and inputs, see MeasurementPlan)
+        if self.adc is None: return None
+
+        return DPSMeasurement(self.execute_plan(self.create_plan(*quantities, limits=limits)), self.acs723_voltage_offset_mV)
+
+    @tracer.traced("adc")
     def measure_voltage_on_shunt_mV(self) -> float | None:
         if self.adc is None: return None
 
-        self.set_adc_gain(GAIN.GAIN_1.value)
-        time.sleep(0.01)
-        chan0_voltage: float = self.measure_N_times(CNCProgrammerADC.SAMPLES_TO_AVERAGE, self.channel_shunt_0)
-        self.set_adc_gain(GAIN.GAIN_4.value)
-        time.sleep(0.01)
-        chan1_voltage: float = self.measure_N_times(CNCProgrammerADC.SAMPLES_TO_AVERAGE, self.channel_shunt_1)
-        return (chan0_voltage - chan1_voltage) * 1000
+        return self.measure_all(Quantity.SHUNT_VOLTAGE).shunt_voltage_mV
 
+    @tracer.traced("adc")
     def measure_led_current_on_shunt_mA(self) -> float | None:
         if self.adc is None: return None
 
-        return self.measure_voltage_on_shunt_mV() / CNCProgrammerADC.SHUNT_RESISTENCE
+        return self.measure_all(Quantity.LED_CURRENT_ON_SHUNT).led_current_on_shunt_mA
 
+    @tracer.traced("adc")
     def measure_voltage_on_acs723_mV(self) -> float | None:
         if self.adc is None: return None
 
-        self.set_adc_gain(GAIN.GAIN_8.value)
-        time.sleep(0.01)
-        chan01_D_voltage: float = self.measure_N_times(CNCProgrammerADC.SAMPLES_TO_AVERAGE, self.channel_acs723_D)
-        # self.set_adc_gain(GAIN.GAIN_23.value)
-        # chan3_voltage: float = self.measure_N_times(ADC.SAMPLES_TO_AVERAGE, self.channel_vdd)
-        # time.sleep(0.01)
-        return chan01_D_voltage * 1000
-
-        # self.set_adc_gain(GAIN.GAIN_1.value)
-        # time.sleep(0.01)
-        # chan2_voltage: float = self.measure_N_times(ADC.SAMPLES_TO_AVERAGE, self.channel_acs723)
-        # print(chan2_voltage)
-        # chan3_voltage: float = self.measure_N_times(ADC.SAMPLES_TO_AVERAGE, self.channel_ref2)
-        # print(chan3_voltage)
-        #
-        # return (chan2_voltage - chan3_voltage) * 1000
+        return self.measure_all(Quantity.ACS723_VOLTAGE).acs723_voltage_mV
 
+    @tracer.traced("adc")
     def measure_led_current_on_acs723_mA(self) -> float | None:
         if self.adc is None: return None
 
-        return (self.measure_voltage_on_acs723_mV() - self.acs723_voltage_offset_mV) * CNCProgrammerADC.ACS723_VOLTAGE_TO_CURRENT_RATIO  # 2.5 A/V = 2500 mA/V
+        return self.measure_all(Quantity.LED_CURRENT_ON_ACS723).led_current_on_acs723_mA
 
+    @tracer.traced("adc")
     def measure_voltage_on_feedback_resistor_mV(self) -> float | None:
         if self.adc is None: return None
 
-        self.set_adc_gain(GAIN.GAIN_8.value)
-        time.sleep(0.01)
-        chan1_voltage: float = self.measure_N_times(CNCProgrammerADC.SAMPLES_TO_AVERAGE, self.channel_feedback_resistor)
-        return chan1_voltage * 1000
+        return self.measure_all(Quantity.R_FEEDBACK_VOLTAGE).r_feedback_voltage_mV
 
+    @tracer.traced("adc")
     def measure_voltage_on_button_led_mV(self) -> float | None:
         if self.adc is None: return None
 
-        self.set_adc_gain(GAIN.GAIN_23.value)
-        time.sleep(0.01)
-        chan0_voltage: float = self.measure_N_times(CNCProgrammerADC.SAMPLES_TO_AVERAGE, self.channel_button_led)
-        return chan0_voltage * 1000
+        return self.measure_all(Quantity.BUTTON_LED_VOLTAGE).button_led_voltage_mV
+
+
+class TestCNCProgrammerADC(unittest.TestCase):
+    # NOTE: runs on the simulated hardware (SCILIF_HAL=simulated python -m unittest app.cnc_programmer.cnc_programmer_adc)
+
+    def setUp(self):
+        from app.cnc_programmer.dps_mode import FirmwareType
+        from app.cnc_programmer.simulation import SimulatedDPS
+        self.dps = SimulatedDPS(lambda: FirmwareType.MAX_ONLY, noise_V=0.0)
+        self.board = RPiBoard(stepper=False)
+        self.board.dps_activate()
+        self.adc = CNCProgrammerADC(self.board)
+
+    def tearDown(self):
+        self.board.dps_inactivate()
+        self.dps.disconnect()
+
+    def test_measure_all(self):
+        self.adc.set_adc_gain(GAIN.GAIN_1.value)
+        measurement = self.adc.measure_all(Quantity.BUTTON_LED_VOLTAGE, Quantity.R_FEEDBACK_VOLTAGE, Quantity.LED_CURRENT_ON_ACS723)
+        # GAIN_23 and GAIN_8 (feedback resistor and ACS723 together)
+        self.assertEqual(measurement.result.gain_switches, 2)
+        self.assertAlmostEqual(measurement.button_led_voltage_mV, self.adc.measure_voltage_on_button_led_mV(), delta=5)
+        self.assertAlmostEqual(measurement.r_feedback_voltage_mV, self.adc.measure_voltage_on_feedback_resistor_mV(), delta=1)
+        self.assertAlmostEqual(measurement.led_current_on_acs723_mA, self.adc.measure_led_current_on_acs723_mA(), delta=10)
+        self.assertIsNone(measurement.shunt_voltage_mV)
+
+    def test_sequential_sampling(self):
+        self.adc.set_sequential_sampling(True, 3, 30)
+        # far inside, out of the limits, on the limit (the simulated button LED voltage is 2300 mV)
+        # (at least SequentialTest.MIN_SAMPLES samples)
+        for limits, samples in (((2000, 2600), 5), ((100, 200), 5), ((2300, 2600), 30)):
+            measurement = self.adc.measure_all(Quantity.BUTTON_LED_VOLTAGE, limits={Quantity.BUTTON_LED_VOLTAGE: limits})
+            self.assertEqual(measurement.samples, samples)
+            self.assertEqual(measurement.sample_count(Quantity.BUTTON_LED_VOLTAGE), samples)
+            # noiseless simulation: the quantization noise of the GAIN_23 LSB (0.1875 mV)
+            self.assertAlmostEqual(measurement.standard_error(Quantity.BUTTON_LED_VOLTAGE), 0.1875 / 12 ** 0.5, delta=0.001)
+
 
 def test2():
 
@@ -1,31 +1,55 @@
 from __future__ import annotations
 
 import logging
+import os
+import queue
 import threading
 import time
+import unittest
+from concurrent.futures import Future, ThreadPoolExecutor
 from subprocess import CompletedProcess
-from typing import List, Tuple
+from typing import TYPE_CHECKING, Callable, List, Tuple
 
 from app.cnc_programmer.config.config import CNCProgrammerConfig
 from app.cnc_programmer.config.config_parser import CNCProgrammerConfigParser
 from app.cnc_programmer.config.firmware import FirmwareConfig
+from app.cnc_programmer.config.head import HeadConfig
 from app.cnc_programmer.config.plate import PlateConfig
 from app.cnc_programmer.dps_log import DPSLog
 from app.cnc_programmer.dps_mode import FirmwareType
-from app.cnc_programmer.dps_programmer import DPSProgrammer
-from app.cnc_programmer.gui.gui_controller import GUIController
-from app.cnc_programmer.rpi_board import RPiBoard
+from app.cnc_programmer.dps_programmer import DPSProgrammer, ProgrammingFailure, classify_programming_failure, create_dps_programmer
+from app.cnc_programmer.fixture import FixtureHead
+from app.cnc_programmer.icsp import ICSPProgrammer
+from app.cnc_programmer.orchestrator import ORCHESTRATION_ASYNCIO, ORCHESTRATION_THREADS, ORCHESTRATIONS, CycleOrchestrator
+from app.cnc_programmer.rpi_board import HeadPins, RPiBoard
+from app.cnc_programmer.stepper.motion_planner import MotionPlanner, MotionSegment
+from app.cnc_programmer.stepper.motion_process import MotionProcess
 from app.cnc_programmer.stepper.position import Axis
 from app.cnc_programmer.stepper.state import CNCRunnerState
 from app.cnc_programmer.stepper.stepper_driver import StepperDriver
 from app.cnc_programmer.tester import Tester
+from lib.pipeline import PipelineScheduler, PipelineStage
+from lib.tracing import tracer
+
+if TYPE_CHECKING:
+    # NOTE: the runner does not depend on the GUI (e.g. headless benchmarks)
+    from app.cnc_programmer.gui.gui_controller import GUIController
 
 
 # from app.cnc_programmer.gui.gui import GUIController
 
 ## LEVEL 2 PRIORITIES ##
 # TODO: logging
-# TODO: RUN as process
+
+
+class Plunge:
+    # one stop of the fixture in the cycle: the position of the first head, the hop to it and the DPS logs of the heads
+
+    def __init__(self, position: Tuple[int, int], segments: List[MotionSegment]) -> None:
+        self.position: Tuple[int, int] = position
+        self.segments: List[MotionSegment] = segments
+        self.dps_logs: List[DPSLog] = []
+
 
 class CNCRunner:
 
@@ -33,11 +57,52 @@ class CNCRunner:
     DEFAULT_Z_SAFE_HEIGHT = 8  #z position when an initial lift is undertaken or verification from operator is needed
     DEFAULT_SPEED = 100
 
-    def __init__(self) -> None:
-        self.board = RPiBoard()
-        self.stepper_driver = StepperDriver(self.board)
+    MOTION_PROCESS_PRIORITY = 50  # SCHED_FIFO priority of the motion process
+
+    # re-seat of the head between programming attempts: lift in Z and land again
+    RESEAT_LIFT_MM = 2.0
+    RESEAT_SETTLE_S = 0.1
+
+    # stages of the pipelined cycle and the shared hardware they hold: a plunge holds a resource from the first to the last
+    # of its stages using it (see lib.pipeline), the fixture stays on the DPS from the motion to the end of the measurement
+    # and the ADC calibrates the offset during the motion --> the report of a plunge overlaps the hop to the next one
+    RESOURCE_FIXTURE = "fixture"  # the heads (contact with the DPS under them)
+    RESOURCE_POWER = "power"  # DPS power pins of the heads
+    RESOURCE_ADC = "adc"  # ADS1115 of the heads
+    STAGE_MOTION = "motion"
+    STAGE_PROGRAM = "program"
+    STAGE_MEASURE = "measure"
+    STAGE_REPORT = "report"
+    PIPELINE_STAGES: ((str, (str, ...)), ...) = (
+        (STAGE_MOTION, (RESOURCE_FIXTURE, RESOURCE_ADC)),
+        (STAGE_PROGRAM, (RESOURCE_FIXTURE, RESOURCE_POWER)),
+        (STAGE_MEASURE, (RESOURCE_FIXTURE, RESOURCE_POWER, RESOURCE_ADC)),
+        (STAGE_REPORT, ()),
+    )
+
+    # states with the head moving, the position is published at most every POSITION_UPDATE_S while in them
+    MOTION_STATES: (CNCRunnerState, ...) = (CNCRunnerState.MOVING_BY_STEP, CNCRunnerState.MOVING_HOME, CNCRunnerState.IN_AUTOMATIC_CYCLE)
+    POSITION_UPDATE_S: float = 1.0
+
+    # Chrome trace (timeline) of every plate run
+    TRACE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "traces")
+
+    def __init__(self, motion_process: bool = False, motion_cpu: int | None = None) -> None:
+        if motion_process:
+            # step loop runs in a separate process (stepper pins are owned by the process)
+            self.board = RPiBoard(stepper=False)
+            self.stepper_driver: StepperDriver | MotionProcess = MotionProcess(motion_cpu, CNCRunner.MOTION_PROCESS_PRIORITY)
+        else:
+            self.board = RPiBoard()
+            self.stepper_driver: StepperDriver | MotionProcess = StepperDriver(self.board)
         self.programmer = DPSProgrammer()
         self.tester = Tester(self.board)
+        # heads of the fixture, the first one is the board, programmer and tester above (see set_heads)
+        self.heads: List[FixtureHead] = [FixtureHead(0, self.board, self.programmer, self.tester)]
+        # created heads are kept when the number of heads decreases
+        self._head_cache: dict[int, FixtureHead] = {}
+        # distance of adjacent heads in X (see plate_heads)
+        self.head_pitch_mm: float = 0.0
 
         self.gui_controller: GUIController = None
 
@@ -46,7 +111,10 @@ class CNCRunner:
         self.selected_firmware_config: FirmwareConfig = None
         self.selected_plate_config: PlateConfig = None
 
-        self.state: CNCRunnerState = CNCRunnerState.STOPPED
+        # state changes are signalled by the condition and published to the subscribers (see subscribe)
+        self._state: CNCRunnerState = CNCRunnerState.STOPPED
+        self._state_changed: threading.Condition = threading.Condition()
+        self._state_subscribers: List[Callable[[CNCRunnerState], None]] = []
         self.current_cycle_pos: Tuple[int, int] = None
         #either [x,y] in mm if state is MOVING or [x,y] DPS if state is AUTOMATIC_CYCLE
         self.state_moving_params: dict[str, float | int | Axis] = {
@@ -57,21 +125,124 @@ class CNCRunner:
         self.dps_logs: dict[(int, int), DPSLog] = {}
 
         self.dps_under_test_running: bool = False
-
-        # threading
+        # stages of the cycle run by the pipeline scheduler (see PIPELINE_STAGES)
+        self.pipeline: bool = False
+        # the cycle is run by the worker (threads) or as a coroutine by the orchestrator (asyncio)
+        self.orchestration: str = ORCHESTRATION_THREADS
+        self.orchestrator: CycleOrchestrator = CycleOrchestrator(self)
+        self.last_trace_path: str | None = None
+
+        # threading: the worker executes the commands of the state transitions (set_moving, set_moving_home, set_in_automatic_cycle),
+        # None --> exit
+        self._commands: queue.Queue[CNCRunnerState | None] = queue.Queue()
         self.threads_should_run: bool = True
         self.worker_thread = threading.Thread(target=self.worker)
         self.pos_thread = threading.Thread(target=self.pos_worker)
         logging.info("[CNC]: Programmer was successfully initialized...")
 
     def set_controller(self, gui_controller: GUIController) -> None:
+        if self.gui_controller is not None:
+            self.unsubscribe(self.gui_controller.ex_evt_update_state)
         self.gui_controller = gui_controller
+        self.subscribe(gui_controller.ex_evt_update_state)
+
+    @property
+    def state(self) -> CNCRunnerState:
+        return self._state
+
+    @state.setter
+    def state(self, state: CNCRunnerState) -> None:
+        # the subscribers are called (in the thread changing the state) only when the state changes
+        with self._state_changed:
+            if state == self._state:
+                return
+            self._state = state
+            self._state_changed.notify_all()
+        for subscriber in list(self._state_subscribers):
+            subscriber(state)
+
+    def subscribe(self, subscriber: Callable[[CNCRunnerState], None]) -> None:
+        self._state_subscribers.append(subscriber)
+
+    def unsubscribe(self, subscriber: Callable[[CNCRunnerState], None]) -> None:
+        if subscriber in self._state_subscribers:
+            self._state_subscribers.remove(subscriber)
+
+    def wait_for_state(self, *states: CNCRunnerState, timeout_s: float | None = None) -> bool:
+        # False --> none of the states within the timeout
+        with self._state_changed:
+            return self._state_changed.wait_for(lambda: self._state in states, timeout_s)
+
+    def _post_command(self) -> None:
+        # the worker executes the command of the current state (unless the state changes before)
+        self._commands.put(self.state)
 
     def set_config(self, config: CNCProgrammerConfig) -> None:
+        # the whole config is validated first, a rejected config (ValueError) leaves the runner as it was
+        if config.programmer not in (DPSProgrammer.NAME, ICSPProgrammer.NAME):
+            raise ValueError(f"Unknown programmer: {config.programmer}")
+        CNCRunner.check_heads(config.heads, config.programmer, config.head_configs)
+        if config.orchestration not in ORCHESTRATIONS:
+            raise ValueError(f"Unknown orchestration: {config.orchestration}")
+
         self.config = config
         self.selected_firmware_config = list(config.firmware_configs.values())[0]
         self.selected_plate_config = list(config.plate_configs.values())[0]
-        self.programmer.set_config(config.pickle_default_path, self.selected_firmware_config.path)
+        self.set_programmer(config.programmer)
+        self.programmer.set_config(config.pickle_default_path, self.selected_firmware_config.path, config.pickle_session, config.programming_timeout_s)
+        self.stepper_driver.set_axis_specifications(config.axis_configs)
+        self.set_heads(config.heads)
+        self.head_pitch_mm = config.head_pitch_mm
+        self.pipeline = config.pipeline
+        self.orchestration = config.orchestration
+
+    def set_programmer(self, name: str) -> None:
+        # programmer backend of the first head (see create_dps_programmer), the other heads follow it in set_heads
+        if name != self.programmer.NAME:
+            self.programmer.close_session()
+            self.programmer = create_dps_programmer(name, self.board)
+            self.heads[0].programmer = self.programmer
+
+    @staticmethod
+    def check_heads(count: int, programmer_name: str, head_configs: dict[int, HeadConfig]) -> List[HeadPins]:
+        # pins of the other heads, ValueError when the heads cannot be used (count, programmer backend, wiring)
+        if not 1 <= count <= RPiBoard.MAX_HEADS:
+            raise ValueError(f"Number of heads must be 1 - {RPiBoard.MAX_HEADS}: {count}")
+        # NOTE: the n14 process drives the ICSP pins of its own configuration (those of the first head),
+        # only the ICSP backend programs the DPS over the pins of every head
+        if count > 1 and programmer_name != ICSPProgrammer.NAME:
+            raise ValueError(f"Multiple heads require the {ICSPProgrammer.NAME} programmer, not {programmer_name}: {count} heads")
+        # wiring of the other heads ([HEAD_<index>] sections)
+        missing: List[int] = [index for index in range(1, count) if index not in head_configs]
+        if missing:
+            raise ValueError(f"Wiring of the heads {missing} is not configured ([HEAD_<index>] sections)")
+        heads_pins: List[HeadPins] = [RPiBoard.resolve_head_pins(head_configs[index].pin_names) for index in range(1, count)]
+        RPiBoard.check_head_pins([RPiBoard.DEFAULT_HEAD_PINS] + heads_pins)
+        return heads_pins
+
+    def set_heads(self, count: int) -> None:
+        # the heads of the fixture take the configuration of the first one (programmer backend, sequential sampling)
+        head_configs: dict[int, HeadConfig] = {} if self.config is None else self.config.head_configs
+        heads_pins: List[HeadPins] = CNCRunner.check_heads(count, self.programmer.NAME, head_configs)
+        heads: List[FixtureHead] = [self.heads[0]]
+        for index, pins in zip(range(1, count), heads_pins):
+            adc_address: int = head_configs[index].adc_address
+            head: FixtureHead | None = self._head_cache.get(index)
+            if head is None or head.programmer.NAME != self.programmer.NAME or (head.board.pins, head.board.adc_address) != (pins, adc_address):
+                if head is not None:
+                    head.programmer.close_session()
+                head = FixtureHead.create(index, self.board, self.programmer.NAME, pins, adc_address)
+                self._head_cache[index] = head
+            heads.append(head)
+        self.heads = heads
+        if self.config is not None:
+            for head in self.heads:
+                head.tester.adc.set_sequential_sampling(self.config.sequential_sampling, self.config.sequential_min_samples, self.config.sequential_max_samples)
+
+    def _configure_head_programmers(self) -> None:
+        # the firmware (and the programmer settings) of the first head, e.g. after the firmware was selected
+        for head in self.heads[1:]:
+            head.programmer.set_config(self.programmer.pickle_path, self.programmer.firmware_path, self.programmer.session_supported, self.programmer.timeout_s)
 
     # region STATE MACHINE
     def set_home(self) -> None:
@@ -93,28 +264,31 @@ class CNCRunner:
         logging.info(f"[CNC]: Moving by step {step_mm} in axis {axis.name}")
         assert self.state == CNCRunnerState.STOPPED
 
-        self.state = CNCRunnerState.MOVING_BY_STEP
         self.state_moving_params['axis'] = axis
         self.state_moving_params['step'] = step_mm
         self.stepper_driver.running = True
+        self.state = CNCRunnerState.MOVING_BY_STEP
+        self._post_command()
 
     def set_moving_home(self) -> None:
         logging.info(f"[CNC]: Moving to home position")
         assert self.state == CNCRunnerState.STOPPED
 
-        self.state = CNCRunnerState.MOVING_HOME
         self.stepper_driver.running = True
+        self.state = CNCRunnerState.MOVING_HOME
+        self._post_command()
 
     def set_in_automatic_cycle(self, start_from_x: int, start_from_y: int) -> None:
         logging.info(f"[CNC]: New automatic cycle started")
         assert self.state == CNCRunnerState.STOPPED or self.state == CNCRunnerState.PAUSED_IN_AUTOMATIC_CYCLE
 
-        self.state = CNCRunnerState.IN_AUTOMATIC_CYCLE
         self.dps_logs = {}
         self.current_cycle_pos = None
         self.state_moving_params['start_from_x'] = start_from_x
         self.state_moving_params['start_from_y'] = start_from_y
         self.stepper_driver.running = True
+        self.state = CNCRunnerState.IN_AUTOMATIC_CYCLE
+        self._post_command()
 
     def set_paused_in_automatic_cycle(self) -> None:
         logging.info(f"[CNC]: Automatic cycle stopped")
@@ -122,6 +296,7 @@ class CNCRunner:
 
         self.state = CNCRunnerState.PAUSED_IN_AUTOMATIC_CYCLE
         self.stepper_driver.running = False
+        self.orchestrator.cancel()
 
     def set_resume_automatic_cycle(self) -> None:
         logging.info(f"[CNC]: Automatic cycle resumed")
@@ -146,36 +321,106 @@ class CNCRunner:
     # endregion STATE MACHINE
 
     # region DPS PROCESSORS
-    def process_dps(self) -> DPSLog:
+    def process_dps(self, head: FixtureHead | None = None) -> DPSLog:
+        # head: the DPS under this head of the fixture (the first head when None)
+        head = self.heads[0] if head is None else head
+        dps_log: DPSLog = self.program_head(head)
+        self.test_head(head, dps_log)
+        return dps_log
+
+    def program_head(self, head: FixtureHead) -> DPSLog:
+        # the DPS is powered and programmed (the program stage of the pipelined cycle)
         # prepare DPS
-        self.tester.prepare_dps()
+        with tracer.span("prepare_dps", "dps", head=head.index):
+            head.tester.prepare_dps()
         # create a new dps log instance
         dps_log = DPSLog()
+        dps_log.led_current_offset = head.tester.led_current_offset_mV
+        dps_log.led_current_offset_age = head.tester.led_current_offset_age_s
         # program firmware
-        exited_program: CompletedProcess = self.programmer.load()
+        with tracer.span("program", "dps", head=head.index):
+            exited_program: CompletedProcess | None = None
+            if self.config.verify_first:
+                # reworked plates: a device that already holds the firmware goes straight to the tests
+                exited_verify: CompletedProcess = head.programmer.verify()
+                dps_log.fw_programming_skipped = exited_verify.returncode == 0
+                if dps_log.fw_programming_skipped:
+                    logging.info("[CNC]: Firmware already programmed, programming skipped")
+                    exited_program = exited_verify
+            if exited_program is None:
+                exited_program = self.program_dps(dps_log, head)
+
+        dps_log.fw_failure = None if exited_program.returncode == 0 else classify_programming_failure(exited_program).value
 
         #TODO: TURNOV check
         #dps_log.fw_uploaded = exited_program.returncode == 0 and len(exited_program.stdout) == 0
         dps_log.fw_uploaded = exited_program.returncode == 0
-        dps_log.fw_upload_message = exited_program.stdout
+        # NOTE: timeouts are reported on stderr
+        dps_log.fw_upload_message = exited_program.stdout or exited_program.stderr
+        return dps_log
 
-        if exited_program.returncode == 0:
+    def test_head(self, head: FixtureHead, dps_log: DPSLog) -> None:
+        # tests of the programmed DPS, then it is powered off (the measure stage of the pipelined cycle)
+        if dps_log.fw_uploaded:
             if self.selected_firmware_config.type == FirmwareType.FLASH:
-                self.tester.test_dps_flash(self.selected_firmware_config, dps_log)
+                head.tester.test_dps_flash(self.selected_firmware_config, dps_log)
             elif self.selected_firmware_config.type == FirmwareType.MAX_ONLY:
-                self.tester.test_dps_maxonly(self.selected_firmware_config, dps_log)
-        return dps_log
+                head.tester.test_dps_maxonly(self.selected_firmware_config, dps_log)
+        # the DPS is powered off during the next hop (the offset may be calibrated meanwhile)
+        head.board.dps_inactivate()
+
+    def program_dps(self, dps_log: DPSLog, head: FixtureHead | None = None) -> CompletedProcess:
+        # bounded retries of the failures a better contact may fix (no target, verify failure, timeout),
+        # NOTE: the fixture is re-seated only with one head (the other heads are testing their DPS meanwhile)
+        head = self.heads[0] if head is None else head
+        attempts: int = 1 + max(0, self.config.programming_retries)
+        for attempt in range(1, attempts + 1):
+            exited_program: CompletedProcess = head.programmer.load()
+            dps_log.fw_attempts = attempt
+            failure: ProgrammingFailure | None = classify_programming_failure(exited_program)
+            if failure is None or not failure.retriable or attempt == attempts:
+                return exited_program
+            if len(self.heads) > 1:
+                logging.warning(f"[CNC]: Programming attempt {attempt} of head {head.index} failed ({failure.value}), retrying")
+                continue
+            logging.warning(f"[CNC]: Programming attempt {attempt} failed ({failure.value}), re-seating the head")
+            with tracer.span("reseat", "dps", failure=failure.value):
+                self.reseat_dps()
+        return exited_program
+
+    def _map_heads(self, function: Callable, heads: List[FixtureHead], *arguments: List) -> List:
+        # function(head, arguments of the head...) of all the heads concurrently (the first head in this thread)
+        if len(heads) == 1:
+            return [function(heads[0], *[argument[0] for argument in arguments])]
+        with ThreadPoolExecutor(len(heads) - 1, thread_name_prefix="head") as executor:
+            futures: List[Future] = [executor.submit(function, head, *head_arguments) for head, *head_arguments in zip(heads[1:], *[argument[1:] for argument in arguments])]
+            results: List = [function(heads[0], *[argument[0] for argument in arguments])]
+            results.extend(future.result() for future in futures)
+        return results
+
+    def reseat_dps(self) -> None:
+        # the DPS is powered off while the head is lifted
+        self.board.dps_inactivate()
+        z_mm: float = self.stepper_driver.get_current_pos_mm()[Axis.Z.value]
+        self.stepper_driver.go_to_pos_mm(Axis.Z, z_mm + CNCRunner.RESEAT_LIFT_MM, CNCRunner.DEFAULT_SPEED)
+        self.stepper_driver.go_to_pos_mm(Axis.Z, z_mm, CNCRunner.DEFAULT_SPEED, CNCRunner.RESEAT_SETTLE_S)
+        self.board.dps_activate()
     # endregion DPS PROCESSORS
 
-    def generate_position_sequence(self, start_from_x: int, start_from_y: int) -> List[(int, int)]:
-        pos_list = []
-        for row in range(self.selected_plate_config.rows):
-            for column in range(self.selected_plate_config.columns):
-                # if the row is even ---> increase column, if odd <--- decrease column
-                column = column if row % 2 == 0 else self.selected_plate_config.columns - column - 1
-                pos_list.append((column, row))
+    def plate_heads(self) -> Tuple[int, int]:
+        # heads used on the selected plate and the columns between them: the heads land on the DPS only when the head pitch
+        # is a multiple of the column spacing of the plate, only the first head is used otherwise
+        if len(self.heads) == 1:
+            return 1, 1
+        head_step: int | None = self.selected_plate_config.head_column_step(self.head_pitch_mm)
+        if head_step is None:
+            logging.warning(f"[CNC]: Head pitch {self.head_pitch_mm} mm does not match the column spacing {self.selected_plate_config.x_spacing} mm, one head is used")
+            return 1, 1
+        return len(self.heads), head_step
 
-        return pos_list[pos_list.index((start_from_x, start_from_y)):]
+    def generate_position_sequence(self, start_from_x: int, start_from_y: int) -> List[(int, int)]:
+        # positions of the first head, the other heads cover the columns at the head pitch
+        return self.selected_plate_config.generate_position_sequence(start_from_x, start_from_y, *self.plate_heads())
 
     def next_position_in_sequence(self) -> Tuple[int, int]:
         if self.current_cycle_pos is None: return 0, 0
@@ -190,61 +435,135 @@ class CNCRunner:
                 abs(pos_current_mm[Axis.Y.value] - pos_target_y_mm) > 0.1)
 
     def cycle(self, start_from_x: int = 0, start_from_y: int = 0) -> None:
+        # the timeline of the run is exported even if the cycle is paused or fails
+        trace_start_ns: int = tracer.now_ns()
+        # one programmer process per head for the whole plate (when the programmer supports it)
+        self._configure_head_programmers()
+        for head in self.heads:
+            head.programmer.open_session()
+        try:
+            with tracer.span("plate", "cycle", plate=self.selected_plate_config.name, start_from=[start_from_x, start_from_y], heads=len(self.heads)):
+                self._cycle(start_from_x, start_from_y)
+        finally:
+            for head in self.heads:
+                head.programmer.close_session()
+            self.export_trace(trace_start_ns)
+
+    def export_trace(self, since_ns: int) -> None:
+        self.last_trace_path = os.path.join(CNCRunner.TRACE_DIR, f"plate_{self.selected_plate_config.name}_{time.strftime('%Y%m%d_%H%M%S')}.json")
+        try:
+            tracer.export_chrome_trace(self.last_trace_path, since_ns)
+            logging.info(f"[CNC]: Timeline of the plate exported to {self.last_trace_path}")
+        except OSError as e:
+            logging.warning(f"[CNC]: Timeline of the plate cannot be exported: {e}")
+
+    def _cycle(self, start_from_x: int, start_from_y: int) -> None:
         logging.info("[CNC]: DPS plate is about to be programmed...")
         logging.info(f"[CNC]: DPS starting from pos: [{start_from_x},{start_from_y}]")
 
-        # initial move in Z axis to the safe height
-        if self.is_safe_z_lift_needed(start_from_x * self.selected_plate_config.x_spacing, start_from_y * self.selected_plate_config.y_spacing):
-            logging.info("[CNC] Moving to safe position in Z axis")
-            self.stepper_driver.go_to_pos_mm(Axis.Z, self.config.z_moving_height_mm, CNCRunner.DEFAULT_SPEED)
-
         generated_positions: List[int, int] = self.generate_position_sequence(start_from_x, start_from_y)
-
-        for column, row in generated_positions:
-
-            # calculate the absolute positions
-            pos_target_x_mm: float = column * self.selected_plate_config.x_spacing + self.selected_plate_config.x_offset
-            pos_target_y_mm: float = row * self.selected_plate_config.y_spacing + self.selected_plate_config.y_offset
-            logging.info(f"[CNC]: Moving to position: [{column}, {row}], [{pos_target_x_mm} mm, {pos_target_y_mm} mm]")
-
-            # update gui controller
-            self.gui_controller.ex_evt_update_current_pos(column, row)
-            # go
-            self.stepper_driver.go_to_pos_mm(Axis.X, pos_target_x_mm, CNCRunner.DEFAULT_SPEED, 0.0)
-            self.stepper_driver.go_to_pos_mm(Axis.Y, pos_target_y_mm, CNCRunner.DEFAULT_SPEED, 0.25)
-            self.stepper_driver.go_to_pos_mm(Axis.Z, 0, CNCRunner.DEFAULT_SPEED, 0.25)
-
-            # break condition
-            if self.state is not CNCRunnerState.IN_AUTOMATIC_CYCLE:
-                # exit application condition
-                assert self.state == CNCRunnerState.PAUSED_IN_AUTOMATIC_CYCLE or self.state == CNCRunnerState.STOPPED
-                logging.info("[CNC] Leaving automatic cycle")
-                return
-
-            # update current position
-            self.current_cycle_pos = (column, row)
-
-            logging.info(f"[CNC]: DPS [{column},{row}] programming starting")
-            self.dps_under_test_running = True
-            dps_log: DPSLog = self.process_dps()
-            self.dps_under_test_running = False
-            logging.info(f"[CNC]: DPS [{column},{row}] programming finished")
-            dps_log.x, dps_log.y = column, row
-            self.dps_logs[(column, row)] = dps_log
-
+        # the offset is calibrated once per plate
+        for head in self.heads:
+            head.tester.invalidate_LED_current_offset()
+        # the whole sequence is planned at once: Z lift, XY travel and Z plunge of every hop are blended,
+        # the initial lift to the safe height is the first segment of the first hop
+        planner: MotionPlanner = MotionPlanner(self.config.z_moving_height_mm, self.config.z_minimum_safe_height_mm, CNCRunner.DEFAULT_SPEED)
+        with tracer.span("plan", "motion"):
+            plan: List[Tuple[Tuple[int, int], List[MotionSegment]]] = planner.plan(self.stepper_driver.get_current_pos_mm(), self.selected_plate_config, generated_positions)
+
+        plunges: List[Plunge] = [Plunge(position, segments) for position, segments in plan]
+        if not (self._run_pipelined(plunges) if self.pipeline else self._run_serial(plunges)):
+            logging.info("[CNC] Leaving automatic cycle")
+            return
+
+        with tracer.span("move_away", "motion"):
+            # lift from the last DPS
             self.stepper_driver.go_to_pos_mm(Axis.Z, self.config.z_moving_height_mm, CNCRunner.DEFAULT_SPEED, 0.0)
-
-            # update gui controller
-            self.gui_controller.ex_evt_update_dps_log(dps_log)
-
-        # move away from last position
-        self.stepper_driver.move(Axis.Y, 50, 100)
+            # move away from last position
+            self.stepper_driver.move(Axis.Y, 50, 100)
         # complete
         self.set_completed_automatic_cycle()
         # update gui controller
         self.gui_controller.ex_evt_automatic_cycle_completed()
         logging.info(f"[CNC]: DPC programming cycle completed -> stopping")
 
+    def _run_serial(self, plunges: List[Plunge]) -> bool:
+        # False --> the cycle was left (paused or stopped)
+        for plunge in plunges:
+            if not self._move_stage(plunge):
+                return False
+            with tracer.span("dps", "dps", position=list(plunge.position)):
+                self._program_stage(plunge)
+                self._measure_stage(plunge)
+            # NOTE: no Z lift here, the lift is the beginning of the next hop
+            self._report_stage(plunge)
+        return True
+
+    def _run_pipelined(self, plunges: List[Plunge]) -> bool:
+        # the stages of consecutive plunges overlap where the hardware they hold permits (see PIPELINE_STAGES)
+        functions: dict[str, Callable[[Plunge], bool | None]] = {
+            CNCRunner.STAGE_MOTION: self._move_stage, CNCRunner.STAGE_PROGRAM: self._program_stage,
+            CNCRunner.STAGE_MEASURE: self._measure_stage, CNCRunner.STAGE_REPORT: self._report_stage,
+        }
+        scheduler: PipelineScheduler = PipelineScheduler([PipelineStage(name, functions[name], resources) for name, resources in CNCRunner.PIPELINE_STAGES])
+        scheduler.run(plunges)
+        logging.info(f"[CNC]: {scheduler.stats}")
+        return not scheduler.stopped
+
+    def _move_stage(self, plunge: Plunge) -> bool:
+        # False --> the cycle was left during the hop
+        column, row = plunge.position
+        # calculate the absolute positions
+        pos_target_x_mm, pos_target_y_mm = self.selected_plate_config.get_position_mm(column, row)
+        logging.info(f"[CNC]: Moving to position: [{column}, {row}], [{pos_target_x_mm} mm, {pos_target_y_mm} mm]")
+
+        # update gui controller
+        self.gui_controller.ex_evt_update_current_pos(column, row)
+        # calibrate the LED current offset while the head moves (first hop of the plate, then when it gets old)
+        offset_calibrations: List[threading.Thread] = [threading.Thread(target=head.tester.calibrate_LED_current_offset)
+                                                       for head in self.heads if head.tester.is_LED_current_offset_calibration_due()]
+        for offset_calibration in offset_calibrations:
+            offset_calibration.start()
+        # go
+        with tracer.span("move", "motion", position=[column, row]):
+            self.stepper_driver.execute_segments(plunge.segments, CNCRunner.DEFAULT_SPEED)
+        for offset_calibration in offset_calibrations:
+            offset_calibration.join()
+
+        # break condition
+        if self.state is not CNCRunnerState.IN_AUTOMATIC_CYCLE:
+            # exit application condition
+            assert self.state == CNCRunnerState.PAUSED_IN_AUTOMATIC_CYCLE or self.state == CNCRunnerState.STOPPED
+            return False
+
+        # update current position
+        self.current_cycle_pos = (column, row)
+        return True
+
+    def _program_stage(self, plunge: Plunge) -> None:
+        # the DPS under all the heads (the first head at the position) concurrently, one DPS log per position
+        positions: List[Tuple[int, int]] = self.selected_plate_config.get_head_positions(*plunge.position, *self.plate_heads())
+        logging.info(f"[CNC]: DPS {positions} programming starting")
+        self.dps_under_test_running = True
+
+        def program(head: FixtureHead, position: Tuple[int, int]) -> DPSLog:
+            dps_log: DPSLog = self.program_head(head)
+            dps_log.x, dps_log.y = position
+            return dps_log
+
+        plunge.dps_logs = self._map_heads(program, self.heads[:len(positions)], positions)
+
+    def _measure_stage(self, plunge: Plunge) -> None:
+        self._map_heads(self.test_head, self.heads[:len(plunge.dps_logs)], plunge.dps_logs)
+        self.dps_under_test_running = False
+        logging.info(f"[CNC]: DPS [{plunge.position[0]},{plunge.position[1]}] programming finished ({len(plunge.dps_logs)} heads)")
+
+    def _report_stage(self, plunge: Plunge) -> None:
+        for dps_log in plunge.dps_logs:
+            self.dps_logs[(dps_log.x, dps_log.y)] = dps_log
+            # update gui controller
+            self.gui_controller.ex_evt_update_dps_log(dps_log)
+
     def move(self, axis: Axis, step_mm: float) -> None:
         logging.info(f"[CNC]: Moving {step_mm} mm along axis {axis.name}")
         self.stepper_driver.move(axis, step_mm, CNCRunner.DEFAULT_SPEED)
@@ -269,6 +588,8 @@ class CNCRunner:
             logging.info("[CNC]: Moving completed -> stopping")
 
     def start(self):
+        if isinstance(self.stepper_driver, MotionProcess):
+            self.stepper_driver.start()
         self.worker_thread.start()
         self.pos_thread.start()
 
@@ -277,37 +598,129 @@ class CNCRunner:
         self.threads_should_run = False
         self.state = CNCRunnerState.STOPPED
         self.stepper_driver.running = False
+        self.orchestrator.close()
+        self._commands.put(None)
+        with self._state_changed:
+            self._state_changed.notify_all()
 
         self.worker_thread.join(2)
         self.pos_thread.join(2)
+        if isinstance(self.stepper_driver, MotionProcess):
+            self.stepper_driver.stop()
         self.board.deinit()
 
     def is_alive(self):
         return self.worker_thread.is_alive() and self.pos_thread.is_alive()
 
     def worker(self):
+        # blocks until a command is posted by a state transition
         while self.threads_should_run:
-            if self.state == CNCRunnerState.IN_AUTOMATIC_CYCLE:
+            command: CNCRunnerState | None = self._commands.get()
+            if command is None:
+                break
+            if command != self.state:
+                # e.g. stopped before the command was executed
+                logging.info(f"[CNC]: Command {command.name} dropped in state {self.state.name}")
+                continue
+            if command == CNCRunnerState.IN_AUTOMATIC_CYCLE and self.orchestration == ORCHESTRATION_ASYNCIO:
+                self.orchestrator.run(self.state_moving_params['start_from_x'], self.state_moving_params['start_from_y'])
+            elif command == CNCRunnerState.IN_AUTOMATIC_CYCLE:
                 self.cycle(self.state_moving_params['start_from_x'], self.state_moving_params['start_from_y'])
-            elif self.state == CNCRunnerState.MOVING_BY_STEP:
+            elif command == CNCRunnerState.MOVING_BY_STEP:
                 self.move(Axis(self.state_moving_params['axis']), self.state_moving_params['step'])
-            elif self.state == CNCRunnerState.MOVING_HOME:
+            elif command == CNCRunnerState.MOVING_HOME:
                 self.go_home()
-            time.sleep(0.1)
 
         logging.info("[CNC]: Worker thread exited...")
 
     def pos_worker(self):
-        # wait until everything is set up
-        time.sleep(3)
+        # publishes the position when it changes: at most every POSITION_UPDATE_S while moving,
+        # sleeps until the state changes otherwise
+        last_pos_mm: [float, float, float] | None = None
         while self.threads_should_run:
-            if self.gui_controller:
-                self.gui_controller.ex_evt_update_state(self.state)
-                self.gui_controller.ex_evt_update_current_pos_mm(self.stepper_driver.get_current_pos_mm())
-            time.sleep(1)
+            pos_mm: [float, float, float] = self.stepper_driver.get_current_pos_mm()
+            if pos_mm != last_pos_mm and self.gui_controller:
+                self.gui_controller.ex_evt_update_current_pos_mm(pos_mm)
+                last_pos_mm = pos_mm
+            with self._state_changed:
+                if self._state in CNCRunner.MOTION_STATES:
+                    self._state_changed.wait(CNCRunner.POSITION_UPDATE_S)
+                else:
+                    self._state_changed.wait_for(lambda: self._state in CNCRunner.MOTION_STATES or not self.threads_should_run)
         logging.info("[CNC]: Position thread exited...")
 
 
+class TestCNCRunner(unittest.TestCase):
+    # NOTE: runs on the simulated hardware (SCILIF_HAL=simulated python -m unittest app.cnc_programmer.cnc_runner)
+
+    def setUp(self):
+        from unittest import mock
+        self.runner = CNCRunner()
+        self.runner.set_config(CNCProgrammerConfigParser(f"{os.path.dirname(os.path.abspath(__file__))}/resources/test.conf").parse_config())
+        self.runner.set_controller(mock.Mock())
+        self.states: List[CNCRunnerState] = []
+        self.runner.subscribe(self.states.append)
+        self.runner.start()
+
+    def tearDown(self):
+        self.runner.stop()
+
+    def test_command_latency(self):
+        started: List[float] = []
+        move = self.runner.move
+        self.runner.move = lambda axis, step_mm: (started.append(time.perf_counter()), move(axis, step_mm))
+        start = time.perf_counter()
+        self.runner.set_moving(Axis.X, 1)
+        self.assertTrue(self.runner.wait_for_state(CNCRunnerState.STOPPED, timeout_s=5))
+        self.assertEqual(self.states, [CNCRunnerState.MOVING_BY_STEP, CNCRunnerState.STOPPED])
+        self.runner.gui_controller.ex_evt_process_completed.assert_called_once()
+        # the worker takes the command at once (no polling period)
+        self.assertLess(started[0] - start, 0.01)
+
+    def test_state_published_on_change(self):
+        self.runner.state = CNCRunnerState.STOPPED
+        self.assertEqual(self.states, [])
+        self.runner.state = CNCRunnerState.COMPLETED_AUTOMATIC_CYCLE
+        self.runner.state = CNCRunnerState.COMPLETED_AUTOMATIC_CYCLE
+        self.assertEqual(self.states, [CNCRunnerState.COMPLETED_AUTOMATIC_CYCLE])
+        self.runner.gui_controller.ex_evt_update_state.assert_called_once_with(CNCRunnerState.COMPLETED_AUTOMATIC_CYCLE)
+
+    def test_heads_require_icsp(self):
+        # the n14 process programs over the pins of the first head only
+        with self.assertRaises(ValueError):
+            self.runner.set_heads(2)
+        self.runner.set_programmer(ICSPProgrammer.NAME)
+        self.runner.set_heads(2)
+        self.assertEqual([head.programmer.NAME for head in self.runner.heads], [ICSPProgrammer.NAME] * 2)
+
+    def test_head_pitch(self):
+        self.runner.set_programmer(ICSPProgrammer.NAME)
+        self.runner.set_heads(2)
+        # the heads would land between the DPS --> one head
+        self.runner.head_pitch_mm = self.runner.selected_plate_config.x_spacing + 5
+        self.assertEqual(self.runner.plate_heads(), (1, 1))
+        self.assertEqual(self.runner.generate_position_sequence(0, 0), self.runner.selected_plate_config.generate_position_sequence(0, 0))
+        self.runner.head_pitch_mm = self.runner.selected_plate_config.x_spacing
+        self.assertEqual(self.runner.plate_heads(), (2, 1))
+
+    def test_rejected_config(self):
+        # nothing of a rejected config is applied (not even the programmer of the first head)
+        import copy
+        config = copy.copy(self.runner.config)
+        config.__dict__.update({"_programmer": ICSPProgrammer.NAME, "_heads": 2})
+        self.runner.set_config(config)
+        heads = list(self.runner.heads)
+        self.assertEqual(len(heads), 2)
+        for changes in ({"_programmer": DPSProgrammer.NAME}, {"_head_configs": {}}, {"_orchestration": "processes"}, {"_programmer": "pickit"}):
+            rejected = copy.copy(config)
+            rejected.__dict__.update(changes)
+            with self.assertRaises(ValueError):
+                self.runner.set_config(rejected)
+            self.assertIs(self.runner.config, config)
+            self.assertEqual(self.runner.programmer.NAME, ICSPProgrammer.NAME)
+            self.assertEqual(self.runner.heads, heads)
+
+
 def test():
     logging.basicConfig(level=logging.DEBUG)
 
@@ -1,20 +1,104 @@
 from app.cnc_programmer.config.firmware import FirmwareConfig
+from app.cnc_programmer.config.head import HeadConfig
 from app.cnc_programmer.config.plate import PlateConfig
+from app.cnc_programmer.stepper.position import Axis
 
 
 class CNCProgrammerConfig:
 
-    def __init__(self, pickle_default_path: str, z_moving_height: int, z_minimum_safe_height: int, firmware_configs: dict[str, FirmwareConfig], plate_configs: dict[str, PlateConfig]):
+    def __init__(self, pickle_default_path: str, z_moving_height: int, z_minimum_safe_height: int, firmware_configs: dict[str, FirmwareConfig], plate_configs: dict[str, PlateConfig],
+                 axis_configs: dict[Axis, dict] = None, pickle_session: bool = False, programmer: str = "n14",
+                 verify_first: bool = False, programming_timeout_s: float = 60.0, programming_retries: int = 1,
+                 sequential_sampling: bool = False, sequential_min_samples: int = 5, sequential_max_samples: int = 20,
+                 heads: int = 1, head_pitch_mm: float = 0.0, pipeline: bool = False, orchestration: str = "threads",
+                 head_configs: dict[int, HeadConfig] = None):
         self._pickle_default_path: str = pickle_default_path
+        # the programmer supports the session mode (one process for the whole plate)
+        self._pickle_session: bool = pickle_session
+        # programmer backend: n14 or icsp (see dps_programmer.create_dps_programmer)
+        self._programmer: str = programmer
+        # verify the device before programming, devices that already hold the firmware are only tested (reworked plates)
+        self._verify_first: bool = verify_first
+        # time limit of one programming attempt, attempts after a failure that a re-seat of the head may fix
+        self._programming_timeout_s: float = programming_timeout_s
+        self._programming_retries: int = programming_retries
+        # the measurements stop sampling once the pass/fail decision is confident (between the min and max samples)
+        self._sequential_sampling: bool = sequential_sampling
+        self._sequential_min_samples: int = sequential_min_samples
+        self._sequential_max_samples: int = sequential_max_samples
+        # pogo heads of the fixture, one plunge programs and tests the DPS of adjacent columns
+        self._heads: int = heads
+        # distance of adjacent heads in X, the heads are used only on the plates with the DPS columns at (a multiple of) the pitch
+        self._head_pitch_mm: float = head_pitch_mm
+        # wiring of the heads after the first one (head index --> config)
+        self._head_configs: dict[int, HeadConfig] = {} if head_configs is None else head_configs
+        # the stages of the cycle (motion, program, measure, report) overlap where the hardware permits
+        self._pipeline: bool = pipeline
+        # the plate cycle is run by the worker thread (threads) or as a coroutine (asyncio, see orchestrator.py)
+        self._orchestration: str = orchestration
         self._z_moving_height_mm: int = z_moving_height
         self._z_minimum_safe_height_mm: int = z_minimum_safe_height
         self._firmware_configs: dict[str, FirmwareConfig] = firmware_configs
         self._plate_configs: dict[str, PlateConfig] = plate_configs
+        # overrides of the axis specification (see axis_params.CONFIGURABLE_AXIS_PARAMS)
+        self._axis_configs: dict[Axis, dict] = {} if axis_configs is None else axis_configs
 
     @property
     def pickle_default_path(self) -> str:
         return self._pickle_default_path
 
+    @property
+    def pickle_session(self) -> bool:
+        return self._pickle_session
+
+    @property
+    def programmer(self) -> str:
+        return self._programmer
+
+    @property
+    def verify_first(self) -> bool:
+        return self._verify_first
+
+    @property
+    def programming_timeout_s(self) -> float:
+        return self._programming_timeout_s
+
+    @property
+    def programming_retries(self) -> int:
+        return self._programming_retries
+
+    @property
+    def sequential_sampling(self) -> bool:
+        return self._sequential_sampling
+
+    @property
+    def sequential_min_samples(self) -> int:
+        return self._sequential_min_samples
+
+    @property
+    def sequential_max_samples(self) -> int:
+        return self._sequential_max_samples
+
+    @property
+    def heads(self) -> int:
+        return self._heads
+
+    @property
+    def head_configs(self) -> dict[int, HeadConfig]:
+        return self._head_configs
+
+    @property
+    def head_pitch_mm(self) -> float:
+        return self._head_pitch_mm
+
+    @property
+    def pipeline(self) -> bool:
+        return self._pipeline
+
+    @property
+    def orchestration(self) -> str:
+        return self._orchestration
+
     @property
     def z_moving_height_mm(self) -> int:
         return self._z_moving_height_mm
@@ -31,13 +115,29 @@ class CNCProgrammerConfig:
     def plate_configs(self) -> dict[str, PlateConfig]:
         return self._plate_configs
 
+    @property
+    def axis_configs(self) -> dict[Axis, dict]:
+        return self._axis_configs
+
     def __str__(self):
         return f'''CNCProgrammerConfig(
                 pickle_default_path={self.pickle_default_path},
+                pickle_session={self.pickle_session},
+                programmer={self.programmer},
+                verify_first={self.verify_first},
+                programming_timeout_s={self.programming_timeout_s},
+                programming_retries={self.programming_retries},
+                sequential_sampling={self.sequential_sampling} ({self.sequential_min_samples}-{self.sequential_max_samples} samples),
+                heads={self.heads},
+                head_pitch_mm={self.head_pitch_mm},
+                head_configs={[str(head_config) for head_config in self.head_configs.values()]},
+                pipeline={self.pipeline},
+                orchestration={self.orchestration},
                 z_moving_height_mm={self.z_moving_height_mm},
                 z_minimum_safe_height_mm={self.z_minimum_safe_height_mm},
                 plate_configs={self.plate_configs},
-                firmware_configs ={self.firmware_configs}
+                firmware_configs ={self.firmware_configs},
+                axis_configs={self.axis_configs}
             )'''
 
 
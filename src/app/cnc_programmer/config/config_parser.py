@@ -1,7 +1,12 @@
+from __future__ import annotations
+
 from app.cnc_programmer.config.config import CNCProgrammerConfig
 from app.cnc_programmer.config.firmware import FirmwareConfig
+from app.cnc_programmer.config.head import HeadConfig
 from app.cnc_programmer.config.plate import PlateConfig
 from app.cnc_programmer.dps_mode import FirmwareType
+from app.cnc_programmer.stepper.axis_params import CONFIGURABLE_AXIS_PARAMS, RampProfile
+from app.cnc_programmer.stepper.position import Axis
 from lib.config_parser import CustomConfigParser
 
 
@@ -21,12 +26,37 @@ class CNCProgrammerConfigParser(CustomConfigParser):
         for section_name in self.get_all_sections_starting_with(CustomConfigParser.PLATE_SECTION_PREFIX):
             plate_configs[section_name.split(CustomConfigParser.PLATE_SECTION_PREFIX)[1]] = self.parse_plate_config(section_name)
 
+        # parse axis sections (optional)
+        axis_configs: dict[Axis, dict] = {}
+        for section_name in self.get_all_sections_starting_with(CustomConfigParser.AXIS_SECTION_PREFIX):
+            axis_configs[Axis[section_name.split(CustomConfigParser.AXIS_SECTION_PREFIX)[1]]] = self.parse_axis_config(section_name)
+
+        # parse head sections (optional, the wiring of the heads after the first one)
+        head_configs: dict[int, HeadConfig] = {}
+        for section_name in self.get_all_sections_starting_with(CustomConfigParser.HEAD_SECTION_PREFIX):
+            head_config: HeadConfig = self.parse_head_config(section_name)
+            head_configs[head_config.index] = head_config
+
         return CNCProgrammerConfig(
             self.get(CustomConfigParser.OVERALL_SECTION_NAME, "pickle_default_path"),
             int(self.get(CustomConfigParser.OVERALL_SECTION_NAME, "z_moving_height_mm")),
             int(self.get(CustomConfigParser.OVERALL_SECTION_NAME, "z_minimum_safe_height_mm")),
             firmware_configs,
-            plate_configs)
+            plate_configs,
+            axis_configs,
+            self.get_bool(CustomConfigParser.OVERALL_SECTION_NAME, "pickle_session"),
+            self.get_or_default(CustomConfigParser.OVERALL_SECTION_NAME, "programmer", "n14"),
+            self.get_bool(CustomConfigParser.OVERALL_SECTION_NAME, "verify_first"),
+            float(self.get_or_default(CustomConfigParser.OVERALL_SECTION_NAME, "programming_timeout_s", "60")),
+            int(self.get_or_default(CustomConfigParser.OVERALL_SECTION_NAME, "programming_retries", "1")),
+            self.get_bool(CustomConfigParser.OVERALL_SECTION_NAME, "sequential_sampling"),
+            int(self.get_or_default(CustomConfigParser.OVERALL_SECTION_NAME, "sequential_min_samples", "5")),
+            int(self.get_or_default(CustomConfigParser.OVERALL_SECTION_NAME, "sequential_max_samples", "20")),
+            int(self.get_or_default(CustomConfigParser.OVERALL_SECTION_NAME, "heads", "1")),
+            float(self.get_or_default(CustomConfigParser.OVERALL_SECTION_NAME, "head_pitch_mm", "0")),
+            self.get_bool(CustomConfigParser.OVERALL_SECTION_NAME, "pipeline"),
+            self.get_or_default(CustomConfigParser.OVERALL_SECTION_NAME, "orchestration", "threads"),
+            head_configs)
 
 
     def parse_firmware_config(self, section_name: str) -> FirmwareConfig:
@@ -52,9 +82,21 @@ class CNCProgrammerConfigParser(CustomConfigParser):
             (
                 int(self.get(section_name, "r_feedback_voltage_lsl")),
                 int(self.get(section_name, "r_feedback_voltage_usl")),
-            )
+            ),
+            int(self.get_or_default(section_name, "settle_timeout", "500")),
+            self.parse_optional_range(section_name, "blinking_frequency"),
+            self.parse_optional_range(section_name, "blinking_duty_cycle"),
+            self.parse_optional_range(section_name, "blinking_on_current"),
+            self.parse_optional_range(section_name, "blinking_off_current"),
+            int(self.get_or_default(section_name, "blinking_capture_duration", "500")),
         )
 
+    def parse_optional_range(self, section_name: str, name: str) -> (float, float) | None:
+        # <name>_lsl and <name>_usl, None when missing
+        if not self.has(section_name, f"{name}_lsl") or not self.has(section_name, f"{name}_usl"):
+            return None
+        return float(self.get(section_name, f"{name}_lsl")), float(self.get(section_name, f"{name}_usl"))
+
     def parse_plate_config(self, section_name: str) -> PlateConfig:
         assert section_name.startswith(CustomConfigParser.PLATE_SECTION_PREFIX)
 
@@ -67,3 +109,25 @@ class CNCProgrammerConfigParser(CustomConfigParser):
             float(self.get(section_name, "x_spacing_mm")),
             float(self.get(section_name, "y_spacing_mm")),
         )
+
+    def parse_head_config(self, section_name: str) -> HeadConfig:
+        assert section_name.startswith(CustomConfigParser.HEAD_SECTION_PREFIX)
+
+        return HeadConfig(
+            int(section_name.split(CustomConfigParser.HEAD_SECTION_PREFIX)[1]),
+            self.get(section_name, "power_supply_pin"),
+            self.get(section_name, "button_pin"),
+            self.get(section_name, "vpp_pin"),
+            self.get(section_name, "pgd_pin"),
+            self.get(section_name, "pgc_pin"),
+            int(self.get(section_name, "adc_address"), 0),
+        )
+
+    def parse_axis_config(self, section_name: str) -> dict:
+        assert section_name.startswith(CustomConfigParser.AXIS_SECTION_PREFIX)
+
+        axis_config: dict = {}
+        for param in CONFIGURABLE_AXIS_PARAMS:
+            if self.has(section_name, param):
+                axis_config[param] = RampProfile(self.get(section_name, param)) if param == 'profile' else int(self.get(section_name, param))
+        return axis_config
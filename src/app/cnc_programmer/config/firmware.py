@@ -1,3 +1,5 @@
+from __future__ import annotations
+
 from app.cnc_programmer.dps_mode import FirmwareType
 
 
@@ -10,7 +12,13 @@ class FirmwareConfig:
                  led_current_mode1: (int, int),
                  led_current_mode2: (int, int),
                  button_led_voltage: (int, int),
-                 r_feedback_voltage: (int, int)):
+                 r_feedback_voltage: (int, int),
+                 settle_timeout: int = 500,
+                 blinking_frequency: (float, float) | None = None,
+                 blinking_duty_cycle: (float, float) | None = None,
+                 blinking_on_current: (float, float) | None = None,
+                 blinking_off_current: (float, float) | None = None,
+                 blinking_capture_duration: int = 500):
         self.name: str = name
         self._path: str = path
         self._type: FirmwareType = type
@@ -19,6 +27,15 @@ class FirmwareConfig:
         self._led_current_mode2: (int, int) = led_current_mode2
         self._button_led_voltage: (int, int) = button_led_voltage
         self._r_feedback_voltage: (int, int) = r_feedback_voltage
+        # longest wait [ms] for the LED current to settle after the power on and every mode change
+        self._settle_timeout: int = settle_timeout
+        # blinking mode (FLASH): frequency [Hz], duty cycle [%], LED current when on and off [mA],
+        # None --> the blinking mode is not tested, the samples are captured over blinking_capture_duration [ms]
+        self._blinking_frequency: (float, float) | None = blinking_frequency
+        self._blinking_duty_cycle: (float, float) | None = blinking_duty_cycle
+        self._blinking_on_current: (float, float) | None = blinking_on_current
+        self._blinking_off_current: (float, float) | None = blinking_off_current
+        self._blinking_capture_duration: int = blinking_capture_duration
 
 
     @property
@@ -49,6 +66,34 @@ class FirmwareConfig:
     def r_feedback_voltage(self) -> (int, int):
         return self._r_feedback_voltage
 
+    @property
+    def settle_timeout(self) -> int:
+        return self._settle_timeout
+
+    @property
+    def blinking_frequency(self) -> (float, float) | None:
+        return self._blinking_frequency
+
+    @property
+    def blinking_duty_cycle(self) -> (float, float) | None:
+        return self._blinking_duty_cycle
+
+    @property
+    def blinking_on_current(self) -> (float, float) | None:
+        return self._blinking_on_current
+
+    @property
+    def blinking_off_current(self) -> (float, float) | None:
+        return self._blinking_off_current
+
+    @property
+    def blinking_capture_duration(self) -> int:
+        return self._blinking_capture_duration
+
+    @property
+    def is_blinking_tested(self) -> bool:
+        return self.type == FirmwareType.FLASH and self._blinking_frequency is not None
+
     def __str__(self) -> str:
         return f'''Firmware {self.name}: [
                     path = {self.path}
@@ -58,4 +103,10 @@ class FirmwareConfig:
                     led_current_mode2 = {self.led_current_mode2},
                     button_led_voltage = {self.button_led_voltage},
                     r_feedback_voltage = {self.r_feedback_voltage},
+                    settle_timeout = {self.settle_timeout},
+                    blinking_frequency = {self.blinking_frequency},
+                    blinking_duty_cycle = {self.blinking_duty_cycle},
+                    blinking_on_current = {self.blinking_on_current},
+                    blinking_off_current = {self.blinking_off_current},
+                    blinking_capture_duration = {self.blinking_capture_duration},
         ]'''
@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+
+class HeadConfig:
+    # wiring of an additional pogo head of the fixture ([HEAD_<index>] section): the board pins (e.g. D12)
+    # of the DPS power supply, button and ICSP and the I2C address of the ADS1115 of the head
+
+    def __init__(self, index: int, power_supply_pin: str, button_pin: str, vpp_pin: str, pgd_pin: str, pgc_pin: str, adc_address: int):
+        self.index: int = index
+        self._power_supply_pin: str = power_supply_pin
+        self._button_pin: str = button_pin
+        self._vpp_pin: str = vpp_pin
+        self._pgd_pin: str = pgd_pin
+        self._pgc_pin: str = pgc_pin
+        self._adc_address: int = adc_address
+
+    @property
+    def power_supply_pin(self) -> str:
+        return self._power_supply_pin
+
+    @property
+    def button_pin(self) -> str:
+        return self._button_pin
+
+    @property
+    def vpp_pin(self) -> str:
+        return self._vpp_pin
+
+    @property
+    def pgd_pin(self) -> str:
+        return self._pgd_pin
+
+    @property
+    def pgc_pin(self) -> str:
+        return self._pgc_pin
+
+    @property
+    def pin_names(self) -> (str, str, str, str, str):
+        # in the order of rpi_board.HeadPins
+        return self.power_supply_pin, self.button_pin, self.vpp_pin, self.pgd_pin, self.pgc_pin
+
+    @property
+    def adc_address(self) -> int:
+        return self._adc_address
+
+    def __str__(self) -> str:
+        return f"Head {self.index}: pins {', '.join(self.pin_names)}, ADC 0x{self.adc_address:02X}"
@@ -1,4 +1,12 @@
+from __future__ import annotations
+
+import unittest
+from typing import List
+
+
 class PlateConfig:
+    # largest difference of the head pitch and the column spacing (multiple) with the heads still landing on the DPS
+    HEAD_PITCH_TOLERANCE_MM: float = 0.2
 
     def __init__(self, name: str, columns: int, rows: int, x_offset: int, y_offset: int, x_spacing: float, y_spacing: float):
         self.name: str = name
@@ -58,6 +66,42 @@ class PlateConfig:
         self._rows = value
 
 
+    def generate_position_sequence(self, start_from_x: int, start_from_y: int, heads: int = 1, head_step: int = 1) -> List[(int, int)]:
+        # heads: heads of the fixture, head_step: columns between adjacent heads (see head_column_step),
+        # the positions are those of the first head, the start is moved back to the plunge covering it
+        plunge_columns: List[int] = self._plunge_columns(heads, head_step)
+        pos_list = []
+        for row in range(self.rows):
+            # if the row is even ---> increase column, if odd <--- decrease column
+            for column in (plunge_columns if row % 2 == 0 else reversed(plunge_columns)):
+                pos_list.append((column, row))
+
+        start_column: int = next(column for column in plunge_columns if start_from_x in range(column, column + heads * head_step, head_step))
+        return pos_list[pos_list.index((start_column, start_from_y)):]
+
+    def _plunge_columns(self, heads: int, head_step: int) -> List[int]:
+        # columns of the first head: the heads cover heads * head_step columns by head_step plunges (interleaved when head_step > 1)
+        block: int = heads * head_step
+        return [block_column + offset for block_column in range(0, self.columns, block) for offset in range(head_step) if block_column + offset < self.columns]
+
+    def get_head_positions(self, column: int, row: int, heads: int, head_step: int = 1) -> List[(int, int)]:
+        # positions under the heads when the first head is at the position (the heads are side by side in X, head_step columns apart),
+        # heads beyond the last column are idle
+        return [(head_column, row) for head_column in range(column, min(column + heads * head_step, self.columns), head_step)]
+
+    def head_column_step(self, head_pitch_mm: float) -> int | None:
+        # columns between adjacent heads of the fixture with the pitch on this plate,
+        # None --> the heads do not land on the DPS (the pitch is not a multiple of the column spacing)
+        if head_pitch_mm <= 0 or self.x_spacing <= 0:
+            return None
+        step: int = round(head_pitch_mm / self.x_spacing)
+        if step < 1 or abs(step * self.x_spacing - head_pitch_mm) > PlateConfig.HEAD_PITCH_TOLERANCE_MM:
+            return None
+        return step
+
+    def get_position_mm(self, column: int, row: int) -> (float, float):
+        return column * self.x_spacing + self.x_offset, row * self.y_spacing + self.y_offset
+
     def __str__(self) -> str:
         return f'''Plate {self.name}: [
                     rows = {self.rows},
@@ -67,3 +111,36 @@ class PlateConfig:
                     offset in X[mm] = {self.x_offset},
                     offset in Y[mm] = {self.y_offset}
                 ]'''
+
+
+class TestPlateConfig(unittest.TestCase):
+
+    def setUp(self):
+        self.plate = PlateConfig("test", 5, 3, 0, 0, 23.74, 18)
+
+    def test_snake(self):
+        self.assertEqual(self.plate.generate_position_sequence(0, 0)[:7], [(0, 0), (1, 0), (2, 0), (3, 0), (4, 0), (4, 1), (3, 1)])
+        self.assertEqual(self.plate.generate_position_sequence(1, 2), [(1, 2), (2, 2), (3, 2), (4, 2)])
+
+    def test_stride(self):
+        sequence = self.plate.generate_position_sequence(0, 0, 2)
+        self.assertEqual(sequence, [(0, 0), (2, 0), (4, 0), (4, 1), (2, 1), (0, 1), (0, 2), (2, 2), (4, 2)])
+        # every position is under one head of one plunge
+        covered = [position for column, row in sequence for position in self.plate.get_head_positions(column, row, 2)]
+        self.assertEqual(sorted(covered), sorted(self.plate.generate_position_sequence(0, 0)))
+        # resumed at the plunge of the position
+        self.assertEqual(self.plate.generate_position_sequence(3, 1, 2)[0], (2, 1))
+
+    def test_head_step(self):
+        self.assertEqual(self.plate.head_column_step(23.74), 1)
+        self.assertEqual(self.plate.head_column_step(47.5), 2)
+        # the heads would land between the DPS
+        self.assertIsNone(self.plate.head_column_step(18))
+        self.assertIsNone(self.plate.head_column_step(0))
+        sequence = self.plate.generate_position_sequence(0, 0, 2, 2)
+        self.assertEqual(sequence[:3], [(0, 0), (1, 0), (4, 0)])
+        self.assertEqual(self.plate.get_head_positions(0, 0, 2, 2), [(0, 0), (2, 0)])
+        covered = [position for column, row in sequence for position in self.plate.get_head_positions(column, row, 2, 2)]
+        self.assertEqual(sorted(covered), sorted(self.plate.generate_position_sequence(0, 0)))
+        # resumed at the plunge of the position (the second head of the plunge at column 1)
+        self.assertEqual(self.plate.generate_position_sequence(3, 0, 2, 2)[0], (1, 0))
@@ -4,16 +4,36 @@ class DPSLog:
     def __init__(self,
                  x=None, y=None,
                  operation_successful=None,
-                 fw_uploaded=None, fw_upload_message=None,
+                 fw_uploaded=None, fw_upload_message=None, fw_programming_skipped=None,
+                 fw_failure=None, fw_attempts=None,
+                 led_current_offset=None, led_current_offset_age=None,
+                 settle_time_mode1=None, settle_time_mode2=None,
+                 test_confidence=None, adc_samples=None,
                  led_current_mode1=None, led_current_mode1_passed=None,
                  led_current_mode2=None, led_current_mode2_passed=None,
                  button_led_voltage=None, button_led_voltage_passed=None,
-                 r_feedback_voltage=None, r_feedback_voltage_passed=None) -> None:
+                 r_feedback_voltage=None, r_feedback_voltage_passed=None,
+                 blinking_frequency=None, blinking_duty_cycle=None, blinking_on_current=None, blinking_off_current=None,
+                 blinking_passed=None) -> None:
         self._x: int = x
         self._y: int = y
         self._operation_successful: bool = operation_successful
         self._fw_uploaded: bool = fw_uploaded
         self._fw_upload_message: str = fw_upload_message
+        # verify first mode: the device already held the firmware, it was not programmed again
+        self._fw_programming_skipped: bool = fw_programming_skipped
+        # classification of the failed programming (ProgrammingFailure value), number of programming attempts
+        self._fw_failure: str = fw_failure
+        self._fw_attempts: int = fw_attempts
+        # ACS723 offset [mV] used for the LED current and its age [s]
+        self._led_current_offset: float = led_current_offset
+        self._led_current_offset_age: float = led_current_offset_age
+        # time [s] the LED current took to settle before it was measured (in mode 1, mode 2), the settle timeout when not settled
+        self._settle_time_mode1: float = settle_time_mode1
+        self._settle_time_mode2: float = settle_time_mode2
+        # lowest confidence of the pass/fail decisions of the tests, ADC samples taken by the tests
+        self._test_confidence: float = test_confidence
+        self._adc_samples: int = adc_samples
         self._led_current_mode1: float = led_current_mode1
         self._led_current_mode1_passed: bool = led_current_mode1_passed
         self._led_current_mode2: float = led_current_mode2
@@ -22,6 +42,12 @@ class DPSLog:
         self._button_led_voltage_passed: bool = button_led_voltage_passed
         self._r_feedback_voltage: float = r_feedback_voltage
         self._r_feedback_voltage_passed: bool = r_feedback_voltage_passed
+        # blinking mode: frequency [Hz], duty cycle [%], LED current when on and off [mA], None when not tested
+        self._blinking_frequency: float = blinking_frequency
+        self._blinking_duty_cycle: float = blinking_duty_cycle
+        self._blinking_on_current: float = blinking_on_current
+        self._blinking_off_current: float = blinking_off_current
+        self._blinking_passed: bool = blinking_passed
 
     @property
     def x(self) -> int:
@@ -55,6 +81,78 @@ class DPSLog:
     def fw_upload_message(self, value: str):
         self._fw_upload_message = value
 
+    @property
+    def fw_programming_skipped(self) -> bool:
+        return self._fw_programming_skipped
+
+    @fw_programming_skipped.setter
+    def fw_programming_skipped(self, value: bool):
+        self._fw_programming_skipped = value
+
+    @property
+    def fw_failure(self) -> str:
+        return self._fw_failure
+
+    @fw_failure.setter
+    def fw_failure(self, value: str):
+        self._fw_failure = value
+
+    @property
+    def fw_attempts(self) -> int:
+        return self._fw_attempts
+
+    @fw_attempts.setter
+    def fw_attempts(self, value: int):
+        self._fw_attempts = value
+
+    @property
+    def led_current_offset(self) -> float:
+        return self._led_current_offset
+
+    @led_current_offset.setter
+    def led_current_offset(self, value: float):
+        self._led_current_offset = value
+
+    @property
+    def led_current_offset_age(self) -> float:
+        return self._led_current_offset_age
+
+    @led_current_offset_age.setter
+    def led_current_offset_age(self, value: float):
+        self._led_current_offset_age = value
+
+    @property
+    def settle_time_mode1(self) -> float:
+        return self._settle_time_mode1
+
+    @settle_time_mode1.setter
+    def settle_time_mode1(self, value: float):
+        self._settle_time_mode1 = value
+
+    @property
+    def settle_time_mode2(self) -> float:
+        return self._settle_time_mode2
+
+    @settle_time_mode2.setter
+    def settle_time_mode2(self, value: float):
+        self._settle_time_mode2 = value
+
+    @property
+    def test_confidence(self) -> float:
+        return self._test_confidence
+
+    @test_confidence.setter
+    def test_confidence(self, value: float):
+        self._test_confidence = value
+
+    @property
+    def adc_samples(self) -> int:
+        return self._adc_samples
+
+    @adc_samples.setter
+    def adc_samples(self, value: int):
+        self._adc_samples = value
+
     @property
     def led_current_mode1_passed(self) -> bool:
         return self._led_current_mode1_passed
@@ -119,22 +217,69 @@ class DPSLog:
     def r_feedback_voltage(self, value: float):
         self._r_feedback_voltage = value
 
+    @property
+    def blinking_frequency(self) -> float:
+        return self._blinking_frequency
+
+    @blinking_frequency.setter
+    def blinking_frequency(self, value: float):
+        self._blinking_frequency = value
+
+    @property
+    def blinking_duty_cycle(self) -> float:
+        return self._blinking_duty_cycle
+
+    @blinking_duty_cycle.setter
+    def blinking_duty_cycle(self, value: float):
+        self._blinking_duty_cycle = value
+
+    @property
+    def blinking_on_current(self) -> float:
+        return self._blinking_on_current
+
+    @blinking_on_current.setter
+    def blinking_on_current(self, value: float):
+        self._blinking_on_current = value
+
+    @property
+    def blinking_off_current(self) -> float:
+        return self._blinking_off_current
+
+    @blinking_off_current.setter
+    def blinking_off_current(self, value: float):
+        self._blinking_off_current = value
+
+    @property
+    def blinking_passed(self) -> bool:
+        return self._blinking_passed
+
+    @blinking_passed.setter
+    def blinking_passed(self, value: bool):
+        self._blinking_passed = value
+
     @property
     def operation_successful(self):
         return (self.fw_uploaded and
                 self.led_current_mode1_passed and
                 (self.led_current_mode2_passed if self.led_current_mode2 is not None else True) and
                 self.button_led_voltage_passed and
-                self.r_feedback_voltage_passed)
+                self.r_feedback_voltage_passed and
+                (self.blinking_passed if self.blinking_passed is not None else True))
 
     def __str__(self):
         return f"Coordinates (x, y): ({self.x}, {self.y})\n" \
                f"Firmware Uploaded: {self.fw_uploaded}\n" \
                f"Firmware Upload Message: {self.fw_upload_message}\n" \
+               f"Firmware Programming Skipped: {self.fw_programming_skipped}\n" \
+               f"Firmware Failure: {self.fw_failure} (Attempts: {self.fw_attempts})\n" \
+               f"LED Current Offset: {self.led_current_offset} mV (Age: {self.led_current_offset_age} s)\n" \
+               f"Settle Time Mode 1: {self.settle_time_mode1} s, Mode 2: {self.settle_time_mode2} s\n" \
+               f"Test Confidence: {self.test_confidence} (ADC Samples: {self.adc_samples})\n" \
                f"LED Current Mode 1: {self.led_current_mode1} (Passed: {self.led_current_mode1_passed})\n" \
                f"LED Current Mode 2: {self.led_current_mode2} (Passed: {self.led_current_mode2_passed})\n" \
                f"Button LED Voltage: {self.button_led_voltage} (Passed: {self.button_led_voltage_passed})\n" \
                f"R Feedback Voltage: {self.r_feedback_voltage} (Passed: {self.r_feedback_voltage_passed})\n" \
+               f"Blinking: {self.blinking_frequency} Hz, {self.blinking_duty_cycle} %, {self.blinking_on_current}/{self.blinking_off_current} mA (Passed: {self.blinking_passed})\n" \
                f"Operation Successful: {self.operation_successful}"
 
 
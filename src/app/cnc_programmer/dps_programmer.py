@@ -1,47 +1,171 @@
 import logging
+import os
+import re
+import signal
 import time
-from subprocess import PIPE, run, CalledProcessError, CompletedProcess
+import unittest
+from enum import Enum
+from subprocess import PIPE, CompletedProcess, Popen, TimeoutExpired
 
+from app.cnc_programmer.programmer_session import ProgrammerSession, ProgrammerSessionError, ProgrammerSessionTimeout
 from app.cnc_programmer.rpi_board import RPiBoard
+from lib.fake_n14 import FAKE_N14_COMMAND
+from lib.hal_backend import is_simulated
+
+
+class ProgrammingFailure(Enum):
+    NO_TARGET = "no_target"  # no device answers (bad contact, DPS not powered)
+    VERIFY_FAILED = "verify_failed"
+    TIMEOUT = "timeout"
+    FILE_ERROR = "file_error"
+    OTHER = "other"
+
+    @property
+    def retriable(self) -> bool:
+        # failures a re-seat of the head may fix
+        return self in (ProgrammingFailure.NO_TARGET, ProgrammingFailure.VERIFY_FAILED, ProgrammingFailure.TIMEOUT)
+
+
+# patterns of the programmer output (n14, ICSP backend), the first match classifies the failure
+FAILURE_PATTERNS: [(ProgrammingFailure, re.Pattern)] = [
+    (ProgrammingFailure.FILE_ERROR, re.compile(r"cannot open|no such file", re.IGNORECASE)),
+    (ProgrammingFailure.NO_TARGET, re.compile(r"device not (found|detected)|no (target|device)|device id|unknown device", re.IGNORECASE)),
+    (ProgrammingFailure.VERIFY_FAILED, re.compile(r"verif", re.IGNORECASE)),
+]
+
+
+def classify_programming_failure(completed_process: CompletedProcess) -> ProgrammingFailure | None:
+    # None --> success
+    if completed_process.returncode == 0:
+        return None
+    if completed_process.returncode == DPSProgrammer.TIMEOUT_RETURNCODE:
+        return ProgrammingFailure.TIMEOUT
+    output: str = f"{completed_process.stdout or ''}\n{completed_process.stderr or ''}"
+    for failure, pattern in FAILURE_PATTERNS:
+        if pattern.search(output):
+            return failure
+    return ProgrammingFailure.OTHER
 
 
 class DPSProgrammer:
+    # programmer backend: the n14 process (see create_dps_programmer)
+    NAME = "n14"
+
     ERASE_COMMAND = "blank"
     LOAD_COMMAND = "program"
+    VERIFY_COMMAND = "verify"
+
+    DEFAULT_TIMEOUT_S: float = 60.0
+    TIMEOUT_RETURNCODE: int = 124  # return code of a command that did not finish in time (as coreutils timeout)
 
     def __init__(self) -> None:
         self.pickle_path: str = ''
         self.firmware_path: str = ''
+        # time limit of one command (attempt)
+        self.timeout_s: float = DPSProgrammer.DEFAULT_TIMEOUT_S
+        # the programmer supports the session mode (one process for the whole plate, see programmer_session.py)
+        self.session_supported: bool = False
+        self.session: ProgrammerSession | None = None
         self.set_config()
 
-    def set_config(self, pickle_path="~/.local/bin/n14", firmware_path="./resources/app.hex"):
+    def set_config(self, pickle_path="~/.local/bin/n14", firmware_path="./resources/app.hex", session_supported=False, timeout_s=DEFAULT_TIMEOUT_S):
+        # simulated hardware --> fake n14 with the latency of the real programmer (supports the session mode)
+        pickle_path = FAKE_N14_COMMAND if is_simulated() else pickle_path
+        if self.session is not None and pickle_path != self.session.programmer_path:
+            self.close_session()
         self.pickle_path = pickle_path
         self.firmware_path = firmware_path
+        self.session_supported = session_supported or is_simulated()
+        self.timeout_s = timeout_s
+
+    def open_session(self) -> None:
+        # load()/erase() are executed by the session until it is closed, nothing happens when the sessions are not supported
+        if not self.session_supported or self.session is not None:
+            return
+        self.session = ProgrammerSession(self.pickle_path)
+        try:
+            self.session.open()
+        except ProgrammerSessionError as e:
+            logging.warning(f"Programmer session not available, a process is started for every command: {e}")
+            self.session = None
+
+    def close_session(self) -> None:
+        if self.session is not None:
+            self.session.close()
+            self.session = None
 
     def erase(self) -> CompletedProcess:
+        if self.session is not None:
+            return self._execute_in_session([DPSProgrammer.ERASE_COMMAND], self._erase_cmd())
         erase_cmd: str = self._erase_cmd()
         logging.info(f"Executing ERASE with cmd: {erase_cmd}")
         return self._execute(erase_cmd)
 
     def load(self) -> CompletedProcess:
+        if self.session is not None:
+            return self._execute_in_session([DPSProgrammer.LOAD_COMMAND, os.path.expanduser(self.firmware_path), "1"], self._load_cmd())
         load_cmd: str = self._load_cmd()
         logging.info(f"Executing LOAD with cmd: {load_cmd}")
         return self._execute(load_cmd)
 
+    def verify(self) -> CompletedProcess:
+        # returncode 0 --> the device already holds the firmware
+        if self.session is not None:
+            return self._execute_in_session([DPSProgrammer.VERIFY_COMMAND, os.path.expanduser(self.firmware_path)], self._verify_cmd())
+        verify_cmd: str = self._verify_cmd()
+        logging.info(f"Executing VERIFY with cmd: {verify_cmd}")
+        return self._execute(verify_cmd)
+
     def _erase_cmd(self) -> str:
         return f'{self.pickle_path} {DPSProgrammer.ERASE_COMMAND}'
 
     def _load_cmd(self, erase=1) -> str:
         return f'{self.pickle_path} {DPSProgrammer.LOAD_COMMAND} {self.firmware_path} {erase}'
 
+    def _verify_cmd(self) -> str:
+        return f'{self.pickle_path} {DPSProgrammer.VERIFY_COMMAND} {self.firmware_path}'
+
+    def _execute_in_session(self, command_args: [str], command: str) -> CompletedProcess:
+        # command: the same command for a programmer process, executed when the session fails
+        logging.info(f"Executing in session: {command_args}")
+        try:
+            completed_process: CompletedProcess = self.session.execute(command_args, self.timeout_s)
+        except ProgrammerSessionTimeout as e:
+            # the session is restarted by the next command
+            logging.info(f"Session TIMEOUT: {e}")
+            return CompletedProcess(command_args, DPSProgrammer.TIMEOUT_RETURNCODE, "", f"Error: {e}\n")
+        except ProgrammerSessionError as e:
+            # the session is dropped (e.g. the programmer does not support it), the DPS is not to blame:
+            # the command is executed by a programmer process, as are the following ones
+            logging.warning(f"Session FAILED, a process is started for every command: {e}")
+            self.close_session()
+            logging.info(f"Executing with cmd: {command}")
+            return self._execute(command)
+        logging.info(f"Session exit code: {completed_process.returncode}, output: {completed_process.stdout}")
+        return completed_process
+
     def _execute(self, command: str) -> CompletedProcess:
+        # NOTE: the shell and the programmer run in a new process group, the whole group is killed on timeout
+        process: Popen = Popen(command, shell=True, stdout=PIPE, stderr=PIPE, universal_newlines=True, start_new_session=True)
         try:
-            completed_process: CompletedProcess = run(command, shell=True, stdout=PIPE, stderr=PIPE, universal_newlines=True)
-            logging.info(f"Process exit code: {completed_process.returncode}, output: {completed_process.stdout}")
-            return completed_process
-        except CalledProcessError as e:
-            logging.info(f"Process FAILED with exit code: {e.returncode}, output: {e.stderr}")
+            stdout, stderr = process.communicate(timeout=self.timeout_s)
+        except TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+            stdout, stderr = process.communicate()
+            logging.info(f"Process TIMEOUT after {self.timeout_s} s, output: {stdout}")
+            return CompletedProcess(command, DPSProgrammer.TIMEOUT_RETURNCODE, stdout, f"{stderr}Error: timeout after {self.timeout_s} s\n")
+        logging.info(f"Process exit code: {process.returncode}, output: {stdout}")
+        return CompletedProcess(command, process.returncode, stdout, stderr)
+
 
+def create_dps_programmer(name: str, board: RPiBoard) -> DPSProgrammer:
+    # name: n14 (external programmer process), icsp (in-process programming over the ICSP pins)
+    if name == "icsp":
+        from app.cnc_programmer.icsp import ICSPProgrammer
+        return ICSPProgrammer(board)
+    if name != DPSProgrammer.NAME:
+        raise ValueError(f"Unknown programmer: {name}")
+    return DPSProgrammer()
 
 
 def test():
@@ -57,5 +181,39 @@ def test():
     board.dps_power_supply_pin.value = True
 
 
+class TestDPSProgrammer(unittest.TestCase):
+
+    def test_classification(self):
+        self.assertIsNone(classify_programming_failure(CompletedProcess("", 0, "", "")))
+        self.assertEqual(classify_programming_failure(CompletedProcess("", 1, "n14: Error: device not found\n", "")), ProgrammingFailure.NO_TARGET)
+        self.assertEqual(classify_programming_failure(CompletedProcess("", 1, "Error: verify failed at 0x0123\n", "")), ProgrammingFailure.VERIFY_FAILED)
+        self.assertEqual(classify_programming_failure(CompletedProcess("", 1, "", "n14: Error: cannot open file\n")), ProgrammingFailure.FILE_ERROR)
+        self.assertEqual(classify_programming_failure(CompletedProcess("", DPSProgrammer.TIMEOUT_RETURNCODE, "", "")), ProgrammingFailure.TIMEOUT)
+        self.assertEqual(classify_programming_failure(CompletedProcess("", 2, "", "")), ProgrammingFailure.OTHER)
+        self.assertFalse(ProgrammingFailure.FILE_ERROR.retriable)
+
+    def test_timeout_kills_programmer(self):
+        programmer = DPSProgrammer()
+        programmer.timeout_s = 0.2
+        start = time.perf_counter()
+        completed_process = programmer._execute("sleep 5; echo done")
+        self.assertLess(time.perf_counter() - start, 2.0)
+        self.assertEqual(classify_programming_failure(completed_process), ProgrammingFailure.TIMEOUT)
+
+    def test_session_failure_falls_back_to_process(self):
+        # e.g. the real n14 (no session command): the command is executed by a process, the DPS does not fail
+        from unittest import mock
+        programmer = DPSProgrammer()
+        programmer.pickle_path = "echo"
+        session = mock.Mock()
+        session.execute.side_effect = ProgrammerSessionError("programmer session exited")
+        programmer.session = session
+        completed_process = programmer.erase()
+        self.assertIsNone(classify_programming_failure(completed_process))
+        self.assertEqual(completed_process.stdout, f"{DPSProgrammer.ERASE_COMMAND}\n")
+        self.assertIsNone(programmer.session)
+        session.close.assert_called_once()
+
+
 if __name__ == "__main__":
     test()
@@ -0,0 +1,203 @@
+import hashlib
+import logging
+import os
+import threading
+import unittest
+from typing import Dict, Iterator, List, Tuple
+
+# Firmware image of the PIC16F153xx parts parsed from Intel HEX once per file:
+# program memory in a bytearray (little endian words, erased words are 0x3FFF), configuration memory words,
+# used rows and a content hash, images are cached by the path and the modification time of the file
+
+PROGRAM_MEMORY_WORDS: int = 2048
+ROW_WORDS: int = 32
+WORD_MASK: int = 0x3FFF
+BLANK_WORD: int = 0x3FFF  # erased program memory word
+
+CONFIG_MEMORY_ADDRESS: int = 0x8000  # user IDs, device ID and configuration words
+CONFIG_MEMORY_WORDS: int = 0x20
+
+RECORD_DATA = 0x00
+RECORD_END_OF_FILE = 0x01
+RECORD_EXTENDED_SEGMENT_ADDRESS = 0x02
+RECORD_START_SEGMENT_ADDRESS = 0x03
+RECORD_EXTENDED_LINEAR_ADDRESS = 0x04
+RECORD_START_LINEAR_ADDRESS = 0x05
+
+
+class HexFormatError(ValueError):
+    pass
+
+
+class FirmwareImage:
+
+    def __init__(self, path: str, program: bytearray, config_words: Dict[int, int]) -> None:
+        self._path: str = path
+        # 2 bytes per word, PROGRAM_MEMORY_WORDS words
+        self._program: bytearray = program
+        self._config_words: Dict[int, int] = config_words
+        self._used_rows: List[int] = [address for address in range(0, PROGRAM_MEMORY_WORDS, ROW_WORDS)
+                                      if any(word != BLANK_WORD for word in self.row(address))]
+        self._sha256: str = hashlib.sha256(bytes(program) + b"".join(address.to_bytes(2, "little") + word.to_bytes(2, "little")
+                                                                   for address, word in sorted(config_words.items()))).hexdigest()
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def config_words(self) -> Dict[int, int]:
+        return self._config_words
+
+    @property
+    def used_rows(self) -> List[int]:
+        # addresses of the program memory rows that are not blank
+        return self._used_rows
+
+    @property
+    def sha256(self) -> str:
+        return self._sha256
+
+    def word(self, address: int) -> int:
+        if address >= CONFIG_MEMORY_ADDRESS:
+            return self._config_words.get(address, BLANK_WORD)
+        return self._program[2 * address] | (self._program[2 * address + 1] << 8)
+
+    def row(self, address: int) -> List[int]:
+        return [self.word(address + offset) for offset in range(ROW_WORDS)]
+
+    def rows(self) -> Iterator[Tuple[int, List[int]]]:
+        # (row address, words) of the used rows
+        for address in self._used_rows:
+            yield address, self.row(address)
+
+    def words(self) -> Dict[int, int]:
+        # words that are not blank and the configuration words
+        words: Dict[int, int] = {address: word for row_address, row in self.rows() for address, word in enumerate(row, row_address) if word != BLANK_WORD}
+        words.update(self._config_words)
+        return words
+
+    def __str__(self) -> str:
+        return f"FirmwareImage({os.path.basename(self._path)}, {len(self._used_rows)} rows, {len(self._config_words)} configuration words, sha256={self._sha256[:12]})"
+
+
+def parse_intel_hex(path: str) -> FirmwareImage:
+    # HexFormatError: malformed records, wrong checksums, addresses out of the memory of the part, missing end of file
+    program: bytearray = bytearray(b"\xff\x3f" * PROGRAM_MEMORY_WORDS)
+    config_words: Dict[int, int] = {}
+    base: int = 0
+    end_of_file: bool = False
+    with open(path) as hex_file:
+        for line_number, line in enumerate(hex_file, 1):
+            line = line.strip()
+            if not line:
+                continue
+            if end_of_file:
+                raise HexFormatError(f"line {line_number}: data after the end of file record")
+            if not line.startswith(":") or len(line) < 11 or len(line) % 2 == 0:
+                raise HexFormatError(f"line {line_number}: not an Intel HEX record")
+            try:
+                record: bytes = bytes.fromhex(line[1:])
+            except ValueError:
+                raise HexFormatError(f"line {line_number}: not an Intel HEX record")
+            length, address, record_type, data = record[0], (record[1] << 8) | record[2], record[3], record[4:-1]
+            if len(data) != length:
+                raise HexFormatError(f"line {line_number}: length {length} does not match the record")
+            if sum(record) & 0xFF:
+                raise HexFormatError(f"line {line_number}: wrong checksum")
+
+            if record_type == RECORD_DATA:
+                if length % 2 or (base + address) % 2:
+                    raise HexFormatError(f"line {line_number}: data not aligned to words")
+                for i in range(0, length, 2):
+                    word_address: int = (base + address + i) // 2
+                    word: int = data[i] | (data[i + 1] << 8)
+                    if word_address < PROGRAM_MEMORY_WORDS:
+                        program[2 * word_address: 2 * word_address + 2] = (word & WORD_MASK).to_bytes(2, "little")
+                    elif CONFIG_MEMORY_ADDRESS <= word_address < CONFIG_MEMORY_ADDRESS + CONFIG_MEMORY_WORDS:
+                        config_words[word_address] = word & WORD_MASK
+                    else:
+                        raise HexFormatError(f"line {line_number}: address 0x{word_address:04X} out of the memory")
+            elif record_type == RECORD_END_OF_FILE:
+                end_of_file = True
+            elif record_type == RECORD_EXTENDED_SEGMENT_ADDRESS:
+                base = ((data[0] << 8) | data[1]) << 4
+            elif record_type == RECORD_EXTENDED_LINEAR_ADDRESS:
+                base = ((data[0] << 8) | data[1]) << 16
+            elif record_type not in (RECORD_START_SEGMENT_ADDRESS, RECORD_START_LINEAR_ADDRESS):
+                raise HexFormatError(f"line {line_number}: unknown record type {record_type}")
+    if not end_of_file:
+        raise HexFormatError("end of file record missing")
+    return FirmwareImage(path, program, config_words)
+
+
+# (path, modification time) --> image
+_image_cache: Dict[Tuple[str, int], FirmwareImage] = {}
+_image_cache_lock: threading.Lock = threading.Lock()
+
+
+def load_firmware_image(path: str) -> FirmwareImage:
+    # OSError: missing file, HexFormatError: bad file
+    path = os.path.abspath(os.path.expanduser(path))
+    key: Tuple[str, int] = (path, os.stat(path).st_mtime_ns)
+    with _image_cache_lock:
+        image: FirmwareImage | None = _image_cache.get(key)
+        if image is None:
+            image = parse_intel_hex(path)
+            # older versions of the file are dropped
+            for cached_key in [cached_key for cached_key in _image_cache if cached_key[0] == path]:
+                del _image_cache[cached_key]
+            _image_cache[key] = image
+            logging.info(f"Firmware image loaded: {image}")
+        return image
+
+
+def clear_firmware_images() -> None:
+    with _image_cache_lock:
+        _image_cache.clear()
+
+
+class TestFirmwareImage(unittest.TestCase):
+    HEX_PATH = f"{os.path.dirname(os.path.abspath(__file__))}/resources/app.hex"
+
+    def _write_hex(self, directory: str, lines: List[str]) -> str:
+        path = f"{directory}/test.hex"
+        with open(path, "w") as hex_file:
+            hex_file.write("\n".join(lines) + "\n")
+        return path
+
+    def test_parse(self):
+        image = parse_intel_hex(TestFirmwareImage.HEX_PATH)
+        # :08000000803102288731FC2F3A
+        self.assertEqual(image.word(0), 0x3180)
+        self.assertEqual(image.word(3), 0x2FFC)
+        self.assertEqual(image.word(0x8007), 0x3FED)
+        self.assertEqual(image.used_rows[0], 0)
+        self.assertEqual(len(image.used_rows), 8)
+        self.assertEqual(image.words()[0x8007], 0x3FED)
+
+    def test_cache(self):
+        import tempfile
+        clear_firmware_images()
+        with tempfile.TemporaryDirectory() as directory:
+            path = self._write_hex(directory, [":020000000231CB", ":00000001FF"])
+            image = load_firmware_image(path)
+            self.assertIs(load_firmware_image(path), image)
+            self._write_hex(directory, [":020000000331CA", ":00000001FF"])
+            os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1000000))
+            changed_image = load_firmware_image(path)
+        self.assertIsNot(changed_image, image)
+        self.assertNotEqual(changed_image.sha256, image.sha256)
+        self.assertEqual(changed_image.word(0), 0x3103)
+
+    def test_bad_files(self):
+        import tempfile
+        with tempfile.TemporaryDirectory() as directory:
+            for lines in ([":020000000231CC", ":00000001FF"],  # checksum
+                          [":020000000231CB"],  # end of file
+                          ["02000000023100"],  # not a record
+                          [":04000000023100C7", ":00000001FF"]):  # length
+                with self.assertRaises(HexFormatError):
+                    parse_intel_hex(self._write_hex(directory, lines))
+            with self.assertRaises(OSError):
+                load_firmware_image(f"{directory}/missing.hex")
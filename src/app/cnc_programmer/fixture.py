@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from app.cnc_programmer.dps_programmer import DPSProgrammer, create_dps_programmer
+from app.cnc_programmer.rpi_board import HeadPins, RPiBoard
+from app.cnc_programmer.tester import Tester
+
+# Fixture with K pogo heads side by side in X (one column apart): every head has its own power supply, button and ICSP pins,
+# its own ADS1115 (ADC mux channels) on the shared I2C bus, its own programmer and tester,
+# one plunge programs and tests the DPS under all the heads concurrently (see CNCRunner.cycle)
+
+
+class FixtureHead:
+
+    def __init__(self, index: int, board: RPiBoard, programmer: DPSProgrammer, tester: Tester) -> None:
+        self.index: int = index
+        self.board: RPiBoard = board
+        self.programmer: DPSProgrammer = programmer
+        self.tester: Tester = tester
+
+    @staticmethod
+    def create(index: int, board: RPiBoard, programmer_name: str, pins: HeadPins, adc_address: int) -> FixtureHead:
+        # head of the fixture of the board (the board of the first head) wired to the pins and the ADC
+        head_board: RPiBoard = board.create_head(index, pins, adc_address)
+        return FixtureHead(index, head_board, create_dps_programmer(programmer_name, head_board), Tester(head_board))
+
+    def __str__(self) -> str:
+        return f"FixtureHead({self.index}, ADC 0x{self.board.adc_address:02X})"
+
+
+TEST_HEAD_PINS: HeadPins = RPiBoard.resolve_head_pins(("D12", "D16", "D4", "D25", "D26"))
+
+
+class TestFixtureHead(unittest.TestCase):
+    # NOTE: runs on the simulated hardware (SCILIF_HAL=simulated python -m unittest app.cnc_programmer.fixture),
+    # the second head is wired as in test.conf
+
+    def setUp(self):
+        from app.cnc_programmer.dps_mode import FirmwareType
+        from app.cnc_programmer.simulation import SimulatedDPS
+        self.dps = [SimulatedDPS(lambda: FirmwareType.MAX_ONLY, noise_V=0.0), SimulatedDPS(lambda: FirmwareType.MAX_ONLY, noise_V=0.0, pins=TEST_HEAD_PINS, adc_address=0x49)]
+        self.board = RPiBoard(stepper=False)
+        self.heads = [FixtureHead(0, self.board, DPSProgrammer(), Tester(self.board)), FixtureHead.create(1, self.board, DPSProgrammer.NAME, TEST_HEAD_PINS, 0x49)]
+
+    def tearDown(self):
+        for head in self.heads:
+            head.board.dps_inactivate()
+        for dps in self.dps:
+            dps.disconnect()
+
+    def test_pin_check(self):
+        RPiBoard.check_head_pins([RPiBoard.DEFAULT_HEAD_PINS, TEST_HEAD_PINS])
+        # a stepper pin, a pin of another head
+        with self.assertRaises(ValueError):
+            RPiBoard.check_head_pins([RPiBoard.DEFAULT_HEAD_PINS, TEST_HEAD_PINS._replace(vpp=RPiBoard.PIN_STEPPER_X_STEP)])
+        with self.assertRaises(ValueError):
+            RPiBoard.check_head_pins([RPiBoard.DEFAULT_HEAD_PINS, TEST_HEAD_PINS._replace(pgc=RPiBoard.PIN_DPS_PGC)])
+        with self.assertRaises(ValueError):
+            RPiBoard.resolve_head_pins(("D12", "D16", "D4", "D25", "D99"))
+
+    def test_heads_are_independent(self):
+        self.assertIs(self.heads[1].board.i2c, self.board.i2c)
+        # only the DPS of the second head is powered
+        self.heads[1].board.dps_activate()
+        self.assertFalse(self.dps[0].powered)
+        self.assertTrue(self.dps[1].powered)
+        with ThreadPoolExecutor(len(self.heads)) as executor:
+            voltages = list(executor.map(lambda head: head.tester.adc.measure_voltage_on_button_led_mV(), self.heads))
+        self.assertAlmostEqual(voltages[0], 0, delta=5)
+        self.assertAlmostEqual(voltages[1], 2300, delta=5)
+
+    def test_icsp_per_head(self):
+        import os
+        from app.cnc_programmer.icsp import ICSPProgrammer
+        head = FixtureHead.create(1, self.board, ICSPProgrammer.NAME, TEST_HEAD_PINS, 0x49)
+        head.programmer.set_config(firmware_path=f"{os.path.dirname(os.path.abspath(__file__))}/resources/app.hex")
+        self.assertEqual(head.programmer.load().returncode, 0)
+        self.assertGreater(self.dps[1].pic.rows_written, 0)
+        self.assertEqual(self.dps[0].pic.rows_written, 0)
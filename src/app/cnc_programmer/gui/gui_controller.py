@@ -13,8 +13,10 @@ from app.cnc_programmer.config.firmware import FirmwareConfig
 from app.cnc_programmer.config.plate import PlateConfig
 from app.cnc_programmer.dps_log import DPSLog
 from app.cnc_programmer.dps_mode import FirmwareType
+from app.cnc_programmer.firmware_image import HexFormatError, load_firmware_image
 from app.cnc_programmer.gui.gui_view import GUIView, Messages, create_root_window, PADX, PADY
 from app.cnc_programmer.gui.messages_formatter import MessagesFormatter
+from app.cnc_programmer.gui.update_bus import GUIUpdateBus
 from app.cnc_programmer.stepper.position import Axis
 from app.cnc_programmer.stepper.state import CNCRunnerState
 
@@ -101,6 +103,9 @@ class GUIController:
     def __init__(self, view: GUIView, external: "CNCRunner"):
         self.model: GUIModel = GUIModel(external)
         self.view: GUIView = view
+        # the ex_evt_* updates of the runner threads are applied in the main thread
+        self.update_bus: GUIUpdateBus = GUIUpdateBus(view.root)
+        self.update_bus.start()
         # bind callbacks
         self.bind_callbacks()
         # initial setup
@@ -149,6 +154,8 @@ class GUIController:
         if self.model.external is not None:
             self.model.external.stop()
 
+        self.update_bus.stop()
+        logging.info(f"[GUI]: {self.update_bus.stats}")
         self.view.root.destroy()
 
     def evt_browse_files_clicked(self) -> None:
@@ -170,6 +177,15 @@ class GUIController:
     def evt_upload_config_clicked(self) -> None:
         try:
             config = CNCProgrammerConfigParser(self.model.selected_config_path).parse_config()
+            # firmware files are parsed (and cached) now, a bad file must not stop the plate in the middle
+            for firmware_config in config.firmware_configs.values():
+                try:
+                    load_firmware_image(firmware_config.path)
+                except (OSError, HexFormatError) as e:
+                    logging.error(f"[GUI]: Firmware {firmware_config.path} rejected: {e}")
+                    self.view.upload_message.config(text=f"{Messages.ERROR_FIRMWARE_FILE.value} ({os.path.basename(firmware_config.path)})", foreground="red")
+                    self.set_view_state()
+                    return
             # update model (external)
             selected_firmware_config = list(config.firmware_configs.values())[0]
             selected_plate_config = list(config.plate_configs.values())[0]
@@ -298,18 +314,13 @@ class GUIController:
         # update view
         self.set_view_state()
 
+    # region EXTERNAL EVENTS (any thread, applied by the update bus)
     def ex_evt_update_current_pos(self, current_pos_x: int, current_pos_y: int) -> None:
-        # do not set position when home is not set
-        if not self.model.home_set:
-            return
-        if current_pos_x is not None and current_pos_y is not None:
-            self.view.cycle_rectangles[current_pos_x, current_pos_y].config(bg="white")
-            self.view.current_pos_label.config(text=GUIView.CURRENT_POS_TEXT.replace("{value}", f"[{current_pos_x},{current_pos_y}]"))
+        self.update_bus.post(self._update_current_pos, current_pos_x, current_pos_y, key=("current_pos", current_pos_x, current_pos_y))
 
     def ex_evt_update_current_pos_mm(self, current_pos_mm: [float, float, float]) -> None:
-        current_pos_mm_text: str = GUIView.CURRENT_POS_TEXT_MM.replace("{value}", f"[{current_pos_mm[0]:.0f},{current_pos_mm[1]:.0f},{current_pos_mm[2]:.0f}]")
-        self.view.current_pos_label_mm.config(text=current_pos_mm_text)
-        self.view.manual_current_pos_label_mm.config(text=current_pos_mm_text)
+        # many updates while moving --> the latest one
+        self.update_bus.post(self._update_current_pos_mm, current_pos_mm, key="current_pos_mm")
 
     def ex_evt_update_state(self, state: CNCRunnerState) -> None:
         pass
@@ -317,14 +328,31 @@ class GUIController:
 
     def ex_evt_process_completed(self) -> None:
         logging.info("[GUI]: EVT process completed")
-        self.set_view_state()
+        self.update_bus.post(self.set_view_state, key="view_state")
 
     def ex_evt_automatic_cycle_completed(self) -> None:
         logging.info("[GUI]: Programming completed")
-        self.set_view_state()
+        self.update_bus.post(self.set_view_state, key="view_state")
 
     def ex_evt_update_dps_log(self, dps_log: DPSLog) -> None:
         logging.info("[GUI]: EVT DPS updated")
+        self.update_bus.post(self._update_dps_log, dps_log, key=("dps_log", dps_log.x, dps_log.y))
+    # endregion EXTERNAL EVENTS
+
+    def _update_current_pos(self, current_pos_x: int, current_pos_y: int) -> None:
+        # do not set position when home is not set
+        if not self.model.home_set:
+            return
+        if current_pos_x is not None and current_pos_y is not None:
+            self.view.cycle_rectangles[current_pos_x, current_pos_y].config(bg="white")
+            self.view.current_pos_label.config(text=GUIView.CURRENT_POS_TEXT.replace("{value}", f"[{current_pos_x},{current_pos_y}]"))
+
+    def _update_current_pos_mm(self, current_pos_mm: [float, float, float]) -> None:
+        current_pos_mm_text: str = GUIView.CURRENT_POS_TEXT_MM.replace("{value}", f"[{current_pos_mm[0]:.0f},{current_pos_mm[1]:.0f},{current_pos_mm[2]:.0f}]")
+        self.view.current_pos_label_mm.config(text=current_pos_mm_text)
+        self.view.manual_current_pos_label_mm.config(text=current_pos_mm_text)
+
+    def _update_dps_log(self, dps_log: DPSLog) -> None:
         # update view
         color: str = "green" if dps_log.operation_successful else "red"
         self.view.cycle_rectangles[dps_log.x, dps_log.y].config(bg=color)
@@ -26,6 +26,7 @@ MEDIUM_FONT = 11
 class Messages(Enum):
     ERROR_CONFIGURATION_SELECTION = "Žádná konfigurace nebyla vybrána!"
     ERROR_CONFIGURATION_PARSING = "Chyba v konfiguraci!"
+    ERROR_FIRMWARE_FILE = "Chybný nebo chybějící soubor firmwaru!"
     SUCCESS_CONFIGURATION_IMPORT = "Konfigurace byla úspěšně nahrána!"
 
 class MenuFrames(Enum):
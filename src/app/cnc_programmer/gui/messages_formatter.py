@@ -4,13 +4,25 @@ from app.cnc_programmer.dps_mode import FirmwareType
 
 
 class MessagesFormatter:
+    # ProgrammingFailure values
+    FW_FAILURES: dict[str, str] = {
+        "no_target": "DPS nenalezeno",
+        "verify_failed": "chyba ověření",
+        "timeout": "vypršel časový limit",
+        "file_error": "chyba souboru firmwaru",
+        "other": "chyba programátoru",
+    }
 
     @staticmethod
     def format_dps_ok_msg(config: FirmwareConfig, dps_log: DPSLog) -> str:
-        return (f"[programování]: Nahráno - {config.path.split('/')[-1]}\n" +
-                f"[testování]: Proud LED (mód 1) - {dps_log.led_current_mode1} mA\n" +
-                f"[testování]: Napětí LED tlačítka - {dps_log.button_led_voltage} mV\n" +
-                f"[testování]: Napětí ZV rezistoru - {dps_log.r_feedback_voltage} mV\n")
+        programming: str = "Ověřeno (již nahráno)" if dps_log.fw_programming_skipped else "Nahráno"
+        message: str = (f"[programování]: {programming} - {config.path.split('/')[-1]}\n" +
+                        f"[testování]: Proud LED (mód 1) - {dps_log.led_current_mode1} mA\n" +
+                        f"[testování]: Napětí LED tlačítka - {dps_log.button_led_voltage} mV\n" +
+                        f"[testování]: Napětí ZV rezistoru - {dps_log.r_feedback_voltage} mV\n")
+        if dps_log.blinking_passed is not None:
+            message += f"[testování]: Blikání - {dps_log.blinking_frequency:.2f} Hz, střída {dps_log.blinking_duty_cycle:.0f} %\n"
+        return message
 
     @staticmethod
     def format_dps_error_msg(config: FirmwareConfig, dps_log: DPSLog) -> str:
@@ -26,11 +38,14 @@ class MessagesFormatter:
                 message += MessagesFormatter.format_button_led_voltage_error_msg(config, dps_log)
             if not dps_log.r_feedback_voltage_passed:
                 message += MessagesFormatter.format_r_feedback_voltage_error_msg(config, dps_log)
+            if dps_log.blinking_passed is False:
+                message += MessagesFormatter.format_blinking_error_msg(config, dps_log)
             return message
 
     @staticmethod
     def format_fw_upload_error_msg(dps_log: DPSLog) -> str:
-        return f"ERROR [{dps_log.x},{dps_log.y}][programování]: {dps_log.fw_upload_message}\n\n"
+        failure: str = MessagesFormatter.FW_FAILURES.get(dps_log.fw_failure, "chyba programátoru")
+        return f"ERROR [{dps_log.x},{dps_log.y}][programování]: {failure} (pokusů: {dps_log.fw_attempts}) {dps_log.fw_upload_message}\n\n"
 
     @staticmethod
     def format_led_current_error_msg(config: FirmwareConfig, dps_log: DPSLog, mode: int = 1) -> str:
@@ -45,3 +60,11 @@ class MessagesFormatter:
     @staticmethod
     def format_r_feedback_voltage_error_msg(config: FirmwareConfig, dps_log: DPSLog) -> str:
         return f"ERROR [{dps_log.x},{dps_log.y}] [testování]: napětí ZV rezistoru mimo specifikaci {dps_log.r_feedback_voltage:.0f} mV x ({config.r_feedback_voltage[0]}, {config.r_feedback_voltage[1]}) mV\n\n"
+
+    @staticmethod
+    def format_blinking_error_msg(config: FirmwareConfig, dps_log: DPSLog) -> str:
+        if dps_log.blinking_duty_cycle is None:
+            return f"ERROR [{dps_log.x},{dps_log.y}] [testování]: LED nebliká\n\n"
+        return (f"ERROR [{dps_log.x},{dps_log.y}] [testování]: blikání mimo specifikaci {dps_log.blinking_frequency:.2f} Hz x {config.blinking_frequency} Hz, "
+                f"střída {dps_log.blinking_duty_cycle:.0f} % x {config.blinking_duty_cycle} %, "
+                f"proud {dps_log.blinking_on_current:.0f}/{dps_log.blinking_off_current:.0f} mA x {config.blinking_on_current}/{config.blinking_off_current} mA\n\n")
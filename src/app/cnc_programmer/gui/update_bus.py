@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+import unittest
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Hashable, List, Tuple
+
+# GUI update bus: the runner threads post the updates of the view, the Tk main thread applies them in one after() tick,
+# no widget is touched outside the main thread, redundant updates posted between two ticks are coalesced
+# (updates with the same key --> only the latest one is applied, at the position of the latest one)
+
+Update = Tuple[Hashable | None, Callable[..., None], Tuple[Any, ...]]
+
+
+class GUIUpdateStats:
+
+    def __init__(self) -> None:
+        self.posted: int = 0
+        self.applied: int = 0
+        self.ticks: int = 0
+        # main thread time [s] spent applying the updates
+        self.tk_time_s: float = 0.0
+
+    def __str__(self) -> str:
+        return f"GUIUpdateStats({self.applied}/{self.posted} updates applied in {self.ticks} ticks, {self.tk_time_s * 1000:.1f} ms in Tk)"
+
+
+class GUIUpdateBus:
+    DRAIN_INTERVAL_MS: int = 50
+
+    def __init__(self, root, interval_ms: int = DRAIN_INTERVAL_MS) -> None:
+        # root: Tk root (after, after_cancel)
+        self.root = root
+        self.interval_ms: int = interval_ms
+        # NOTE: deque.append and popleft are atomic, the updates are posted from any thread without a lock
+        self._updates: Deque[Update] = deque()
+        self._after_id: str | None = None
+        # updated by the main thread only
+        self.stats: GUIUpdateStats = GUIUpdateStats()
+
+    def start(self) -> None:
+        if self._after_id is None:
+            self._after_id = self.root.after(self.interval_ms, self._tick)
+
+    def stop(self) -> None:
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+
+    def post(self, function: Callable[..., None], *args, key: Hashable | None = None) -> None:
+        # function(*args) is called in the main thread, key: updates with the same key are coalesced (None --> never)
+        self._updates.append((key, function, args))
+
+    def _tick(self) -> None:
+        self.drain()
+        self._after_id = self.root.after(self.interval_ms, self._tick)
+
+    def drain(self) -> int:
+        # applies the posted updates (main thread), the number of the applied updates is returned
+        updates: List[Update] = []
+        while True:
+            try:
+                updates.append(self._updates.popleft())
+            except IndexError:
+                break
+        if not updates:
+            return 0
+        self.stats.posted += len(updates)
+        latest: Dict[Hashable, int] = {key: index for index, (key, _, _) in enumerate(updates) if key is not None}
+        start: float = time.perf_counter()
+        applied: int = 0
+        for index, (key, function, args) in enumerate(updates):
+            if key is not None and latest[key] != index:
+                continue
+            try:
+                function(*args)
+            except Exception as e:
+                # one failing update must not stop the bus
+                logging.error(f"[GUI]: Update {getattr(function, '__name__', function)} failed: {e}")
+            applied += 1
+        self.stats.tk_time_s += time.perf_counter() - start
+        self.stats.applied += applied
+        self.stats.ticks += 1
+        return applied
+
+
+class FakeRoot:
+    # after() of the Tk root without Tk (tests)
+
+    def __init__(self) -> None:
+        self.scheduled: Dict[str, Callable[[], None]] = {}
+        self._next_id: int = 0
+
+    def after(self, ms: int, function: Callable[[], None]) -> str:
+        self._next_id += 1
+        after_id: str = f"after#{self._next_id}"
+        self.scheduled[after_id] = function
+        return after_id
+
+    def after_cancel(self, after_id: str) -> None:
+        self.scheduled.pop(after_id, None)
+
+    def run_pending(self) -> None:
+        scheduled, self.scheduled = self.scheduled, {}
+        for function in scheduled.values():
+            function()
+
+
+class TestGUIUpdateBus(unittest.TestCase):
+
+    def setUp(self):
+        self.root = FakeRoot()
+        self.bus = GUIUpdateBus(self.root)
+        self.applied: List[Tuple[str, Any]] = []
+
+    def test_coalescing(self):
+        for pos in range(100):
+            self.bus.post(lambda value: self.applied.append(("pos", value)), pos, key="pos")
+        self.bus.post(lambda value: self.applied.append(("dps", value)), (0, 0))
+        self.bus.post(lambda value: self.applied.append(("dps", value)), (0, 1))
+        self.bus.post(lambda value: self.applied.append(("pos", value)), 100, key="pos")
+        self.assertEqual(self.bus.drain(), 3)
+        # the latest position only, at the position of the latest one
+        self.assertEqual(self.applied, [("dps", (0, 0)), ("dps", (0, 1)), ("pos", 100)])
+        self.assertEqual((self.bus.stats.posted, self.bus.stats.applied), (103, 3))
+
+    def test_tick_in_root_thread(self):
+        threads: List[int] = []
+        self.bus.start()
+        poster = threading.Thread(target=lambda: [self.bus.post(lambda: threads.append(threading.get_ident()), key="update") for _ in range(50)])
+        poster.start()
+        poster.join()
+        self.assertEqual(threads, [])
+        self.root.run_pending()
+        self.assertEqual(threads, [threading.get_ident()])
+        # the tick is scheduled again until the bus is stopped
+        self.assertEqual(len(self.root.scheduled), 1)
+        self.bus.stop()
+        self.assertEqual(self.root.scheduled, {})
+
+    def test_failing_update(self):
+        self.bus.post(lambda: 1 / 0)
+        self.bus.post(lambda: self.applied.append(("ok", None)))
+        self.assertEqual(self.bus.drain(), 2)
+        self.assertEqual(self.applied, [("ok", None)])
+
+
+def benchmark_update_bus(count: int = 2000, ticks: int = 20) -> None:
+    # main thread time in Tk of `count` position updates over `ticks` after() ticks (one update_idletasks per tick in both cases):
+    # a label update per position update vs. the updates of the bus drained every tick (coalesced to one per tick)
+    # NOTE: requires a display (python -m app.cnc_programmer.gui.update_bus)
+    import tkinter as tk
+    root = tk.Tk()
+    label = tk.Label(root, text="")
+    label.pack()
+
+    direct_s: float = 0.0
+    direct_applied: int = 0
+    for tick in range(ticks):
+        start: float = time.perf_counter()
+        for pos in range(count // ticks):
+            label.config(text=f"[{pos},0,0]")
+            direct_applied += 1
+        root.update_idletasks()
+        direct_s += time.perf_counter() - start
+
+    bus = GUIUpdateBus(root)
+    bus_s: float = 0.0
+    for tick in range(ticks):
+        for pos in range(count // ticks):
+            bus.post(lambda value: label.config(text=value), f"[{pos},0,0]", key="pos")
+        start = time.perf_counter()
+        bus.drain()
+        root.update_idletasks()
+        bus_s += time.perf_counter() - start
+    root.destroy()
+    print(f"direct: {direct_applied} updates applied, {ticks} update_idletasks, {direct_s * 1000:.1f} ms")
+    print(f"bus:    {bus.stats.applied}/{bus.stats.posted} updates applied, {ticks} update_idletasks, {bus_s * 1000:.1f} ms ({bus.stats})")
+
+
+if __name__ == "__main__":
+    benchmark_update_bus()
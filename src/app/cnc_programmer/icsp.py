@@ -0,0 +1,208 @@
+import logging
+import os
+import time
+import unittest
+from enum import IntEnum
+from subprocess import CompletedProcess
+
+from app.cnc_programmer.dps_programmer import DPSProgrammer
+from app.cnc_programmer.firmware_image import BLANK_WORD, CONFIG_MEMORY_ADDRESS, WORD_MASK, FirmwareImage, HexFormatError, load_firmware_image
+from app.cnc_programmer.rpi_board import RPiBoard
+from lib.hal import Direction
+
+# Native ICSP (In-Circuit Serial Programming) of the PIC16F153xx parts of the DPS by bit banging the VPP, PGD and PGC pins:
+# high voltage entry (VPP on MCLR), 8-bit commands followed by 24-bit payloads (MSB first, data word << 1),
+# PGD is latched by the device on the falling edge of PGC and driven by the device after the rising edge when reading
+
+DEVICE_ID_ADDRESS: int = 0x8006
+
+# timings of the programming specification
+T_ENTH_S: float = 0.00025  # VPP high --> first command
+T_ERAB_S: float = 0.0084  # bulk erase
+T_PINT_S: float = 0.0028  # internally timed row programming (program memory)
+T_PINT_CONFIG_S: float = 0.0056  # internally timed programming (configuration words)
+
+
+class ICSPCommand(IntEnum):
+    LOAD_PC_ADDRESS = 0x80
+    BULK_ERASE = 0x18
+    ROW_ERASE = 0xF0
+    LOAD_DATA = 0x00
+    LOAD_DATA_INC = 0x02
+    READ_DATA = 0xFC
+    READ_DATA_INC = 0xFE
+    INCREMENT_ADDRESS = 0xF8
+    BEGIN_INTERNALLY_TIMED = 0xE0
+
+
+COMMANDS_WITH_PAYLOAD = (ICSPCommand.LOAD_PC_ADDRESS, ICSPCommand.LOAD_DATA, ICSPCommand.LOAD_DATA_INC,
+                         ICSPCommand.READ_DATA, ICSPCommand.READ_DATA_INC)
+READ_COMMANDS = (ICSPCommand.READ_DATA, ICSPCommand.READ_DATA_INC)
+
+
+class ICSPPort:
+    # Bit banged ICSP of the DPS pins of the board
+
+    def __init__(self, board: RPiBoard) -> None:
+        self.board: RPiBoard = board
+
+    def enter(self) -> None:
+        # high voltage program mode entry (the DPS is powered)
+        self.board.init_ICSP_pins(vpp=True)
+        self.board.dps_pgc_pin.direction = Direction.OUTPUT
+        self.board.dps_pgd_pin.direction = Direction.OUTPUT
+        self.board.dps_pgc_pin.value = False
+        self.board.dps_pgd_pin.value = False
+        self.board.dps_vpp_pin.value = True
+        time.sleep(T_ENTH_S)
+
+    def exit(self) -> None:
+        self.board.dps_vpp_pin.value = False
+        self.board.dps_pgc_pin.value = False
+        self.board.dps_pgd_pin.value = False
+
+    def _send_bits(self, value: int, count: int) -> None:
+        pgd, pgc = self.board.dps_pgd_pin, self.board.dps_pgc_pin
+        for bit in range(count - 1, -1, -1):
+            pgd.value = bool((value >> bit) & 1)
+            pgc.value = True
+            pgc.value = False
+
+    def _receive_bits(self, count: int) -> int:
+        pgd, pgc = self.board.dps_pgd_pin, self.board.dps_pgc_pin
+        pgd.direction = Direction.INPUT
+        value: int = 0
+        for _ in range(count):
+            pgc.value = True
+            value = (value << 1) | int(pgd.value)
+            pgc.value = False
+        pgd.direction = Direction.OUTPUT
+        return value
+
+    def command(self, command: ICSPCommand, data: int = 0) -> None:
+        self._send_bits(command, 8)
+        if command in COMMANDS_WITH_PAYLOAD:
+            self._send_bits((data & 0xFFFF) << 1, 24)
+
+    def read(self, command: ICSPCommand = ICSPCommand.READ_DATA_INC) -> int:
+        self._send_bits(command, 8)
+        return (self._receive_bits(24) >> 1) & WORD_MASK
+
+
+class ICSPProgrammer(DPSProgrammer):
+    # DPS programmer backend programming the PIC in-process over the ICSP pins (no n14 process per DPS),
+    # the firmware image is parsed once per file (see firmware_image.load_firmware_image), blank rows are neither written nor verified
+
+    NAME = "icsp"
+
+    def __init__(self, board: RPiBoard) -> None:
+        self.port: ICSPPort = ICSPPort(board)
+        self.image: FirmwareImage | None = None
+        super().__init__()
+
+    def erase(self) -> CompletedProcess:
+        return self._run([DPSProgrammer.ERASE_COMMAND], self._erase)
+
+    def load(self) -> CompletedProcess:
+        return self._run([DPSProgrammer.LOAD_COMMAND, self.firmware_path], self._program)
+
+    def verify(self) -> CompletedProcess:
+        return self._run(["verify", self.firmware_path], self._verify)
+
+    def _run(self, args: [str], operation) -> CompletedProcess:
+        # result in the form of the n14 process: no output when successful, the error message otherwise
+        logging.info(f"[ICSP]: Executing {args}")
+        try:
+            if operation != self._erase:
+                self.image = load_firmware_image(self.firmware_path)
+        except (OSError, HexFormatError) as e:
+            return CompletedProcess(args, 1, f"Error: cannot open file: {e}\n", "")
+        self.port.enter()
+        try:
+            device_id: int = self.read_word(DEVICE_ID_ADDRESS)
+            if device_id in (0, WORD_MASK):
+                return CompletedProcess(args, 1, "Error: device not found\n", "")
+            error: str | None = operation()
+        finally:
+            self.port.exit()
+        logging.info(f"[ICSP]: {args[0]} finished: {error or 'OK'}")
+        return CompletedProcess(args, 0 if error is None else 1, "" if error is None else f"Error: {error}\n", "")
+
+    def read_word(self, address: int) -> int:
+        self.port.command(ICSPCommand.LOAD_PC_ADDRESS, address)
+        return self.port.read(ICSPCommand.READ_DATA)
+
+    def _erase(self) -> str | None:
+        # PC in the configuration memory --> program memory, user IDs and configuration words are erased
+        self.port.command(ICSPCommand.LOAD_PC_ADDRESS, CONFIG_MEMORY_ADDRESS)
+        self.port.command(ICSPCommand.BULK_ERASE)
+        time.sleep(T_ERAB_S)
+        return None
+
+    def _program(self) -> str | None:
+        self._erase()
+        for address, row in self.image.rows():
+            self.port.command(ICSPCommand.LOAD_PC_ADDRESS, address)
+            for word in row[:-1]:
+                self.port.command(ICSPCommand.LOAD_DATA_INC, word)
+            self.port.command(ICSPCommand.LOAD_DATA, row[-1])
+            self.port.command(ICSPCommand.BEGIN_INTERNALLY_TIMED)
+            time.sleep(T_PINT_S)
+        # configuration words are programmed one by one (last, they may enable the code protection)
+        for address, word in sorted(self.image.config_words.items()):
+            self.port.command(ICSPCommand.LOAD_PC_ADDRESS, address)
+            self.port.command(ICSPCommand.LOAD_DATA, word)
+            self.port.command(ICSPCommand.BEGIN_INTERNALLY_TIMED)
+            time.sleep(T_PINT_CONFIG_S)
+        return self._verify()
+
+    def _verify(self) -> str | None:
+        # configuration words first: a different firmware is usually rejected after a few reads
+        for address, word in sorted(self.image.config_words.items()):
+            read_word: int = self.read_word(address)
+            if read_word != word:
+                return f"verify failed at 0x{address:04X} (read 0x{read_word:04X}, expected 0x{word:04X})"
+        for address, row in self.image.rows():
+            self.port.command(ICSPCommand.LOAD_PC_ADDRESS, address)
+            for offset, word in enumerate(row):
+                read_word: int = self.port.read(ICSPCommand.READ_DATA_INC)
+                if read_word != word:
+                    return f"verify failed at 0x{address + offset:04X} (read 0x{read_word:04X}, expected 0x{word:04X})"
+        return None
+
+
+class TestICSPProgrammer(unittest.TestCase):
+    # NOTE: runs on the simulated hardware (SCILIF_HAL=simulated python -m unittest app.cnc_programmer.icsp)
+    HEX_PATH = f"{os.path.dirname(os.path.abspath(__file__))}/resources/app.hex"
+
+    def setUp(self):
+        from app.cnc_programmer.simulation import SimulatedPIC16
+        self.pic = SimulatedPIC16()
+        self.programmer = ICSPProgrammer(RPiBoard(stepper=False))
+        self.programmer.set_config(firmware_path=TestICSPProgrammer.HEX_PATH)
+
+    def tearDown(self):
+        self.pic.disconnect()
+
+    def test_program_and_verify(self):
+        self.pic.memory[0x100] = 0x1234  # erased by the bulk erase
+        completed_process = self.programmer.load()
+        self.assertEqual((completed_process.returncode, completed_process.stdout), (0, ""))
+        image = load_firmware_image(TestICSPProgrammer.HEX_PATH)
+        self.assertTrue(all(self.pic.memory.get(address, BLANK_WORD) == word for address, word in image.words().items()))
+        self.assertNotIn(0x100, self.pic.memory)
+        # only the used rows were written
+        self.assertEqual(self.pic.rows_written, len(image.used_rows))
+        self.assertEqual(self.programmer.verify().returncode, 0)
+
+    def test_verify_failure(self):
+        self.assertEqual(self.programmer.load().returncode, 0)
+        address = load_firmware_image(TestICSPProgrammer.HEX_PATH).used_rows[-1]
+        self.pic.memory[address] ^= 1
+        completed_process = self.programmer.verify()
+        self.assertEqual(completed_process.returncode, 1)
+        self.assertIn(f"0x{address:04X}", completed_process.stdout)
+
+    def test_no_device(self):
+        self.pic.disconnect()
+        self.assertEqual(self.programmer.load().stdout, "Error: device not found\n")
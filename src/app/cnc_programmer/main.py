@@ -9,12 +9,17 @@ import tkinter as tk
 from app.cnc_programmer.cnc_runner import CNCRunner
 from app.cnc_programmer.gui.gui_controller import GUIController
 from app.cnc_programmer.gui.gui_view import create_root_window, GUIView
+from lib.hal_backend import is_simulated, select_simulated_hal
 
 
-def run():
+def run(motion_process: bool = False, motion_cpu: int | None = None):
     try:
         # initialize CNC runner
-        cnc_runner = CNCRunner()
+        cnc_runner = CNCRunner(motion_process, motion_cpu)
+        if is_simulated():
+            # simulated DPS connected to the simulated board
+            from app.cnc_programmer.simulation import SimulatedDPS
+            SimulatedDPS(lambda: cnc_runner.selected_firmware_config.type)
 
         # initialize GUI
         root: tk.Tk = create_root_window()
@@ -41,15 +46,29 @@ def run():
 def main(argv):
     logging.getLogger().setLevel(logging.DEBUG)
     try:
-        opts, args = getopt.getopt(argv, "hd", ["--help", "debug"])
+        opts, args = getopt.getopt(argv, "hdm", ["--help", "debug", "motion-process", "motion-cpu=", "simulated"])
     except getopt.GetoptError:
         sys.exit(2)
 
+    motion_process: bool = False
+    motion_cpu: int | None = None
     for opt, arg in opts:
         if opt in ("-d", "--debug"):
             logging.getLogger().setLevel(logging.DEBUG)
+        elif opt in ("-m", "--motion-process"):
+            # run the stepper step loop in a separate (real-time) process
+            motion_process = True
+        elif opt == "--motion-cpu":
+            # pin the motion process to the CPU core
+            motion_process = True
+            motion_cpu = int(arg)
+        elif opt == "--simulated":
+            # NOTE: selected by the entry point (run_*.py) before the hardware modules are imported,
+            #       fails when the real hardware modules were imported already (see lib.hal_backend)
+            select_simulated_hal()
+            logging.info("Running on simulated hardware")
 
-    run()
+    run(motion_process, motion_cpu)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,262 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, List, Set, Tuple
+
+from app.cnc_programmer.dps_log import DPSLog
+from app.cnc_programmer.fixture import FixtureHead
+from app.cnc_programmer.rpi_board import RPiBoard
+from app.cnc_programmer.stepper.motion_planner import MotionPlanner, MotionSegment
+from app.cnc_programmer.stepper.position import Axis
+from app.cnc_programmer.stepper.state import CNCRunnerState
+from lib.tracing import tracer
+
+if TYPE_CHECKING:
+    from app.cnc_programmer.cnc_runner import CNCRunner
+
+# asyncio orchestration of the plate cycle (orchestration= asyncio): the cycle is a coroutine run by the worker of the runner,
+# the blocking hardware calls (motion, programmer process / session / ICSP, ADC reads of the tests) are awaited in the executor,
+# the report of a plunge (GUI update, logging, persistence of the results) runs concurrently with the hop to the next one,
+# a pause or stop cancels the cycle at its current await instead of the state being polled after every hop:
+# a cancelled motion is stopped at once, the DPS under the heads are finished and reported first
+
+ORCHESTRATION_THREADS = "threads"
+ORCHESTRATION_ASYNCIO = "asyncio"
+ORCHESTRATIONS = (ORCHESTRATION_THREADS, ORCHESTRATION_ASYNCIO)
+
+
+class CycleOrchestrator:
+    # executor threads: the motion, the offset calibration and the DPS of every head, the persistence
+    EXECUTOR_WORKERS: int = 2 * RPiBoard.MAX_HEADS + 2
+
+    # results of every plate run, one JSON line per DPS
+    RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+    def __init__(self, runner: CNCRunner) -> None:
+        self.runner: CNCRunner = runner
+        self._executor: ThreadPoolExecutor = ThreadPoolExecutor(CycleOrchestrator.EXECUTOR_WORKERS, thread_name_prefix="orchestrator")
+        # loop and task of the running cycle (cancel is called from the other threads)
+        self._lock: threading.Lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._task: asyncio.Task | None = None
+        # reports of the plunges in progress
+        self._reports: Set[asyncio.Task] = set()
+        self.last_results_path: str | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def run(self, start_from_x: int, start_from_y: int) -> bool:
+        # blocks the calling thread until the cycle ends, False --> the cycle was cancelled (paused or stopped)
+        return asyncio.run(self._run(start_from_x, start_from_y))
+
+    async def _run(self, start_from_x: int, start_from_y: int) -> bool:
+        with self._lock:
+            self._loop = asyncio.get_running_loop()
+            self._task = asyncio.create_task(self.cycle(start_from_x, start_from_y))
+        # paused or stopped before the task existed
+        if self.runner.state != CNCRunnerState.IN_AUTOMATIC_CYCLE:
+            self._task.cancel()
+        try:
+            await self._task
+            return True
+        except asyncio.CancelledError:
+            logging.info("[CNC] Leaving automatic cycle")
+            return False
+        finally:
+            with self._lock:
+                self._loop, self._task = None, None
+
+    def cancel(self) -> None:
+        # thread safe, nothing happens when no cycle runs
+        with self._lock:
+            if self._task is not None:
+                self._loop.call_soon_threadsafe(self._task.cancel)
+
+    def close(self) -> None:
+        self.cancel()
+        self._executor.shutdown(wait=False)
+
+    # region AWAITABLES
+    def _in_executor(self, function: Callable, *args) -> Awaitable:
+        return asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    @staticmethod
+    async def _finish(awaitable: Awaitable, on_cancel: Callable[[], None] | None = None) -> Any:
+        # the awaitable is finished even when the cycle is cancelled meanwhile (on_cancel may cut it short, e.g. stops the motion),
+        # then the cancellation is raised: the hardware is never left in the middle of an operation
+        future: asyncio.Future = asyncio.ensure_future(awaitable)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if on_cancel is not None:
+                on_cancel()
+            await asyncio.wait([future])
+            raise
+
+    def _stop_motion(self) -> None:
+        self.runner.stepper_driver.running = False
+
+    async def go_to_pos_mm(self, axis: Axis, pos_mm: float) -> None:
+        await self._finish(self._in_executor(self.runner.stepper_driver.go_to_pos_mm, axis, pos_mm, self.runner.DEFAULT_SPEED, 0.0), self._stop_motion)
+
+    async def move(self, axis: Axis, step_mm: float) -> None:
+        await self._finish(self._in_executor(self.runner.stepper_driver.move, axis, step_mm, self.runner.DEFAULT_SPEED), self._stop_motion)
+
+    async def process_dps(self, head: FixtureHead, position: Tuple[int, int]) -> DPSLog:
+        # the programmer and the ADC reads of the tests block the executor thread of the head
+        dps_log: DPSLog = await self._in_executor(self.runner.program_head, head)
+        dps_log.x, dps_log.y = position
+        await self._in_executor(self.runner.test_head, head, dps_log)
+        return dps_log
+    # endregion AWAITABLES
+
+    async def cycle(self, start_from_x: int = 0, start_from_y: int = 0) -> None:
+        runner: CNCRunner = self.runner
+        trace_start_ns: int = tracer.now_ns()
+        runner._configure_head_programmers()
+        for head in runner.heads:
+            head.programmer.open_session()
+        try:
+            with tracer.span("plate", "cycle", plate=runner.selected_plate_config.name, start_from=[start_from_x, start_from_y], heads=len(runner.heads),
+                             orchestration=ORCHESTRATION_ASYNCIO):
+                await self._cycle(start_from_x, start_from_y)
+        finally:
+            # the reports of the finished DPS are completed even when the cycle is cancelled
+            if self._reports:
+                await self._finish(asyncio.gather(*self._reports))
+            for head in runner.heads:
+                head.programmer.close_session()
+            runner.export_trace(trace_start_ns)
+
+    async def _cycle(self, start_from_x: int, start_from_y: int) -> None:
+        runner: CNCRunner = self.runner
+        logging.info("[CNC]: DPS plate is about to be programmed...")
+        logging.info(f"[CNC]: DPS starting from pos: [{start_from_x},{start_from_y}]")
+
+        generated_positions: List[Tuple[int, int]] = runner.generate_position_sequence(start_from_x, start_from_y)
+        # the offset is calibrated once per plate
+        for head in runner.heads:
+            head.tester.invalidate_LED_current_offset()
+        planner: MotionPlanner = MotionPlanner(runner.config.z_moving_height_mm, runner.config.z_minimum_safe_height_mm, runner.DEFAULT_SPEED)
+        with tracer.span("plan", "motion"):
+            plan: List[Tuple[Tuple[int, int], List[MotionSegment]]] = planner.plan(runner.stepper_driver.get_current_pos_mm(), runner.selected_plate_config, generated_positions)
+        self.last_results_path = os.path.join(CycleOrchestrator.RESULTS_DIR, f"plate_{runner.selected_plate_config.name}_{time.strftime('%Y%m%d_%H%M%S')}.jsonl")
+
+        for position, segments in plan:
+            await self.move_to(position, segments)
+            runner.current_cycle_pos = position
+            await self._finish(self.process_plunge(position))
+
+        with tracer.span("move_away", "motion"):
+            # lift from the last DPS, move away from the last position
+            await self.go_to_pos_mm(Axis.Z, runner.config.z_moving_height_mm)
+            await self.move(Axis.Y, 50)
+        if self._reports:
+            await asyncio.gather(*self._reports)
+        runner.set_completed_automatic_cycle()
+        runner.gui_controller.ex_evt_automatic_cycle_completed()
+        logging.info(f"[CNC]: DPC programming cycle completed -> stopping")
+
+    async def move_to(self, position: Tuple[int, int], segments: List[MotionSegment]) -> None:
+        runner: CNCRunner = self.runner
+        column, row = position
+        pos_target_x_mm, pos_target_y_mm = runner.selected_plate_config.get_position_mm(column, row)
+        logging.info(f"[CNC]: Moving to position: [{column}, {row}], [{pos_target_x_mm} mm, {pos_target_y_mm} mm]")
+        runner.gui_controller.ex_evt_update_current_pos(column, row)
+        # the LED current offset is calibrated while the head moves (first hop of the plate, then when it gets old)
+        calibrations: List[Awaitable] = [self._in_executor(head.tester.calibrate_LED_current_offset) for head in runner.heads if head.tester.is_LED_current_offset_calibration_due()]
+        with tracer.span("move", "motion", position=[column, row]):
+            await self._finish(asyncio.gather(self._in_executor(runner.stepper_driver.execute_segments, segments, runner.DEFAULT_SPEED), *calibrations), self._stop_motion)
+
+    async def process_plunge(self, position: Tuple[int, int]) -> List[DPSLog]:
+        # the DPS under all the heads concurrently, the report runs concurrently with the next hop
+        runner: CNCRunner = self.runner
+        positions: List[Tuple[int, int]] = runner.selected_plate_config.get_head_positions(*position, *runner.plate_heads())
+        logging.info(f"[CNC]: DPS {positions} programming starting")
+        runner.dps_under_test_running = True
+        with tracer.span("dps", "dps", position=list(position)):
+            dps_logs: List[DPSLog] = list(await asyncio.gather(*[self.process_dps(head, head_position) for head, head_position in zip(runner.heads, positions)]))
+        runner.dps_under_test_running = False
+        logging.info(f"[CNC]: DPS [{position[0]},{position[1]}] programming finished ({len(dps_logs)} heads)")
+
+        report: asyncio.Task = asyncio.create_task(self.report(dps_logs))
+        self._reports.add(report)
+        report.add_done_callback(self._reports.discard)
+        return dps_logs
+
+    async def report(self, dps_logs: List[DPSLog]) -> None:
+        await asyncio.gather(self._publish(dps_logs), self._in_executor(self.persist, dps_logs))
+
+    async def _publish(self, dps_logs: List[DPSLog]) -> None:
+        for dps_log in dps_logs:
+            self.runner.dps_logs[(dps_log.x, dps_log.y)] = dps_log
+            self.runner.gui_controller.ex_evt_update_dps_log(dps_log)
+            logging.info(f"[CNC]: DPS [{dps_log.x},{dps_log.y}] firmware uploaded: {dps_log.fw_uploaded}, successful: {dps_log.operation_successful}")
+
+    def persist(self, dps_logs: List[DPSLog]) -> None:
+        # appended to the results of the plate (the attributes of the DPS log)
+        try:
+            os.makedirs(CycleOrchestrator.RESULTS_DIR, exist_ok=True)
+            with open(self.last_results_path, "a") as results_file:
+                for dps_log in dps_logs:
+                    results_file.write(json.dumps({name.lstrip("_"): value for name, value in vars(dps_log).items()}, default=str) + "\n")
+        except OSError as e:
+            logging.warning(f"[CNC]: Results of the plate cannot be saved: {e}")
+
+
+class TestCycleOrchestrator(unittest.TestCase):
+
+    def test_finish_before_cancellation(self):
+        events: List[str] = []
+
+        async def operation():
+            await asyncio.sleep(0.05)
+            events.append("finished")
+
+        async def main():
+            task = asyncio.create_task(CycleOrchestrator._finish(operation(), lambda: events.append("cancelled")))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(main())
+        # the operation was stopped (on_cancel) and finished before the cancellation was raised
+        self.assertEqual(events, ["cancelled", "finished"])
+
+    def test_pause_cancels_motion(self):
+        # NOTE: runs on the simulated hardware (SCILIF_HAL=simulated python -m unittest app.cnc_programmer.orchestrator)
+        from unittest import mock
+        from app.cnc_programmer.cnc_runner import CNCRunner
+        from app.cnc_programmer.config.config_parser import CNCProgrammerConfigParser
+        runner = CNCRunner()
+        runner.set_config(CNCProgrammerConfigParser(f"{os.path.dirname(os.path.abspath(__file__))}/resources/test.conf").parse_config())
+        runner.set_controller(mock.Mock())
+        runner.orchestration = ORCHESTRATION_ASYNCIO
+        runner.start()
+        try:
+            # the first hop is under way (the first DPS is not at home)
+            runner.set_in_automatic_cycle(0, 1)
+            deadline = time.perf_counter() + 5
+            while runner.stepper_driver.get_current_pos_mm() == [0, 0, 0] and time.perf_counter() < deadline:
+                time.sleep(0.01)
+            start = time.perf_counter()
+            runner.set_paused_in_automatic_cycle()
+            while runner.orchestrator.running and time.perf_counter() - start < 5:
+                time.sleep(0.01)
+            # the motion was stopped at once, no DPS was processed
+            self.assertLess(time.perf_counter() - start, 0.5)
+            self.assertIsNone(runner.current_cycle_pos)
+            self.assertEqual(runner.dps_logs, {})
+            self.assertEqual(runner.state, CNCRunnerState.PAUSED_IN_AUTOMATIC_CYCLE)
+        finally:
+            runner.stop()
@@ -0,0 +1,168 @@
+import json
+import logging
+import os
+import select
+import shlex
+import subprocess
+import threading
+import time
+import unittest
+from subprocess import CompletedProcess, Popen
+
+from lib.fake_n14 import FAKE_N14_COMMAND
+
+# Programmer session: one programmer process is kept alive for the whole plate and the commands
+# ("program <hex> <erase>", "blank", ...) are streamed to it, one line per command,
+# the result of every command is one JSON line: {"returncode": 0, "stdout": "", "stderr": ""}
+# (the protocol of the fake n14 session, see lib/fake_n14.py)
+
+
+class ProgrammerSessionError(Exception):
+    pass
+
+
+class ProgrammerSessionTimeout(ProgrammerSessionError):
+    pass
+
+
+class ProgrammerSession:
+    SESSION_COMMAND = "session"
+    EXIT_COMMAND = "exit"
+    START_TIMEOUT_S: float = 5.0
+    CLOSE_TIMEOUT_S: float = 2.0
+
+    def __init__(self, programmer_path: str, env: dict[str, str] | None = None) -> None:
+        self._programmer_path: str = programmer_path
+        self._env: dict[str, str] | None = env
+        self._process: Popen | None = None
+        # one command at a time
+        self._lock: threading.Lock = threading.Lock()
+        self._commands_executed: int = 0
+
+    @property
+    def programmer_path(self) -> str:
+        return self._programmer_path
+
+    @property
+    def is_open(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    @property
+    def commands_executed(self) -> int:
+        return self._commands_executed
+
+    def open(self) -> None:
+        if self.is_open:
+            return
+        args: [str] = shlex.split(os.path.expanduser(self._programmer_path)) + [ProgrammerSession.SESSION_COMMAND]
+        logging.info(f"[PROGRAMMER]: Opening session: {args}")
+        try:
+            self._process = Popen(args, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True, bufsize=1, env=self._env)
+        except OSError as e:
+            self._process = None
+            raise ProgrammerSessionError(f"Programmer session cannot be started: {e}")
+
+    def close(self) -> None:
+        if self._process is None:
+            return
+        logging.info(f"[PROGRAMMER]: Closing session after {self._commands_executed} commands")
+        try:
+            if self._process.poll() is None:
+                self._process.stdin.write(ProgrammerSession.EXIT_COMMAND + "\n")
+                self._process.stdin.flush()
+                self._process.wait(ProgrammerSession.CLOSE_TIMEOUT_S)
+        except (OSError, subprocess.TimeoutExpired):
+            self._process.kill()
+            self._process.wait()
+        finally:
+            self._process = None
+
+    def execute(self, command_args: [str], timeout_s: float | None = None) -> CompletedProcess:
+        # the command is executed by the running session, a dead session is restarted once,
+        # a session that does not respond in time is killed (ProgrammerSessionTimeout), the next command starts a new one
+        with self._lock:
+            command: str = " ".join(shlex.quote(arg) for arg in command_args)
+            for attempt in range(2):
+                if not self.is_open:
+                    self.open()
+                try:
+                    self._process.stdin.write(command + "\n")
+                    self._process.stdin.flush()
+                    if timeout_s is not None and not select.select([self._process.stdout], [], [], timeout_s)[0]:
+                        self._process.kill()
+                        self.close()
+                        raise ProgrammerSessionTimeout(f"Programmer session timeout after {timeout_s} s: {command}")
+                    response: str = self._process.stdout.readline()
+                except OSError:
+                    response = ""
+                if response:
+                    result: dict = json.loads(response)
+                    self._commands_executed += 1
+                    return CompletedProcess(f"{self._programmer_path} {command}", result["returncode"], result["stdout"], result["stderr"])
+                logging.warning(f"[PROGRAMMER]: Session terminated unexpectedly (attempt {attempt + 1})")
+                self.close()
+            raise ProgrammerSessionError(f"Programmer session does not respond to: {command}")
+
+    def __enter__(self) -> "ProgrammerSession":
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+
+class TestProgrammerSession(unittest.TestCase):
+    HEX_PATH = f"{os.path.dirname(os.path.abspath(__file__))}/resources/app.hex"
+
+    def setUp(self):
+        self.env = dict(os.environ, FAKE_N14_TIME_SCALE="0")
+
+    def test_commands_share_process(self):
+        with ProgrammerSession(FAKE_N14_COMMAND, self.env) as session:
+            pid = session._process.pid
+            for _ in range(3):
+                completed_process = session.execute(["program", TestProgrammerSession.HEX_PATH, "1"])
+                self.assertEqual(completed_process.returncode, 0)
+                self.assertEqual(completed_process.stdout, "")
+            self.assertEqual(session._process.pid, pid)
+            self.assertEqual(session.commands_executed, 3)
+        self.assertFalse(session.is_open)
+
+    def test_failed_command(self):
+        with ProgrammerSession(FAKE_N14_COMMAND, self.env) as session:
+            completed_process = session.execute(["program", "/missing.hex", "1"])
+            self.assertEqual(completed_process.returncode, 1)
+            self.assertIn("cannot open file", completed_process.stderr)
+
+    def test_timeout(self):
+        env = dict(self.env, FAKE_N14_TIME_SCALE="100")
+        with ProgrammerSession(FAKE_N14_COMMAND, env) as session:
+            with self.assertRaises(ProgrammerSessionTimeout):
+                session.execute(["blank"], timeout_s=0.2)
+            self.assertFalse(session.is_open)
+
+    def test_restart_after_crash(self):
+        with ProgrammerSession(FAKE_N14_COMMAND, self.env) as session:
+            session._process.kill()
+            session._process.wait()
+            self.assertEqual(session.execute(["blank"]).returncode, 0)
+
+
+def benchmark_session_speedup():
+    # latency of the fake n14 per DPS: a process per DPS vs. one session for the plate
+    hex_path: str = TestProgrammerSession.HEX_PATH
+    count: int = 5
+    start: float = time.perf_counter()
+    for _ in range(count):
+        subprocess.run(f"{FAKE_N14_COMMAND} program {hex_path} 1", shell=True, capture_output=True)
+    per_process_s: float = (time.perf_counter() - start) / count
+    start = time.perf_counter()
+    with ProgrammerSession(FAKE_N14_COMMAND) as session:
+        for _ in range(count):
+            session.execute(["program", hex_path, "1"])
+    per_session_s: float = (time.perf_counter() - start) / count
+    print(f"process per DPS: {per_process_s:.3f} s, session: {per_session_s:.3f} s per DPS")
+
+
+if __name__ == "__main__":
+    benchmark_session_speedup()
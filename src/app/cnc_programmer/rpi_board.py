@@ -1,8 +1,18 @@
+from __future__ import annotations
+
 import time
+from typing import NamedTuple
+
+from lib.hal import I2C, DigitalInOut, Direction, Pull, board
 
-import board
-from busio import I2C
-from digitalio import Direction, DigitalInOut, Pull
+
+class HeadPins(NamedTuple):
+    # DPS pins of one pogo head of the fixture
+    power_supply: object
+    button: object
+    vpp: object
+    pgd: object
+    pgc: object
 
 
 class RPiBoard:
@@ -26,9 +36,56 @@ class RPiBoard:
 
     PIN_STEPPER_CONTACT = board.D24
 
-    def __init__(self) -> None:
-        self.init_I2C()
-
+    # DPS pins and ADS1115 of the first pogo head of the fixture, the wiring of the other heads is configured
+    # ([HEAD_<index>] sections, see config.head.HeadConfig), the heads share the I2C bus
+    DEFAULT_HEAD_PINS: HeadPins = HeadPins(PIN_DPS_POWER_SUPPLY, PIN_DPS_BUTTON, PIN_DPS_VPP, PIN_DPS_PGD, PIN_DPS_PGC)
+    DEFAULT_ADC_ADDRESS: int = 0x48
+    # ADDR pin strappings of the ADS1115 (0x48 - 0x4B) minus a spare
+    MAX_HEADS: int = 3
+    # pins the heads must not take (stepper drivers, contact switch, I2C)
+    RESERVED_PINS = (PIN_I2C_SCL, PIN_I2C_SDA, PIN_STEPPER_X_STEP, PIN_STEPPER_X_DIR, PIN_STEPPER_Y_STEP, PIN_STEPPER_Y_DIR,
+                     PIN_STEPPER_Z_STEP, PIN_STEPPER_Z_DIR, PIN_STEPPER_CONTACT)
+
+    def __init__(self, stepper: bool = True, dps: bool = True, head: int = 0, pins: HeadPins = DEFAULT_HEAD_PINS, adc_address: int = DEFAULT_ADC_ADDRESS) -> None:
+        # NOTE: stepper and DPS pins can be initialized separately (e.g. when motion runs in a separate process)
+        self.head: int = head
+        self.pins: HeadPins = pins
+        self.adc_address: int = adc_address
+        self.i2c = None
+        self.stepper_dir_pins: (DigitalInOut, DigitalInOut, DigitalInOut) = ()
+        self.stepper_step_pins: (DigitalInOut, DigitalInOut, DigitalInOut) = ()
+        self.stepper_contacting_pin = None
+        if stepper:
+            self.init_stepper_pins()
+        if dps:
+            self.init_I2C()
+            self.init_dps_pins()
+
+    def create_head(self, head: int, pins: HeadPins, adc_address: int) -> RPiBoard:
+        # DPS pins of another head of the fixture, the I2C bus of this board is shared
+        head_board: RPiBoard = RPiBoard(stepper=False, dps=False, head=head, pins=pins, adc_address=adc_address)
+        head_board.i2c = self.i2c
+        head_board.init_dps_pins()
+        return head_board
+
+    @staticmethod
+    def resolve_head_pins(pin_names: (str, str, str, str, str)) -> HeadPins:
+        # board pins of the names (e.g. D12), ValueError for an unknown pin
+        try:
+            return HeadPins(*(getattr(board, name) for name in pin_names))
+        except AttributeError as e:
+            raise ValueError(f"Unknown board pin: {e}")
+
+    @staticmethod
+    def check_head_pins(heads_pins: [HeadPins]) -> None:
+        # ValueError when a pin is shared by two heads or taken from the stepper drivers or the I2C bus
+        pin_ids: [int] = [pin.id for pins in heads_pins for pin in pins]
+        reserved_ids: {int} = {pin.id for pin in RPiBoard.RESERVED_PINS}
+        for pin in (pin for pins in heads_pins for pin in pins):
+            if pin.id in reserved_ids or pin_ids.count(pin.id) > 1:
+                raise ValueError(f"Pin {pin} of the heads is already in use")
+
+    def init_stepper_pins(self) -> None:
         # stepper
         stepper_x_dir_pin = DigitalInOut(RPiBoard.PIN_STEPPER_X_DIR)
         stepper_y_dir_pin = DigitalInOut(RPiBoard.PIN_STEPPER_Y_DIR)
@@ -38,7 +95,7 @@ class RPiBoard:
         stepper_x_step_pin = DigitalInOut(RPiBoard.PIN_STEPPER_X_STEP)
         stepper_y_step_pin = DigitalInOut(RPiBoard.PIN_STEPPER_Y_STEP)
         stepper_z_step_pin = DigitalInOut(RPiBoard.PIN_STEPPER_Z_STEP)
-        self.stepper_step_pins: (DigitalInOut, DigitalInOut, DigitalInOut) = (stepper_x_step_pin, stepper_y_step_pin, stepper_z_step_pin)
+        self.stepper_step_pins = (stepper_x_step_pin, stepper_y_step_pin, stepper_z_step_pin)
 
         for pin in self.stepper_dir_pins + self.stepper_step_pins:
             pin.direction = Direction.OUTPUT
@@ -47,12 +104,13 @@ class RPiBoard:
         self.stepper_contacting_pin.direction = Direction.INPUT
         self.stepper_contacting_pin.pull = Pull.DOWN
 
+    def init_dps_pins(self) -> None:
         # DPS power supply
-        self.dps_power_supply_pin = DigitalInOut(RPiBoard.PIN_DPS_POWER_SUPPLY)
+        self.dps_power_supply_pin = DigitalInOut(self.pins.power_supply)
         self.dps_power_supply_pin.direction = Direction.OUTPUT
 
         # DPS button
-        self.dps_button_pin = DigitalInOut(RPiBoard.PIN_DPS_BUTTON)
+        self.dps_button_pin = DigitalInOut(self.pins.button)
         self.dps_button_pin.direction = Direction.OUTPUT
 
         # DPS ICSP programmer
@@ -87,12 +145,25 @@ class RPiBoard:
     def init_I2C(self) -> None:
         self.i2c = I2C(RPiBoard.PIN_I2C_SCL, RPiBoard.PIN_I2C_SDA)
 
+    def init_ICSP_pins(self, vpp: bool = False) -> None:
+        # the pins are created once and reused for every DPS,
+        # VPP is driven only by the native ICSP programmer (n14 drives it itself)
+        if self.dps_pgd_pin is None:
+            self.dps_pgd_pin = DigitalInOut(self.pins.pgd)
+            self.dps_pgc_pin = DigitalInOut(self.pins.pgc)
+        if vpp and self.dps_vpp_pin is None:
+            self.dps_vpp_pin = DigitalInOut(self.pins.vpp)
+            self.dps_vpp_pin.direction = Direction.OUTPUT
+            self.dps_vpp_pin.value = False
+
     def inactivate_ISCP_pins(self) -> None:
-        self.dps_pgd_pin = DigitalInOut(RPiBoard.PIN_DPS_PGD)
+        self.init_ICSP_pins()
+        if self.dps_vpp_pin is not None:
+            self.dps_vpp_pin.value = False
+
         self.dps_pgd_pin.direction = Direction.OUTPUT
         self.dps_pgd_pin.value = False
 
-        self.dps_pgc_pin = DigitalInOut(RPiBoard.PIN_DPS_PGC)
         self.dps_pgc_pin.direction = Direction.OUTPUT
         self.dps_pgc_pin.value = False
 
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import math
+import time
+from typing import Callable, List
+
+from app.cnc_programmer.dps_mode import FirmwareType
+from app.cnc_programmer.firmware_image import BLANK_WORD, CONFIG_MEMORY_ADDRESS, PROGRAM_MEMORY_WORDS, ROW_WORDS, WORD_MASK
+from app.cnc_programmer.icsp import COMMANDS_WITH_PAYLOAD, DEVICE_ID_ADDRESS, READ_COMMANDS, ICSPCommand
+from app.cnc_programmer.rpi_board import HeadPins, RPiBoard
+from lib import simulated_ads1115 as ADS
+from lib.simulated_hw import pin_recorder
+
+
+class SimulatedDPS:
+    # DPS under test for the simulated hardware: reacts to the power supply and button pins (both active low)
+    # and drives the simulated ADC channels of the tester:
+    # - P0, P1: ACS723 output and reference (LED current)
+    # - P2: feedback resistor voltage
+    # - P3: button LED voltage
+
+    REFERENCE_V: float = 2.5
+    ACS723_OFFSET_V: float = 0.167
+    ACS723_V_PER_A: float = 0.4
+
+    # LED current [mA] in the modes of the firmware (the mode changes with every button press)
+    LED_CURRENTS_MA: dict[FirmwareType, List[float]] = {
+        FirmwareType.MAX_ONLY: [0.0, 387.0],
+        FirmwareType.FLASH: [387.0, 85.0, -1.0],  # -1 --> blinking
+    }
+    BLINKING_PERIOD_S: float = 0.2
+    # the LED current approaches the current of a new mode exponentially
+    LED_CURRENT_SETTLE_TAU_S: float = 0.03
+    BUTTON_LED_V: float = 2.3
+    R_FEEDBACK_V: float = 0.2
+
+    def __init__(self, firmware_type: Callable[[], FirmwareType], noise_V: float = 0.001, pins: HeadPins = RPiBoard.DEFAULT_HEAD_PINS,
+                 adc_address: int = RPiBoard.DEFAULT_ADC_ADDRESS) -> None:
+        # firmware_type: firmware being programmed (e.g. the selected firmware config of the runner),
+        # pins, adc_address: the DPS is under the head of the fixture with these pins and ADC
+        self.firmware_type: Callable[[], FirmwareType] = firmware_type
+        self.pins: HeadPins = pins
+        self.powered: bool = False
+        self.mode: int = 0
+        # LED current [mA] and time.perf_counter() of the last power or mode change
+        self.previous_led_current_mA: float = 0.0
+        self.changed_at: float = 0.0
+        # PIC of the DPS (native ICSP programmer)
+        self.pic: SimulatedPIC16 = SimulatedPIC16(pins)
+        pin_recorder.add_listener(self.on_pin_change)
+
+        ADS.set_channel_signal(ADS.P0, lambda now: SimulatedDPS.REFERENCE_V + SimulatedDPS.ACS723_OFFSET_V + SimulatedDPS.ACS723_V_PER_A * self.led_current_mA(now) / 1000, 2 * noise_V, adc_address)
+        ADS.set_channel_signal(ADS.P1, SimulatedDPS.REFERENCE_V, noise_V, adc_address)
+        ADS.set_channel_signal(ADS.P2, lambda now: SimulatedDPS.R_FEEDBACK_V if self.powered else 0.0, noise_V, adc_address)
+        ADS.set_channel_signal(ADS.P3, lambda now: SimulatedDPS.BUTTON_LED_V if self.powered else 0.0, noise_V, adc_address)
+
+    def disconnect(self) -> None:
+        pin_recorder.remove_listener(self.on_pin_change)
+        self.pic.disconnect()
+
+    def on_pin_change(self, pin_name: str, value: bool) -> None:
+        if pin_name == self.pins.power_supply.name:
+            self._change_state(not value, 0)
+        elif pin_name == self.pins.button.name and value and self.powered:
+            # button released
+            self._change_state(True, (self.mode + 1) % len(SimulatedDPS.LED_CURRENTS_MA[self.firmware_type()]))
+
+    def _change_state(self, powered: bool, mode: int) -> None:
+        if (powered, mode) == (self.powered, self.mode):
+            return
+        now: float = time.perf_counter()
+        self.previous_led_current_mA = self.led_current_mA(now)
+        self.powered, self.mode = powered, mode
+        self.changed_at = now
+
+    def led_current_mA(self, now: float) -> float:
+        target_mA: float = self._target_led_current_mA(now)
+        return target_mA + (self.previous_led_current_mA - target_mA) * math.exp(-max(0.0, now - self.changed_at) / SimulatedDPS.LED_CURRENT_SETTLE_TAU_S)
+
+    def _target_led_current_mA(self, now: float) -> float:
+        if not self.powered:
+            return 0.0
+        current_mA: float = SimulatedDPS.LED_CURRENTS_MA[self.firmware_type()][self.mode]
+        if current_mA < 0:
+            return SimulatedDPS.LED_CURRENTS_MA[FirmwareType.FLASH][0] if (now % SimulatedDPS.BLINKING_PERIOD_S) < SimulatedDPS.BLINKING_PERIOD_S / 2 else 0.0
+        return current_mA
+
+
+class SimulatedPIC16:
+    # PIC16F153xx in the ICSP mode: decodes the commands clocked in on PGD/PGC while VPP is high
+    # and drives PGD when the host reads (see app.cnc_programmer.icsp)
+
+    DEVICE_ID: int = 0x30BE
+
+    def __init__(self, pins: HeadPins = RPiBoard.DEFAULT_HEAD_PINS) -> None:
+        self.pins: HeadPins = pins
+        # word address --> word, missing words are erased (0x3FFF)
+        self.memory: dict[int, int] = {DEVICE_ID_ADDRESS: SimulatedPIC16.DEVICE_ID}
+        self.latches: dict[int, int] = {}
+        self.pc: int = 0
+        self.rows_written: int = 0
+        self.vpp: bool = False
+        self.command: int | None = None
+        self.shift: int = 0
+        self.bit_count: int = 0
+        self.read_value: int = 0
+        self.connected: bool = True
+        pin_recorder.add_listener(self.on_pin_change)
+
+    def disconnect(self) -> None:
+        if self.connected:
+            pin_recorder.remove_listener(self.on_pin_change)
+            self.connected = False
+
+    def on_pin_change(self, pin_name: str, value: bool) -> None:
+        if pin_name == self.pins.vpp.name:
+            self.vpp = value
+            self.pc, self.command, self.shift, self.bit_count = 0, None, 0, 0
+        elif pin_name == self.pins.pgc.name and self.vpp:
+            if value:
+                if self.command in READ_COMMANDS:
+                    # data out after the rising edge
+                    pin_recorder.set_input(self.pins.pgd, bool((self.read_value >> (23 - self.bit_count)) & 1))
+            else:
+                self.shift = (self.shift << 1) | int(pin_recorder.read(self.pins.pgd))
+                self.bit_count += 1
+                self._on_bit()
+
+    def _on_bit(self) -> None:
+        if self.command is None:
+            if self.bit_count == 8:
+                self.command, self.shift, self.bit_count = self.shift, 0, 0
+                if self.command in READ_COMMANDS:
+                    self.read_value = self.memory.get(self.pc, BLANK_WORD) << 1
+                elif self.command not in COMMANDS_WITH_PAYLOAD:
+                    self._execute(0)
+        elif self.bit_count == 24:
+            self._execute((self.shift >> 1) & 0xFFFF)
+
+    def _execute(self, data: int) -> None:
+        command: int = self.command
+        self.command, self.shift, self.bit_count = None, 0, 0
+        if command == ICSPCommand.LOAD_PC_ADDRESS:
+            self.pc = data
+        elif command in (ICSPCommand.LOAD_DATA, ICSPCommand.LOAD_DATA_INC):
+            self.latches[self.pc] = data & WORD_MASK
+        elif command == ICSPCommand.BULK_ERASE:
+            for address in [address for address in self.memory if address < PROGRAM_MEMORY_WORDS or (address >= CONFIG_MEMORY_ADDRESS and self.pc >= CONFIG_MEMORY_ADDRESS)]:
+                if address != DEVICE_ID_ADDRESS:
+                    del self.memory[address]
+        elif command == ICSPCommand.BEGIN_INTERNALLY_TIMED:
+            if self.pc < CONFIG_MEMORY_ADDRESS:
+                self.rows_written += 1
+            row: int = self.pc - self.pc % ROW_WORDS
+            for address, word in self.latches.items():
+                if self.pc >= CONFIG_MEMORY_ADDRESS or row <= address < row + ROW_WORDS:
+                    # programming clears bits only
+                    self.memory[address] = self.memory.get(address, BLANK_WORD) & word
+            self.latches = {}
+        if command in (ICSPCommand.LOAD_DATA_INC, ICSPCommand.READ_DATA_INC, ICSPCommand.INCREMENT_ADDRESS):
+            self.pc += 1
@@ -0,0 +1,91 @@
+from enum import Enum
+
+from app.cnc_programmer.stepper.position import Axis
+
+
+class RampProfile(Enum):
+    TRAPEZOID = "trapezoid"  # linear acceleration / deceleration ramp
+    S_CURVE = "s_curve"  # jerk-limited ramp (smooth start and end of the acceleration)
+
+
+# NOTES:
+# acceleration / deceleration ramp assumes movment more than 3 mm
+
+# Axis X Settings
+X_STEPS_PER_MM = 320  # 200 steps per revolution x 8 microsteps = 1600 steps per revolution / 5mm per revolution -> 1600/5 = 320 steps per mm
+X_MAX_SPEED = 100  # ideal reliable maximum speed (in microseconds per pulse)
+X_MIN_SPEED = 500  # minimum speed (in microseconds per pulse)
+X_ACC_RAMP = 400  # acceleration ramp (in pulses)
+X_DECC_RAMP = 400  # deceleration ramp (in pulses)
+X_RAMP_PROFILE = RampProfile.TRAPEZOID  # shape of the acceleration / deceleration ramp
+
+# Axis Y Settings
+Y_STEPS_PER_MM = 320  # 200 steps per revolution x 8 microsteps = 1600 steps per revolution / 5mm per revolution -> 1600/5 = 320 steps per mm
+Y_MAX_SPEED = 100  # ideal reliable maximum speed (in microseconds per pulse)
+Y_MIN_SPEED = 500  # minimum speed (in microseconds per pulse)
+Y_ACC_RAMP = 400  # acceleration ramp (in pulses)
+Y_DECC_RAMP = 400  # deceleration ramp (in pulses)
+Y_RAMP_PROFILE = RampProfile.TRAPEZOID  # shape of the acceleration / deceleration ramp
+
+# Axis Z Settings
+Z_STEPS_PER_MM = 400  # 200 steps per revolution x 8 microsteps = 1600 steps per revolution / 4mm per revolution -> 1600/4 = 400 steps per mm
+Z_MAX_SPEED = 100  # ideal reliable maximum speed (in microseconds per pulse)
+Z_MIN_SPEED = 500  # minimum speed (in microseconds per pulse)
+Z_ACC_RAMP = 400  # acceleration ramp (in pulses)
+Z_DECC_RAMP = 400  # deceleration ramp (in pulses)
+Z_RAMP_PROFILE = RampProfile.TRAPEZOID  # shape of the acceleration / deceleration ramp
+
+X_AXIS_SPECIFICATION = {
+    'steps_per_mm': X_STEPS_PER_MM,
+    'max_speed': X_MAX_SPEED,
+    'min_speed': X_MIN_SPEED,
+    'acc_ramp': X_ACC_RAMP,
+    'decc_ramp': X_DECC_RAMP,
+    'profile': X_RAMP_PROFILE,
+}
+
+Y_AXIS_SPECIFICATION = {
+    'steps_per_mm': Y_STEPS_PER_MM,
+    'max_speed': Y_MAX_SPEED,
+    'min_speed': Y_MIN_SPEED,
+    'acc_ramp': Y_ACC_RAMP,
+    'decc_ramp': Y_DECC_RAMP,
+    'profile': Y_RAMP_PROFILE,
+}
+
+Z_AXIS_SPECIFICATION = {
+    'steps_per_mm': Z_STEPS_PER_MM,
+    'max_speed': Z_MAX_SPEED,
+    'min_speed': Z_MIN_SPEED,
+    'acc_ramp': Z_ACC_RAMP,
+    'decc_ramp': Z_DECC_RAMP,
+    'profile': Z_RAMP_PROFILE,
+}
+
+
+_DEFAULT_AXIS_SPECIFICATIONS = {
+    Axis.X: dict(X_AXIS_SPECIFICATION),
+    Axis.Y: dict(Y_AXIS_SPECIFICATION),
+    Axis.Z: dict(Z_AXIS_SPECIFICATION),
+}
+
+# parameters which may be overridden from the config file (AXIS_X, AXIS_Y, AXIS_Z sections)
+CONFIGURABLE_AXIS_PARAMS = ('max_speed', 'min_speed', 'acc_ramp', 'decc_ramp', 'profile')
+
+
+def set_axis_params(axis: Axis, axis_params: dict) -> None:
+    # overrides are applied over the default specification (parameters not given keep their default values)
+    # NOTE: ramp tables are cached, call clear_ramp_tables() afterward
+    for param in axis_params:
+        assert param in CONFIGURABLE_AXIS_PARAMS, f"Axis parameter {param} cannot be configured"
+    get_axis_params(axis).update(_DEFAULT_AXIS_SPECIFICATIONS[axis])
+    get_axis_params(axis).update(axis_params)
+
+
+def get_axis_params(axis: Axis) -> dict[str, int]:
+    if axis == Axis.X:
+        return X_AXIS_SPECIFICATION
+    if axis == Axis.Y:
+        return Y_AXIS_SPECIFICATION
+    if axis == Axis.Z:
+        return Z_AXIS_SPECIFICATION
@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import os
+import unittest
+from typing import List, Tuple
+
+from app.cnc_programmer.stepper.axis_params import get_axis_params
+from app.cnc_programmer.stepper.position import Axis
+from app.cnc_programmer.stepper.ramp import (combine_axis_params, delay_to_ramp_index, get_segment_delays_us, ramp_index_to_delay,
+                                             speed_percent_to_us)
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class MotionSegment:
+    # Straight move between two absolute positions (in steps) executed as one pulse schedule:
+    # - entry_us, exit_us: step delay at the junction with the previous / next segment (None --> segment starts / ends at rest)
+    # - dwell_s: wait after the segment (the segment always ends at rest when dwell_s > 0)
+
+    def __init__(self, start_step: [int, int, int], end_step: [int, int, int], dwell_s: float = 0.0) -> None:
+        self.start_step: [int, int, int] = list(start_step)
+        self.end_step: [int, int, int] = list(end_step)
+        self.dwell_s: float = dwell_s
+        self.entry_us: int | None = None
+        self.exit_us: int | None = None
+
+    @property
+    def delta_step(self) -> [int, int, int]:
+        return [end - start for start, end in zip(self.start_step, self.end_step)]
+
+    @property
+    def n_ticks(self) -> int:
+        return max(abs(delta) for delta in self.delta_step)
+
+    @property
+    def moving_axes(self) -> Tuple[Axis, ...]:
+        return tuple(axis for axis in Axis if self.delta_step[axis.value] != 0)
+
+    def direction(self) -> [float, float, float]:
+        # steps of every axis per tick (the major axis steps on every tick)
+        return [delta / self.n_ticks for delta in self.delta_step]
+
+    def __str__(self) -> str:
+        return f'Segment({self.start_step} -> {self.end_step}, entry={self.entry_us} us, exit={self.exit_us} us, dwell={self.dwell_s} s)'
+
+
+def _slower(delay_a_us: int | None, delay_b_us: int | None) -> int | None:
+    # None is the rest (the slowest speed)
+    if delay_a_us is None or delay_b_us is None:
+        return None
+    return max(delay_a_us, delay_b_us)
+
+
+class MotionPlanner:
+    # Look-ahead planner of the moves between consecutive DPS positions of a plate:
+    # - the Z lift, the XY travel and the Z plunge of one hop are blended (Z travels above the safe height while XY is moving)
+    # - the speed at the junction of two segments is limited by the velocity jump of every axis,
+    #   an axis can change its step rate at once by at most its start speed (min_speed), the same as when it starts from rest
+    # - the junction speeds are reduced by the backward and forward pass so that every segment can reach them with its ramps
+    # - the settle dwell is inserted only above the DPS before the plunge (the pogo pins should not touch the DPS while XY vibrates),
+    #   the moves in the air do not need any wait
+
+    MIN_XY_DISTANCE_MM: float = 0.1
+
+    def __init__(self, z_moving_height_mm: float, z_minimum_safe_height_mm: float, speed_percent: float, settle_dwell_s: float = 0.25) -> None:
+        self.z_moving_height_mm: float = z_moving_height_mm
+        self.z_minimum_safe_height_mm: float = z_minimum_safe_height_mm
+        self.speed_percent: float = speed_percent
+        self.settle_dwell_s: float = settle_dwell_s
+
+    @staticmethod
+    def _to_step(axis: Axis, pos_mm: float) -> int:
+        return round(pos_mm * get_axis_params(axis)['steps_per_mm'])
+
+    def plan(self, start_pos_mm: [float, float, float], plate_config: "PlateConfig", positions: List[Tuple[int, int]]) -> List[Tuple[Tuple[int, int], List[MotionSegment]]]:
+        # segments of every hop of the sequence, the machine stops at every DPS (the DPS is processed there)
+        plan: List[Tuple[Tuple[int, int], List[MotionSegment]]] = []
+        pos_step: [int, int, int] = [MotionPlanner._to_step(axis, start_pos_mm[axis.value]) for axis in Axis]
+        for column, row in positions:
+            x_mm, y_mm = plate_config.get_position_mm(column, row)
+            segments: List[MotionSegment] = self.plan_hop(pos_step, [MotionPlanner._to_step(Axis.X, x_mm), MotionPlanner._to_step(Axis.Y, y_mm), 0])
+            plan.append(((column, row), segments))
+            if segments:
+                pos_step = segments[-1].end_step
+        return plan
+
+    def plan_hop(self, start_step: [int, int, int], end_step: [int, int, int]) -> List[MotionSegment]:
+        # path from the current position to the DPS (pins in contact, Z = end_step[Z])
+        z_safe: int = MotionPlanner._to_step(Axis.Z, self.z_minimum_safe_height_mm)
+        z_moving: int = MotionPlanner._to_step(Axis.Z, self.z_moving_height_mm)
+        x0, y0, z0 = start_step
+        x1, y1, z1 = end_step
+
+        segments: List[MotionSegment] = []
+        if (abs(x1 - x0) / get_axis_params(Axis.X)['steps_per_mm'] <= MotionPlanner.MIN_XY_DISTANCE_MM and
+                abs(y1 - y0) / get_axis_params(Axis.Y)['steps_per_mm'] <= MotionPlanner.MIN_XY_DISTANCE_MM):
+            # already above the DPS --> Z only
+            if [x0, y0, z0] != [x1, y1, z1]:
+                segments.append(MotionSegment(start_step, end_step))
+            return segments
+
+        # pure Z lift until the pins are out of the plate
+        z_climb_start: int = max(z0, z_safe)
+        if z0 < z_safe:
+            segments.append(MotionSegment([x0, y0, z0], [x0, y0, z_safe]))
+
+        # XY travel: diagonal climb to the moving height, cruise, diagonal descent to the safe height,
+        # both diagonals take (at most) a quarter of the XY travel each
+        xy_ticks: int = max(abs(x1 - x0), abs(y1 - y0))
+        climb: float = min(0.25, abs(z_moving - z_climb_start) / xy_ticks)
+        descent: float = min(0.25, abs(z_moving - z_safe) / xy_ticks)
+        waypoints: List[[int, int, int]] = [[x0, y0, z_climb_start]]
+        if climb > 0:
+            waypoints.append([round(x0 + (x1 - x0) * climb), round(y0 + (y1 - y0) * climb), z_moving])
+        waypoints.append([round(x1 - (x1 - x0) * descent), round(y1 - (y1 - y0) * descent), waypoints[-1][Axis.Z.value]])
+        waypoints.append([x1, y1, z_safe])
+        for start, end in zip(waypoints, waypoints[1:]):
+            if start != end:
+                segments.append(MotionSegment(start, end))
+
+        # settle above the DPS, then plunge
+        segments[-1].dwell_s = self.settle_dwell_s
+        segments.append(MotionSegment([x1, y1, z_safe], [x1, y1, z1]))
+
+        self.plan_junctions(segments)
+        return segments
+
+    def junction_limit_us(self, previous: MotionSegment, following: MotionSegment) -> int | None:
+        if previous.dwell_s > 0:
+            return None
+        direction_previous, direction_following = previous.direction(), following.direction()
+        # highest tick rate [1/s] where no axis changes its step rate by more than its start speed
+        tick_rate: float = float('inf')
+        for axis in Axis:
+            jump: float = abs(direction_previous[axis.value] - direction_following[axis.value])
+            if jump > 0:
+                tick_rate = min(tick_rate, 1000000 / (2 * get_axis_params(axis)['min_speed']) / jump)
+        junction_us: int = max(round(1000000 / (2 * tick_rate)) if tick_rate != float('inf') else 0,
+                               speed_percent_to_us(combine_axis_params(list(previous.moving_axes)), self.speed_percent),
+                               speed_percent_to_us(combine_axis_params(list(following.moving_axes)), self.speed_percent))
+        # not faster than the start speed --> the junction is a stop
+        return None if junction_us >= combine_axis_params(list(previous.moving_axes + following.moving_axes))['min_speed'] else junction_us
+
+    def plan_junctions(self, segments: List[MotionSegment]) -> None:
+        # junction limits (the path starts and ends at rest)
+        junctions: List[int | None] = [None] + [self.junction_limit_us(previous, following) for previous, following in zip(segments, segments[1:])] + [None]
+
+        # backward pass: every segment has to be able to decelerate to its exit speed
+        for k in range(len(segments) - 1, -1, -1):
+            params: dict[str, int] = combine_axis_params(list(segments[k].moving_axes))
+            reachable_us: int = ramp_index_to_delay(params, delay_to_ramp_index(params, junctions[k + 1], 'decc_ramp') + segments[k].n_ticks, 'decc_ramp')
+            junctions[k] = _slower(junctions[k], reachable_us)
+
+        # forward pass: every segment has to be able to accelerate to its exit speed
+        for k, segment in enumerate(segments):
+            params: dict[str, int] = combine_axis_params(list(segment.moving_axes))
+            reachable_us: int = ramp_index_to_delay(params, delay_to_ramp_index(params, junctions[k], 'acc_ramp') + segment.n_ticks, 'acc_ramp')
+            junctions[k + 1] = _slower(junctions[k + 1], reachable_us)
+
+        for k, segment in enumerate(segments):
+            segment.entry_us, segment.exit_us = junctions[k], junctions[k + 1]
+
+    def estimate_duration_s(self, segments: List[MotionSegment]) -> float:
+        return sum(2 * sum(get_segment_delays_us(segment.moving_axes, self.speed_percent, segment.n_ticks, segment.entry_us, segment.exit_us)) / 1000000.0
+                   + segment.dwell_s for segment in segments)
+
+
+class TestMotionPlanner(unittest.TestCase):
+
+    def setUp(self):
+        self.planner = MotionPlanner(12, 6, 100)
+
+    def test_hop_ends_on_dps(self):
+        segments = self.planner.plan_hop([0, 0, 0], [7597, 5760, 0])
+        self.assertEqual(segments[0].end_step, [0, 0, 2400], "Pins should leave the plate vertically")
+        self.assertEqual(segments[-1].start_step, [7597, 5760, 2400], "Pins should enter the plate vertically")
+        self.assertEqual(segments[-1].end_step, [7597, 5760, 0])
+        for previous, following in zip(segments, segments[1:]):
+            self.assertEqual(previous.end_step, following.start_step)
+            self.assertEqual(previous.exit_us, following.entry_us)
+
+    def test_dwell_only_before_plunge(self):
+        segments = self.planner.plan_hop([0, 0, 0], [7597, 0, 0])
+        self.assertEqual([segment.dwell_s for segment in segments], [0.0] * (len(segments) - 2) + [0.25, 0.0])
+        self.assertIsNone(segments[-2].exit_us)
+        self.assertIsNone(segments[0].entry_us)
+        self.assertIsNone(segments[-1].exit_us)
+
+    def test_z_only_hop(self):
+        segments = self.planner.plan_hop([100, 100, 4800], [100, 100, 0])
+        self.assertEqual(len(segments), 1)
+        self.assertEqual(segments[0].delta_step, [0, 0, -4800])
+
+    def test_junctions_are_reachable(self):
+        segments = self.planner.plan_hop([0, 0, 0], [7597, 0, 0])
+        for segment in segments:
+            params = combine_axis_params(list(segment.moving_axes))
+            entry = delay_to_ramp_index(params, segment.entry_us, 'acc_ramp')
+            exit = delay_to_ramp_index(params, segment.exit_us, 'decc_ramp')
+            self.assertLessEqual(abs(entry - exit), segment.n_ticks + 1)
+
+
+def benchmark_plate_trajectory_time():
+    # compare the blended trajectory with the coordinated stop-and-go moves (travel only, the DPS processing is not included)
+    from app.cnc_programmer.config.config_parser import CNCProgrammerConfigParser
+    from app.cnc_programmer.stepper.trajectory import estimate_plate_travel_time_s
+
+    config = CNCProgrammerConfigParser(f"{ROOT_DIR}/../resources/config_cnc_programmer.conf").parse_config()
+    planner = MotionPlanner(config.z_moving_height_mm, config.z_minimum_safe_height_mm, 100)
+    for plate_config in config.plate_configs.values():
+        positions = plate_config.generate_position_sequence(0, 0)
+        plan = planner.plan([0, 0, 0], plate_config, positions)
+        coordinated_s = estimate_plate_travel_time_s(plate_config, config.z_moving_height_mm, 100, coordinated=True)
+        blended_s = sum(planner.estimate_duration_s(segments) for _, segments in plan)
+        print(f"Plate {plate_config.name} ({len(positions)} positions)")
+        print(f"  coordinated stop-and-go moves:  {coordinated_s:.2f} s ({coordinated_s / len(positions):.3f} s per position)")
+        print(f"  blended trajectory:             {blended_s:.2f} s ({blended_s / len(positions):.3f} s per position)")
+        print(f"  saved:                          {coordinated_s - blended_s:.2f} s ({100 * (1 - blended_s / coordinated_s):.1f} %)")
+
+
+if __name__ == "__main__":
+    benchmark_plate_trajectory_time()
@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import unittest
+from ctypes import c_bool, c_long
+from typing import Any, List, Tuple
+
+from app.cnc_programmer.stepper.axis_params import get_axis_params, set_axis_params
+from app.cnc_programmer.stepper.motion_planner import MotionSegment
+from app.cnc_programmer.stepper.position import Axis, PositionInSteps as PosStep
+from app.cnc_programmer.stepper.ramp import clear_ramp_tables
+
+
+def _set_realtime_scheduling(cpu: int | None, priority: int | None) -> None:
+    # pin the process to a CPU core and raise its scheduling priority (both optional, Linux only)
+    if cpu is not None:
+        try:
+            os.sched_setaffinity(0, {cpu})
+            logging.info(f"[MOTION]: Process pinned to CPU {cpu}")
+        except (AttributeError, OSError) as e:
+            logging.warning(f"[MOTION]: Process cannot be pinned to CPU {cpu}: {e}")
+    if priority is not None:
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+            logging.info(f"[MOTION]: Process scheduled with SCHED_FIFO priority {priority}")
+        except (AttributeError, OSError) as e:
+            # not permitted (no CAP_SYS_NICE) --> at least lower the niceness
+            logging.warning(f"[MOTION]: Real-time priority cannot be set: {e}")
+            try:
+                os.nice(-10)
+            except OSError:
+                pass
+
+
+def _motion_process_main(command_queue: multiprocessing.Queue, response_queue: multiprocessing.Queue, shared_pos, shared_running,
+                         cpu: int | None, priority: int | None, executor_name: str | None) -> None:
+    # NOTE: hardware is opened in the motion process only (stepper pins), the parent process owns the rest of the board
+    from app.cnc_programmer.rpi_board import RPiBoard
+    from app.cnc_programmer.stepper.pulse_backend import create_pulse_executor
+    from app.cnc_programmer.stepper.stepper_driver import StepperDriver
+
+    logging.getLogger().setLevel(logging.INFO)
+    _set_realtime_scheduling(cpu, priority)
+
+    board = RPiBoard(stepper=True, dps=False)
+    stepper_driver = StepperDriver(board, create_pulse_executor(board, executor_name), shared_pos, shared_running)
+    logging.info("[MOTION]: Process started...")
+
+    while True:
+        command, args = command_queue.get()
+        if command is None:
+            break
+        try:
+            response_queue.put((True, getattr(stepper_driver, command)(*args)))
+        except Exception as e:
+            logging.exception(f"[MOTION]: Command {command} failed")
+            response_queue.put((False, repr(e)))
+
+    board.deinit()
+    logging.info("[MOTION]: Process exited...")
+
+
+class MotionProcess:
+    # Client of the stepper driver running in a separate process,
+    # it has the same interface as StepperDriver:
+    # - moves (and home/reset) are sent as commands over the command queue, the call blocks until the response arrives
+    # - stop (running flag) and position are shared memory, so they do not wait for the command queue
+
+    COMMANDS: Tuple[str, ...] = ("set_axis_specifications", "go_to_pos_step", "go_to_pos_mm", "go_to_pos_step_xyz", "go_to_pos_mm_xyz", "execute_segments", "move", "go_home", "reset_pos")
+    # the response is awaited in polls, the process is checked for being alive in between (a crashed process never responds)
+    RESPONSE_POLL_S: float = 0.1
+
+    def __init__(self, cpu: int | None = None, priority: int | None = None, executor_name: str | None = None) -> None:
+        # NOTE: spawn --> a clean interpreter without the GUI and the threads of the parent process
+        context = multiprocessing.get_context("spawn")
+        self.command_queue: multiprocessing.Queue = context.Queue()
+        self.response_queue: multiprocessing.Queue = context.Queue()
+        self.shared_pos = context.RawArray(c_long, 3)
+        self.shared_running = context.RawValue(c_bool, False)
+        self.pos_current_step = PosStep(pos=self.shared_pos)
+        # axis specification set before the process is started (sent as the first command)
+        self.axis_configs: dict[Axis, dict] | None = None
+        # one command at a time (commands are sent from the worker and from the GUI thread)
+        self.lock: threading.Lock = threading.Lock()
+        self.process = context.Process(target=_motion_process_main, name="motion",
+                                       args=(self.command_queue, self.response_queue, self.shared_pos, self.shared_running, cpu, priority, executor_name),
+                                       daemon=True)
+
+    def start(self) -> None:
+        self.process.start()
+        if self.axis_configs is not None:
+            self._execute("set_axis_specifications", self.axis_configs)
+
+    def stop(self, timeout: float = 2) -> None:
+        self.running = False
+        self.command_queue.put((None, ()))
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+
+    def is_alive(self) -> bool:
+        return self.process.is_alive()
+
+    @property
+    def running(self) -> bool:
+        return self.shared_running.value
+
+    @running.setter
+    def running(self, value: bool) -> None:
+        self.shared_running.value = value
+
+    def _execute(self, command: str, *args) -> Any:
+        assert command in MotionProcess.COMMANDS
+        with self.lock:
+            if not self.process.is_alive():
+                raise RuntimeError(f"Motion command {command} failed: motion process is not running")
+            self.command_queue.put((command, args))
+            while True:
+                try:
+                    succeeded, result = self.response_queue.get(timeout=MotionProcess.RESPONSE_POLL_S)
+                    break
+                except queue.Empty:
+                    if not self.process.is_alive():
+                        raise RuntimeError(f"Motion command {command} failed: motion process exited (exit code {self.process.exitcode})")
+        if not succeeded:
+            raise RuntimeError(f"Motion command {command} failed: {result}")
+        return result
+
+    def get_current_pos(self) -> [int, int, int]:
+        return list(self.shared_pos)
+
+    def get_current_pos_mm(self) -> [float, float, float]:
+        return [self.pos_current_step.to_mm(axis, get_axis_params(axis)['steps_per_mm']) for axis in Axis]
+
+    def set_axis_specifications(self, axis_configs: dict[Axis, dict]) -> None:
+        # NOTE: applied in both processes, the ramps are computed in the motion process, the trajectory is planned in this one
+        for axis in Axis:
+            set_axis_params(axis, axis_configs.get(axis, {}))
+        clear_ramp_tables()
+        self.axis_configs = axis_configs
+        if self.process.is_alive():
+            self._execute("set_axis_specifications", axis_configs)
+
+    def reset_pos(self) -> None:
+        self._execute("reset_pos")
+
+    def go_to_pos_step(self, axis: Axis, pos_target_axis_step: int, speed_percent: float, wait_time: float = 0.0) -> bool:
+        return self._execute("go_to_pos_step", axis, pos_target_axis_step, speed_percent, wait_time)
+
+    def go_to_pos_mm(self, axis: Axis, pos_target_axis_mm: float, speed_percent: float, wait_time: float = 0.0) -> bool:
+        return self._execute("go_to_pos_mm", axis, pos_target_axis_mm, speed_percent, wait_time)
+
+    def go_to_pos_step_xyz(self, pos_target_step: [int | None, int | None, int | None], speed_percent: float, wait_time: float = 0.0) -> bool:
+        return self._execute("go_to_pos_step_xyz", pos_target_step, speed_percent, wait_time)
+
+    def go_to_pos_mm_xyz(self, pos_target_mm: [float | None, float | None, float | None], speed_percent: float, wait_time: float = 0.0) -> bool:
+        return self._execute("go_to_pos_mm_xyz", pos_target_mm, speed_percent, wait_time)
+
+    def execute_segments(self, segments: List[MotionSegment], speed_percent: float) -> bool:
+        return self._execute("execute_segments", segments, speed_percent)
+
+    def move(self, axis: Axis, step_mm: float, speed_percent: float) -> bool:
+        return self._execute("move", axis, step_mm, speed_percent)
+
+    def go_home(self, speed_percent: float) -> bool:
+        return self._execute("go_home", speed_percent)
+
+
+class TestMotionProcess(unittest.TestCase):
+    # NOTE: runs on the simulated hardware (SCILIF_HAL=simulated python -m unittest app.cnc_programmer.stepper.motion_process)
+
+    def setUp(self):
+        self.motion = MotionProcess()
+        self.motion.start()
+        self.motion.running = True
+
+    def tearDown(self):
+        self.motion.stop()
+
+    def test_move(self):
+        self.assertTrue(self.motion.go_to_pos_step(Axis.X, 800, 100))
+        self.assertEqual(self.motion.get_current_pos(), [800, 0, 0])
+
+    def test_process_killed_during_move(self):
+        # the waiting command fails instead of blocking forever (and the lock is released)
+        threading.Timer(0.3, self.motion.process.kill).start()
+        start = time.perf_counter()
+        with self.assertRaises(RuntimeError):
+            self.motion.go_to_pos_mm(Axis.X, 200, 10)
+        self.assertLess(time.perf_counter() - start, 0.3 + 5 * MotionProcess.RESPONSE_POLL_S)
+        self.assertFalse(self.motion.lock.locked())
+        with self.assertRaises(RuntimeError):
+            self.motion.reset_pos()
@@ -9,8 +9,9 @@ class Axis(Enum):
 
 
 class PositionInSteps:
-    def __init__(self, x: int = 0, y: int = 0, z: int = 0) -> None:
-        self.pos: [int, int, int] = [x, y, z]
+    def __init__(self, x: int = 0, y: int = 0, z: int = 0, pos: [int, int, int] = None) -> None:
+        # pos: external storage of the position (e.g. a shared memory array)
+        self.pos: [int, int, int] = [x, y, z] if pos is None else pos
 
     def get(self, axis: Axis) -> int:
         return self.pos[axis.value]
@@ -19,7 +20,8 @@ class PositionInSteps:
         self.pos[axis.value] = value
 
     def reset(self) -> None:
-        self.pos = [0, 0, 0]
+        # NOTE: in place, the position may live in a shared memory
+        self.pos[:] = [0, 0, 0]
 
     def increment(self, axis: Axis, increment: int) -> None:
         self.pos[axis.value] = self.pos[axis.value] + increment
@@ -29,7 +31,7 @@ class PositionInSteps:
         return self.pos[axis.value]/steps_per_mm
 
     def is_home(self) -> bool:
-        return self.pos == [0, 0, 0]
+        return list(self.pos) == [0, 0, 0]
 
 
     def __str__(self):
@@ -0,0 +1,343 @@
+from __future__ import annotations
+
+import logging
+import time
+import unittest
+from abc import ABC, abstractmethod
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+from typing import Callable, List, Tuple
+
+from app.cnc_programmer.stepper.position import Axis
+from app.cnc_programmer.stepper.ramp import get_ramp_table, get_segment_delays_us
+from app.cnc_programmer.stepper.trajectory import dda_step_masks
+from lib.hal_backend import is_simulated
+
+try:
+    import pigpio
+except ImportError:
+    pigpio = None
+
+
+class PulseSchedule:
+    # Whole move compiled into step pulses:
+    # - masks: axes to step in the tick (bit index = Axis.value)
+    # - delays_us: duration of the step pin high and low level in the tick
+    # - increments: position increment of every axis per step (+1, -1 or 0 if the axis does not move)
+
+    def __init__(self, masks: array, delays_us: array, increments: [int, int, int]) -> None:
+        self.masks: array = masks
+        self.delays_us: array = delays_us
+        self.increments: [int, int, int] = increments
+
+    @staticmethod
+    def compile(delta_step: [int, int, int], speed_percent: float, entry_us: int | None = None, exit_us: int | None = None) -> PulseSchedule:
+        # entry_us, exit_us: step delay at the start / end of a blended segment (None --> the move starts / ends at rest)
+        moving_axes: Tuple[Axis, ...] = tuple(axis for axis in Axis if delta_step[axis.value] != 0)
+        n_ticks: int = max(abs(delta) for delta in delta_step)
+        if entry_us is None and exit_us is None:
+            delays_us: array = array('I', get_ramp_table(moving_axes, speed_percent, n_ticks).delays_us(n_ticks))
+        else:
+            delays_us: array = get_segment_delays_us(moving_axes, speed_percent, n_ticks, entry_us, exit_us)
+        return PulseSchedule(
+            array('B', dda_step_masks([abs(delta) for delta in delta_step])),
+            delays_us,
+            [(delta > 0) - (delta < 0) for delta in delta_step])
+
+    def __len__(self) -> int:
+        return len(self.masks)
+
+    def duration_us(self) -> int:
+        return 2 * sum(self.delays_us)
+
+    def steps(self, start: int = 0, end: int = None) -> [int, int, int]:
+        # signed number of steps of every axis in the ticks [start, end)
+        end = len(self.masks) if end is None else end
+        masks = self.masks[start:end]
+        return [sum(1 for mask in masks if mask & (1 << axis.value)) * self.increments[axis.value] for axis in Axis]
+
+
+class PulseExecutor(ABC):
+    # Executes a compiled pulse schedule on the step pins and keeps the position up to date,
+    # returns False if the schedule was interrupted (should_run returned False)
+
+    @abstractmethod
+    def execute(self, schedule: PulseSchedule, pos: [int, int, int], should_run: Callable[[], bool]) -> bool:
+        pass
+
+
+class SleepPulseExecutor(PulseExecutor):
+    # NOTE: fallback, bit-banging with time.sleep (timing limited by the sleep granularity)
+
+    def __init__(self, board: "RPiBoard") -> None:
+        self.board = board
+
+    def execute(self, schedule: PulseSchedule, pos: [int, int, int], should_run: Callable[[], bool]) -> bool:
+        # NOTE: keep the step loop as short as possible (local variables only), it is timing critical
+        # (step pin, axis bit in the mask, axis index, position increment) of every moving axis
+        moving: [tuple] = [(self.board.stepper_step_pins[axis.value], 1 << axis.value, axis.value, schedule.increments[axis.value])
+                           for axis in Axis if schedule.increments[axis.value] != 0]
+        sleep = time.sleep
+
+        for speed_current_us, mask in zip(schedule.delays_us, schedule.masks):
+            # break condition
+            if not should_run(): return False
+
+            # switch the step pins
+            for step_pin, bit, _, _ in moving:
+                if mask & bit:
+                    step_pin.value = True
+            sleep(speed_current_us / 1000000.0)
+            for step_pin, bit, axis_index, increment in moving:
+                if mask & bit:
+                    step_pin.value = False
+                    pos[axis_index] += increment
+            sleep(speed_current_us / 1000000.0)
+        return True
+
+
+class SoftwarePulseExecutor(PulseExecutor):
+    # Reference executor: every pin edge is scheduled against an absolute timeline of the whole move,
+    # so the Python overhead of a tick is absorbed instead of being added to every pulse
+    # (only a stall longer than a period restarts the timeline),
+    # it sleeps when the next edge is far away and busy waits otherwise
+
+    SPIN_THRESHOLD_NS: int = 2000000
+
+    def __init__(self, board: "RPiBoard") -> None:
+        self.board = board
+
+    def execute(self, schedule: PulseSchedule, pos: [int, int, int], should_run: Callable[[], bool]) -> bool:
+        moving: [tuple] = [(self.board.stepper_step_pins[axis.value], 1 << axis.value, axis.value, schedule.increments[axis.value])
+                           for axis in Axis if schedule.increments[axis.value] != 0]
+        clock = time.perf_counter_ns
+        sleep = time.sleep
+        spin_threshold_ns: int = SoftwarePulseExecutor.SPIN_THRESHOLD_NS
+
+        deadline_ns: int = clock()
+        for speed_current_us, mask in zip(schedule.delays_us, schedule.masks):
+            # break condition
+            if not should_run(): return False
+
+            for step_pin, bit, _, _ in moving:
+                if mask & bit:
+                    step_pin.value = True
+            # NOTE: a stall (GC pause, preemption, slow should_run) longer than the period of the tick re-anchors the timeline,
+            # the following pulses are delayed instead of being fired back to back to catch up
+            if (now_ns := clock()) - deadline_ns > speed_current_us * 2000:
+                deadline_ns = now_ns
+            deadline_ns += speed_current_us * 1000
+            while (remaining_ns := deadline_ns - clock()) > 0:
+                if remaining_ns > spin_threshold_ns:
+                    sleep((remaining_ns - spin_threshold_ns) / 1000000000.0)
+
+            for step_pin, bit, axis_index, increment in moving:
+                if mask & bit:
+                    step_pin.value = False
+                    pos[axis_index] += increment
+            if (now_ns := clock()) - deadline_ns > speed_current_us * 2000:
+                deadline_ns = now_ns
+            deadline_ns += speed_current_us * 1000
+            while (remaining_ns := deadline_ns - clock()) > 0:
+                if remaining_ns > spin_threshold_ns:
+                    sleep((remaining_ns - spin_threshold_ns) / 1000000000.0)
+        return True
+
+
+class SimulatedPulseExecutor(PulseExecutor):
+    # Executes schedules on a virtual clock without touching any pin,
+    # realtime=True waits for the duration of the schedule (e.g. for cycle time benchmarks)
+
+    def __init__(self, realtime: bool = False) -> None:
+        self.realtime: bool = realtime
+        self.elapsed_us: int = 0
+        self.schedules: List[PulseSchedule] = []
+
+    def execute(self, schedule: PulseSchedule, pos: [int, int, int], should_run: Callable[[], bool]) -> bool:
+        self.schedules.append(schedule)
+        # time of the end of every tick
+        tick_ends_us: List[int] = list(accumulate(2 * delay_us for delay_us in schedule.delays_us))
+
+        start: float = time.perf_counter()
+        while should_run():
+            elapsed_us: int = round((time.perf_counter() - start) * 1000000) if self.realtime else tick_ends_us[-1]
+            if elapsed_us >= tick_ends_us[-1]:
+                for axis, steps in zip(Axis, schedule.steps()):
+                    pos[axis.value] += steps
+                self.elapsed_us += tick_ends_us[-1]
+                return True
+            time.sleep(min(0.01, (tick_ends_us[-1] - elapsed_us) / 1000000.0))
+
+        # interrupted --> only the ticks finished until now were executed
+        ticks_done: int = bisect_right(tick_ends_us, round((time.perf_counter() - start) * 1000000))
+        for axis, steps in zip(Axis, schedule.steps(0, ticks_done)):
+            pos[axis.value] += steps
+        self.elapsed_us += tick_ends_us[ticks_done - 1] if ticks_done else 0
+        return False
+
+
+class PigpioWaveExecutor(PulseExecutor):
+    # DMA timed executor, the schedule is converted into pigpio waveforms (chunk by chunk)
+    # which are transmitted by the pigpio daemon without any involvement of Python
+
+    TICKS_PER_WAVE: int = 2000
+
+    def __init__(self, step_gpios: [int, int, int]) -> None:
+        self.pi = pigpio.pi()
+        if not self.pi.connected:
+            raise RuntimeError("pigpio daemon is not running")
+        # GPIO bit mask for every combination of the stepping axes
+        self.gpio_masks: [int] = [sum(1 << step_gpios[axis.value] for axis in Axis if mask & (1 << axis.value)) for mask in range(1 << len(Axis))]
+
+    def _add_wave(self, schedule: PulseSchedule, start: int, end: int) -> int:
+        pulses = []
+        for i in range(start, end):
+            gpio_mask: int = self.gpio_masks[schedule.masks[i]]
+            pulses.append(pigpio.pulse(gpio_mask, 0, schedule.delays_us[i]))
+            pulses.append(pigpio.pulse(0, gpio_mask, schedule.delays_us[i]))
+        self.pi.wave_add_generic(pulses)
+        return self.pi.wave_create()
+
+    def execute(self, schedule: PulseSchedule, pos: [int, int, int], should_run: Callable[[], bool]) -> bool:
+        self.pi.wave_clear()
+        # waves in the DMA buffer (wave id, ticks [start, end)), the first one is being transmitted
+        sent: List[Tuple[int, Tuple[int, int]]] = []
+        started_at: float = time.perf_counter()
+        interrupted: bool = False
+
+        for start in range(0, len(schedule), PigpioWaveExecutor.TICKS_PER_WAVE):
+            chunk: Tuple[int, int] = (start, min(start + PigpioWaveExecutor.TICKS_PER_WAVE, len(schedule)))
+            wave_id: int = self._add_wave(schedule, *chunk)
+            # the next wave starts right after the previous one is finished
+            self.pi.wave_send_using_mode(wave_id, pigpio.WAVE_MODE_ONE_SHOT_SYNC)
+            sent.append((wave_id, chunk))
+            if len(sent) == 1:
+                started_at = time.perf_counter()
+                continue
+            # keep at most two waves in the DMA buffer
+            while self.pi.wave_tx_at() == sent[0][0]:
+                if not should_run(): break
+                time.sleep(0.001)
+            else:
+                self._release(schedule, pos, sent.pop(0))
+                started_at = time.perf_counter()
+                continue
+            interrupted = True
+            break
+
+        while not interrupted and self.pi.wave_tx_busy():
+            if not should_run(): interrupted = True
+            time.sleep(0.001)
+
+        if interrupted:
+            self.pi.wave_tx_stop()
+            # NOTE: the position in the interrupted wave is estimated from the elapsed time
+            wave_id, (start, end) = sent.pop(0)
+            tick_ends_us: List[int] = list(accumulate(2 * delay_us for delay_us in schedule.delays_us[start:end]))
+            self._release(schedule, pos, (wave_id, (start, start + bisect_right(tick_ends_us, round((time.perf_counter() - started_at) * 1000000)))))
+            for wave_id, _ in sent:
+                self.pi.wave_delete(wave_id)
+        else:
+            for wave in sent:
+                self._release(schedule, pos, wave)
+        return not interrupted
+
+    def _release(self, schedule: PulseSchedule, pos: [int, int, int], wave: Tuple[int, Tuple[int, int]]) -> None:
+        wave_id, (start, end) = wave
+        for axis, steps in zip(Axis, schedule.steps(start, end)):
+            pos[axis.value] += steps
+        self.pi.wave_delete(wave_id)
+
+
+def create_pulse_executor(board: "RPiBoard", name: str | None = None) -> PulseExecutor:
+    # name: pigpio, software, sleep, simulated (None --> simulated on the simulated hardware, pigpio if available, otherwise sleep)
+    if name is None and is_simulated():
+        return SimulatedPulseExecutor(realtime=True)
+    if name in (None, "pigpio") and pigpio is not None:
+        try:
+            from app.cnc_programmer.rpi_board import RPiBoard
+            return PigpioWaveExecutor([RPiBoard.PIN_STEPPER_X_STEP.id, RPiBoard.PIN_STEPPER_Y_STEP.id, RPiBoard.PIN_STEPPER_Z_STEP.id])
+        except RuntimeError as e:
+            logging.warning(f"[STEPPER]: pigpio executor not available ({e}), falling back to the sleep executor")
+    if name == "software":
+        return SoftwarePulseExecutor(board)
+    if name == "simulated":
+        return SimulatedPulseExecutor()
+    return SleepPulseExecutor(board)
+
+
+class TestPulseSchedule(unittest.TestCase):
+
+    def test_compile(self):
+        schedule = PulseSchedule.compile([7596, -5760, 0], 100)
+        self.assertEqual(len(schedule), 7596)
+        self.assertEqual(schedule.steps(), [7596, -5760, 0])
+        self.assertEqual(schedule.increments, [1, -1, 0])
+
+    def test_simulated_execution(self):
+        executor = SimulatedPulseExecutor()
+        pos = [10, 20, 30]
+        schedule = PulseSchedule.compile([0, 0, -800], 100)
+        self.assertTrue(executor.execute(schedule, pos, lambda: True))
+        self.assertEqual(pos, [10, 20, -770])
+        self.assertEqual(executor.elapsed_us, schedule.duration_us())
+
+    def test_simulated_interruption(self):
+        executor = SimulatedPulseExecutor()
+        pos = [0, 0, 0]
+        self.assertFalse(executor.execute(PulseSchedule.compile([3200, 0, 0], 100), pos, lambda: False))
+        self.assertEqual(pos, [0, 0, 0])
+
+    def _software_executor(self):
+        from types import SimpleNamespace
+        from lib.simulated_hw import DigitalInOut, Direction, board
+        step_pin = DigitalInOut(board.D21)
+        step_pin.direction = Direction.OUTPUT
+        step_pin.value = False
+        return SoftwarePulseExecutor(SimpleNamespace(stepper_step_pins=[step_pin, None, None]))
+
+    def test_software_execution_timing(self):
+        # the overhead of the loop is absorbed: the schedule takes its duration, not the duration plus the overhead of every tick
+        # (70 us of work in should_run, shorter than the shortest level of 100 us, 140 ms in total when added to every tick)
+        executor = self._software_executor()
+        schedule = PulseSchedule.compile([2000, 0, 0], 100)
+
+        def should_run() -> bool:
+            busy_until = time.perf_counter_ns() + 70000
+            while time.perf_counter_ns() < busy_until:
+                pass
+            return True
+
+        pos = [0, 0, 0]
+        start = time.perf_counter()
+        self.assertTrue(executor.execute(schedule, pos, should_run))
+        elapsed_s = time.perf_counter() - start
+        self.assertEqual(pos, [2000, 0, 0])
+        self.assertGreaterEqual(elapsed_s, schedule.duration_us() / 1000000)
+        self.assertLess(elapsed_s, schedule.duration_us() / 1000000 * 1.1)
+
+    def test_software_execution_after_stall(self):
+        # a stall in the loop must not be caught up by firing the following pulses back to back
+        from lib.simulated_hw import board, pin_recorder
+        executor = self._software_executor()
+        schedule = PulseSchedule.compile([200, 0, 0], 100)
+        ticks: List[int] = []
+
+        def should_run() -> bool:
+            ticks.append(len(ticks))
+            if len(ticks) == 50:
+                time.sleep(0.05)
+            return True
+
+        pin_recorder.clear()
+        pos = [0, 0, 0]
+        self.assertTrue(executor.execute(schedule, pos, should_run))
+        self.assertEqual(pos, [200, 0, 0])
+        edges_ns: List[int] = [timestamp for timestamp, name, _ in pin_recorder.events if name == board.D21.name]
+        self.assertEqual(len(edges_ns), 2 * len(schedule))
+        # no burst after the stall (the stall covers 50 and more ticks, caught up they would be 100 and more short levels),
+        # a few short levels are left to the lags shorter than a period (caught up) and to the preemption of the test process
+        level_delays_ns: List[int] = [delay_us * 1000 for delay_us in schedule.delays_us for _ in range(2)]
+        short_levels: int = sum(1 for index in range(len(edges_ns) - 1) if edges_ns[index + 1] - edges_ns[index] < level_delays_ns[index] / 2)
+        self.assertLessEqual(short_levels, 15)
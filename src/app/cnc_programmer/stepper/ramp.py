@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import math
+import unittest
+from array import array
+from functools import lru_cache
+from itertools import chain, repeat
+from typing import Iterable, List, Tuple
+
+from app.cnc_programmer.stepper.axis_params import RampProfile, get_axis_params
+from app.cnc_programmer.stepper.position import Axis
+
+# distance class of all moves long enough to reach the cruise speed (full acceleration and deceleration ramp)
+LONG_MOVE: int = 0
+
+
+def speed_percent_to_us(axis_params: dict[str, int], speed_percent: float) -> int:
+    # convert speed from percentage to microseconds
+    if speed_percent > 100:
+        speed_percent = 100
+    return round((axis_params['min_speed'] - axis_params['max_speed']) * (100 - speed_percent) / 100 + axis_params['max_speed'])
+
+
+def ramp_shape(axis_params: dict, fraction: float) -> float:
+    # part of the speed change (0 --> min_speed, 1 --> max_speed) done at the fraction of the ramp
+    # S-curve: smoothstep, the acceleration rises from zero at the start and falls back to zero at the end of the ramp (limited jerk)
+    if axis_params['profile'] == RampProfile.S_CURVE:
+        return fraction * fraction * (3 - 2 * fraction)
+    return fraction
+
+
+def ramp_shape_inverse(axis_params: dict, part: float) -> float:
+    if axis_params['profile'] == RampProfile.S_CURVE:
+        return 0.5 - math.sin(math.asin(1 - 2 * part) / 3)
+    return part
+
+
+def delay_to_ramp_index(axis_params: dict[str, int], delay_us: int | None, ramp: str) -> int:
+    # position (in pulses) on the acceleration ('acc_ramp') or deceleration ('decc_ramp') ramp where the delay is reached,
+    # None --> start / end of the ramp (minimum speed)
+    if delay_us is None or delay_us >= axis_params['min_speed']:
+        return 0
+    if delay_us <= axis_params['max_speed']:
+        return axis_params[ramp]
+    part: float = (axis_params['min_speed'] - delay_us) / (axis_params['min_speed'] - axis_params['max_speed'])
+    return round(ramp_shape_inverse(axis_params, part) * axis_params[ramp])
+
+
+def ramp_index_to_delay(axis_params: dict[str, int], index: int, ramp: str) -> int:
+    fraction: float = min(index, axis_params[ramp]) / axis_params[ramp]
+    return round(axis_params['min_speed'] - (axis_params['min_speed'] - axis_params['max_speed']) * ramp_shape(axis_params, fraction))
+
+
+def trapezoid_delay_us(axis_params: dict[str, int], i: int, n_steps: int, speed_target_us: int) -> int:
+    # cruise (the target speed is always slower or equal to the maximum speed)
+    speed_current_us: int = speed_target_us
+    # deceleration
+    if (n_steps - i) <= axis_params['decc_ramp']:
+        speed_current_us = ramp_index_to_delay(axis_params, n_steps - i, 'decc_ramp')
+    # acceleration (has a priority over the deceleration)
+    if i <= axis_params['acc_ramp']:
+        speed_current_us = ramp_index_to_delay(axis_params, i, 'acc_ramp')
+    # if the target speed is greater (lower in value) than the calculated speed --> use target speed
+    return max(speed_current_us, speed_target_us)
+
+
+def combine_axis_params(axes: List[Axis]) -> dict[str, int]:
+    # the shared profile of a coordinated move is limited by the slowest of the moving axes
+    params: List[dict[str, int]] = [get_axis_params(axis) for axis in axes]
+    return {
+        'max_speed': max(p['max_speed'] for p in params),
+        'min_speed': max(p['min_speed'] for p in params),
+        'acc_ramp': max(p['acc_ramp'] for p in params),
+        'decc_ramp': max(p['decc_ramp'] for p in params),
+        'profile': RampProfile.S_CURVE if any(p['profile'] == RampProfile.S_CURVE for p in params) else RampProfile.TRAPEZOID,
+    }
+
+
+def get_distance_class(axis_params: dict[str, int], n_steps: int) -> int:
+    # short moves (triangular profile) have a table of their own, long moves share one table
+    return n_steps if n_steps <= axis_params['acc_ramp'] + axis_params['decc_ramp'] else LONG_MOVE
+
+
+class RampTable:
+    # Precomputed step delays (in microseconds) of the trapezoidal ramp:
+    # - head: acceleration part (delay of the i-th step from the start)
+    # - tail: deceleration part (delays of the last steps of the move)
+    # - cruise: delay of the steps in between
+
+    def __init__(self, axis_params: dict[str, int], speed_percent: float, distance_class: int) -> None:
+        self.speed_target_us: int = speed_percent_to_us(axis_params, speed_percent)
+        self.distance_class: int = distance_class
+
+        if distance_class != LONG_MOVE:
+            self.head: array = array('I', (trapezoid_delay_us(axis_params, i, distance_class, self.speed_target_us) for i in range(distance_class)))
+            self.tail: array = array('I')
+        else:
+            acc_ramp, decc_ramp = axis_params['acc_ramp'], axis_params['decc_ramp']
+            n_steps: int = acc_ramp + decc_ramp + 1
+            self.head: array = array('I', (trapezoid_delay_us(axis_params, i, n_steps, self.speed_target_us) for i in range(acc_ramp + 1)))
+            self.tail: array = array('I', (trapezoid_delay_us(axis_params, i, n_steps, self.speed_target_us) for i in range(n_steps - decc_ramp, n_steps)))
+        self.cruise_us: int = self.speed_target_us
+
+    def delays_us(self, n_steps: int) -> Iterable[int]:
+        if self.distance_class != LONG_MOVE:
+            assert n_steps == self.distance_class
+            return self.head
+        return chain(self.head, repeat(self.cruise_us, n_steps - len(self.head) - len(self.tail)), self.tail)
+
+    def duration_s(self, n_steps: int) -> float:
+        # every step takes two delays (step pin high and low)
+        return 2 * sum(self.delays_us(n_steps)) / 1000000.0
+
+
+@lru_cache(maxsize=None)
+def _get_ramp_table(axes: Tuple[Axis, ...], speed_percent: float, distance_class: int) -> RampTable:
+    return RampTable(combine_axis_params(list(axes)), speed_percent, distance_class)
+
+
+def get_ramp_table(axes: Tuple[Axis, ...], speed_percent: float, n_steps: int) -> RampTable:
+    # tables are cached by (axis, speed, distance class)
+    return _get_ramp_table(axes, speed_percent, get_distance_class(combine_axis_params(list(axes)), n_steps))
+
+
+def clear_ramp_tables() -> None:
+    # to be called whenever the axis specification changes
+    _get_ramp_table.cache_clear()
+
+
+def get_segment_delays_us(axes: Tuple[Axis, ...], speed_percent: float, n_steps: int, entry_us: int | None, exit_us: int | None) -> array:
+    # step delays of a blended segment which is entered and left at a non-zero speed,
+    # the ramps are the same as of a standalone move, only shifted by the entry / exit speed
+    axis_params: dict[str, int] = combine_axis_params(list(axes))
+    speed_target_us: int = speed_percent_to_us(axis_params, speed_percent)
+    entry_index: int = delay_to_ramp_index(axis_params, entry_us, 'acc_ramp')
+    # NOTE: the last pulse of a standalone move is already one pulse up the deceleration ramp, the last pulse of a blended segment runs at the exit speed
+    exit_index: int = max(0, delay_to_ramp_index(axis_params, exit_us, 'decc_ramp') - 1)
+    return array('I', (max(speed_target_us,
+                           ramp_index_to_delay(axis_params, entry_index + i, 'acc_ramp'),
+                           ramp_index_to_delay(axis_params, exit_index + n_steps - i, 'decc_ramp')) for i in range(n_steps)))
+
+
+class TestRampTable(unittest.TestCase):
+
+    def test_table_matches_ramp(self):
+        params = get_axis_params(Axis.X)
+        for n_steps in (1, 5, 400, 800, 801, 802, 7596):
+            table = get_ramp_table((Axis.X,), 100, n_steps)
+            speed_target_us = speed_percent_to_us(params, 100)
+            self.assertEqual(list(table.delays_us(n_steps)), [trapezoid_delay_us(params, i, n_steps, speed_target_us) for i in range(n_steps)])
+
+    def test_long_moves_share_table(self):
+        self.assertIs(get_ramp_table((Axis.Y,), 75, 5000), get_ramp_table((Axis.Y,), 75, 7000))
+        self.assertIsNot(get_ramp_table((Axis.Y,), 75, 5000), get_ramp_table((Axis.Y,), 100, 5000))
+
+    def test_trapezoid_delay(self):
+        params = get_axis_params(Axis.X)
+        self.assertEqual(trapezoid_delay_us(params, 0, 2000, 100), params['min_speed'])
+        self.assertEqual(trapezoid_delay_us(params, 1000, 2000, 100), params['max_speed'])
+        self.assertEqual(trapezoid_delay_us(params, 1999, 2000, 100), 499)
+        self.assertEqual(trapezoid_delay_us(params, 1000, 2000, 300), 300)
+
+    def test_segment_delays(self):
+        params = get_axis_params(Axis.Z)
+        delays = get_segment_delays_us((Axis.Z,), 100, 1000, 300, 200)
+        self.assertEqual(delays[0], 300)
+        self.assertEqual(delays[-1], 200)
+        self.assertEqual(min(delays), params['max_speed'])
+        self.assertEqual(list(get_segment_delays_us((Axis.Z,), 100, 2000, None, None)), list(get_ramp_table((Axis.Z,), 100, 2000).delays_us(2000)))
+
+    def test_s_curve(self):
+        params = dict(get_axis_params(Axis.X), profile=RampProfile.S_CURVE)
+        table = RampTable(params, 100, LONG_MOVE)
+        self.assertEqual(table.head[0], params['min_speed'])
+        self.assertEqual(table.head[-1], params['max_speed'])
+        # smooth start: the speed changes slower than on the linear ramp
+        self.assertGreater(table.head[10], trapezoid_delay_us(get_axis_params(Axis.X), 10, 7596, 100))
+        for index in (0, 50, 200, 399):
+            self.assertAlmostEqual(delay_to_ramp_index(params, ramp_index_to_delay(params, index, 'acc_ramp'), 'acc_ramp'), index, delta=3)
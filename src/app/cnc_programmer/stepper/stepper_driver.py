@@ -1,72 +1,41 @@
-# Axis X Settings
+from __future__ import annotations
+
 import time
+from ctypes import c_bool
+from multiprocessing.sharedctypes import RawValue
+from typing import List
 
 from app.cnc_programmer.rpi_board import RPiBoard
+from app.cnc_programmer.stepper.axis_params import X_MIN_SPEED, get_axis_params, set_axis_params
+from app.cnc_programmer.stepper.motion_planner import MotionSegment
 from app.cnc_programmer.stepper.position import Axis, PositionInSteps as PosStep
-
-# NOTES:
-# acceleration / deceleration ramp assumes movment more than 3 mm
-
-X_STEPS_PER_MM = 320  # 200 steps per revolution x 8 microsteps = 1600 steps per revolution / 5mm per revolution -> 1600/5 = 320 steps per mm
-X_MAX_SPEED = 100  # ideal reliable maximum speed (in microseconds per pulse)
-X_MIN_SPEED = 500  # minimum speed (in microseconds per pulse)
-X_ACC_RAMP = 400  # acceleration ramp (in pulses)
-X_DECC_RAMP = 400  # deceleration ramp (in pulses)
-
-# Axis Y Settings
-Y_STEPS_PER_MM = 320  # 200 steps per revolution x 8 microsteps = 1600 steps per revolution / 5mm per revolution -> 1600/5 = 320 steps per mm
-Y_MAX_SPEED = 100  # ideal reliable maximum speed (in microseconds per pulse)
-Y_MIN_SPEED = 500  # minimum speed (in microseconds per pulse)
-Y_ACC_RAMP = 400  # acceleration ramp (in pulses)
-Y_DECC_RAMP = 400  # deceleration ramp (in pulses)
-
-# Axis Z Settings
-Z_STEPS_PER_MM = 400  # 200 steps per revolution x 8 microsteps = 1600 steps per revolution / 4mm per revolution -> 1600/4 = 400 steps per mm
-Z_MAX_SPEED = 100  # ideal reliable maximum speed (in microseconds per pulse)
-Z_MIN_SPEED = 500  # minimum speed (in microseconds per pulse)
-Z_ACC_RAMP = 400  # acceleration ramp (in pulses)
-Z_DECC_RAMP = 400  # deceleration ramp (in pulses)
-
-X_AXIS_SPECIFICATION = {
-    'steps_per_mm': X_STEPS_PER_MM,
-    'max_speed': X_MAX_SPEED,
-    'min_speed': X_MIN_SPEED,
-    'acc_ramp': X_ACC_RAMP,
-    'decc_ramp': X_DECC_RAMP,
-}
-
-Y_AXIS_SPECIFICATION = {
-    'steps_per_mm': Y_STEPS_PER_MM,
-    'max_speed': Y_MAX_SPEED,
-    'min_speed': Y_MIN_SPEED,
-    'acc_ramp': Y_ACC_RAMP,
-    'decc_ramp': Y_DECC_RAMP,
-}
-
-Z_AXIS_SPECIFICATION = {
-    'steps_per_mm': Z_STEPS_PER_MM,
-    'max_speed': Z_MAX_SPEED,
-    'min_speed': Z_MIN_SPEED,
-    'acc_ramp': Z_ACC_RAMP,
-    'decc_ramp': Z_DECC_RAMP,
-}
-
-
-def get_axis_params(axis: Axis) -> dict[str, int]:
-    if axis == Axis.X:
-        return X_AXIS_SPECIFICATION
-    if axis == Axis.Y:
-        return Y_AXIS_SPECIFICATION
-    if axis == Axis.Z:
-        return Z_AXIS_SPECIFICATION
+from app.cnc_programmer.stepper.pulse_backend import PulseExecutor, PulseSchedule, create_pulse_executor
+from app.cnc_programmer.stepper.ramp import clear_ramp_tables, get_ramp_table
 
 
 class StepperDriver:
 
-    def __init__(self, board: RPiBoard) -> None:
+    def __init__(self, board: RPiBoard, pulse_executor: PulseExecutor = None, shared_pos: [int, int, int] = None, shared_running: c_bool = None) -> None:
+        # shared_pos, shared_running: optional shared memory storage of the position and of the running flag
+        # (when the driver runs in the motion process, see MotionProcess)
         self.board = board
-        self.pos_current_step = PosStep()
-        self.running = False
+        self.pulse_executor: PulseExecutor = create_pulse_executor(board) if pulse_executor is None else pulse_executor
+        self.pos_current_step = PosStep(pos=shared_pos)
+        self._running: c_bool = RawValue(c_bool, False) if shared_running is None else shared_running
+
+    @property
+    def running(self) -> bool:
+        return self._running.value
+
+    @running.setter
+    def running(self, value: bool) -> None:
+        self._running.value = value
+
+    def set_axis_specifications(self, axis_configs: dict[Axis, dict]) -> None:
+        # overrides of the axis specification from the config file (speeds, ramps, ramp profile)
+        for axis in Axis:
+            set_axis_params(axis, axis_configs.get(axis, {}))
+        clear_ramp_tables()
 
     def get_current_pos(self) -> [int, int, int]:
         return self.pos_current_step.pos
@@ -81,63 +50,67 @@ class StepperDriver:
 
     # Move to absolute position in step, speed in % of maximum speed
     def go_to_pos_step(self, axis: Axis, pos_target_axis_step: int, speed_percent: float, wait_time: float = 0.0) -> bool:
+        pos_target_step: [int | None, int | None, int | None] = [None, None, None]
+        pos_target_step[axis.value] = pos_target_axis_step
+        return self.go_to_pos_step_xyz(pos_target_step, speed_percent, wait_time)
+
+    # Move to absolute position in mm, speed in % of maximum speed
+    def go_to_pos_mm(self, axis: Axis, pos_target_axis_mm: float, speed_percent: float, wait_time: float = 0.0) -> bool:
         axis_params: dict[str, int] = get_axis_params(axis)
-        delta_step: int = pos_target_axis_step - self.pos_current_step.get(axis)
+        pos_target_axis_step: int = round(pos_target_axis_mm * axis_params['steps_per_mm'])
+        return self.go_to_pos_step(axis, pos_target_axis_step, speed_percent, wait_time)
+
+    # Move to absolute position in steps in more axes at once (coordinated move), speed in % of maximum speed
+    # NOTE: step pulses of all axes are interleaved (DDA) under a single trapezoidal profile of the major axis,
+    #       the move is compiled into a pulse schedule which is executed by the pulse executor (pigpio DMA, software or sleep loop)
+    def go_to_pos_step_xyz(self, pos_target_step: [int | None, int | None, int | None], speed_percent: float, wait_time: float = 0.0) -> bool:
+        # None --> axis does not move
+        pos_target_step = [self.pos_current_step.get(axis) if pos_target_step[axis.value] is None else pos_target_step[axis.value] for axis in Axis]
+        delta_step: [int, int, int] = [pos_target_step[axis.value] - self.pos_current_step.get(axis) for axis in Axis]
+        moving_axes: [Axis] = [axis for axis in Axis if delta_step[axis.value] != 0]
 
         # break condition
-        if delta_step == 0:
+        if len(moving_axes) == 0:
             return True
-
-        # convert speed from percentage to microseconds
-        if speed_percent > 100:
-            speed_percent = 100
-        elif speed_percent <= 0:
+        if speed_percent <= 0:
             return False
-        speed_target_us: int = round((axis_params['min_speed'] - axis_params['max_speed']) * (100 - speed_percent) / 100 + axis_params['max_speed'])
 
-        # helper variable to determine whether to increment or decrement the current position
-        direction: bool = delta_step > 0
-        # switch the direction output
-        self.board.stepper_dir_pins[axis.value].value = (not direction)
+        # compile the whole move into step pulses (precomputed ramp shared by all moving axes)
+        schedule: PulseSchedule = PulseSchedule.compile(delta_step, speed_percent)
 
-        speed_current_us: int = axis_params['min_speed']
+        # switch the direction outputs
+        for axis in moving_axes:
+            self.board.stepper_dir_pins[axis.value].value = not (delta_step[axis.value] > 0)
 
         # wait before start
         time.sleep(wait_time)
 
-        # move by the specified number of steps
-        for i in range(abs(delta_step)):
-            # break condition
-            if not self.running: return True
-            # deceleration
-            if (abs(delta_step) - i) <= axis_params['decc_ramp']:
-                speed_current_us = round(
-                    axis_params['min_speed'] - (axis_params['min_speed'] - axis_params['max_speed']) * (abs(delta_step) - i) / axis_params['decc_ramp'])
-                # if the target speed is greater (lower in value) than the calculated speed --> use target speed
-                if speed_current_us < speed_target_us:
-                    speed_current_us = speed_target_us
-
-            # acceleration
-            if i <= axis_params['acc_ramp']:
-                speed_current_us = round(axis_params['min_speed'] - (axis_params['min_speed'] - axis_params['max_speed']) * i / axis_params['acc_ramp'])
-                # if the target speed is greater (lower in value) than the calculated speed --> use target speed
-                if speed_current_us < speed_target_us:
-                    speed_current_us = speed_target_us
-
-            # switch the step pin
-            self.board.stepper_step_pins[axis.value].value = True
-            time.sleep(speed_current_us / 1000000.0)
-            self.board.stepper_step_pins[axis.value].value = False
-            time.sleep(speed_current_us / 1000000.0)
-
-            self.pos_current_step.increment(axis, 1 if direction else -1)
+        self.pulse_executor.execute(schedule, self.pos_current_step.pos, lambda: self.running)
         return True
 
-    # Move to absolute position in mm, speed in % of maximum speed
-    def go_to_pos_mm(self, axis: Axis, pos_target_axis_mm: float, speed_percent: float, wait_time: float = 0.0) -> bool:
-        axis_params: dict[str, int] = get_axis_params(axis)
-        pos_target_axis_step: int = round(pos_target_axis_mm * axis_params['steps_per_mm'])
-        return self.go_to_pos_step(axis, pos_target_axis_step, speed_percent, wait_time)
+    # Move to absolute position in mm in more axes at once, None keeps the axis at its current position
+    def go_to_pos_mm_xyz(self, pos_target_mm: [float | None, float | None, float | None], speed_percent: float, wait_time: float = 0.0) -> bool:
+        pos_target_step: [int | None, int | None, int | None] = [
+            None if pos_target_mm[axis.value] is None else round(pos_target_mm[axis.value] * get_axis_params(axis)['steps_per_mm'])
+            for axis in Axis]
+        return self.go_to_pos_step_xyz(pos_target_step, speed_percent, wait_time)
+
+    # Execute a planned trajectory (see MotionPlanner), consecutive segments are blended at their junction speeds
+    # NOTE: all schedules are compiled before the first pulse, so the segments follow each other without any gap
+    def execute_segments(self, segments: List[MotionSegment], speed_percent: float) -> bool:
+        if speed_percent <= 0:
+            return False
+        if len(segments) and list(self.pos_current_step.pos) != segments[0].start_step:
+            raise ValueError(f"Trajectory starts at {segments[0].start_step}, current position is {self.pos_current_step}")
+        schedules: List[PulseSchedule] = [PulseSchedule.compile(segment.delta_step, speed_percent, segment.entry_us, segment.exit_us) for segment in segments]
+
+        for segment, schedule in zip(segments, schedules):
+            for axis in segment.moving_axes:
+                self.board.stepper_dir_pins[axis.value].value = not (segment.delta_step[axis.value] > 0)
+            if not self.pulse_executor.execute(schedule, self.pos_current_step.pos, lambda: self.running):
+                return False
+            time.sleep(segment.dwell_s)
+        return True
 
     def move(self, axis: Axis, step_mm: float, speed_percent: float) -> bool:
         axis_params: dict[str, int] = get_axis_params(axis)
@@ -148,8 +121,7 @@ class StepperDriver:
     def go_home(self, speed_percent: float) -> bool:
         if self.pos_current_step.is_home():
             return True
-        return (self.go_to_pos_step(Axis.X, 0, speed_percent) and
-                self.go_to_pos_step(Axis.Y, 0, speed_percent) and
+        return (self.go_to_pos_step_xyz([0, 0, None], speed_percent) and
                 self.go_to_pos_step(Axis.Z, 0, speed_percent))
 
 def test():
@@ -169,6 +141,30 @@ def test():
     # stepper_driver.go(Axis.X, 50, 100)
 
 
+def benchmark_step_rate():
+    # compare the achieved step rate with the commanded one (ramp delays only, no Python overhead) for every pulse executor
+    # NOTE: prints a table, not a test (python -m app.cnc_programmer.stepper.stepper_driver)
+    board = RPiBoard()
+
+    print("{:>10}\t{:>6}\t{:>8}\t{:>14}\t{:>14}\t{:>8}".format('Executor', 'Axis', 'Steps', 'Commanded [1/s]', 'Achieved [1/s]', 'Ratio'))
+    for executor_name in ("sleep", "software", "pigpio"):
+        stepper_driver = StepperDriver(board, create_pulse_executor(board, executor_name))
+        stepper_driver.running = True
+        for axis in Axis:
+            for speed_percent in (50, 100):
+                n_steps: int = 4 * get_axis_params(axis)['steps_per_mm']
+                commanded_s: float = get_ramp_table((axis,), speed_percent, n_steps).duration_s(n_steps)
+
+                start: float = time.perf_counter()
+                stepper_driver.move(axis, n_steps / get_axis_params(axis)['steps_per_mm'], speed_percent)
+                achieved_s: float = time.perf_counter() - start
+                stepper_driver.move(axis, -n_steps / get_axis_params(axis)['steps_per_mm'], speed_percent)
+
+                print("{:>10}\t{:>6}\t{:>8}\t{:>14.0f}\t{:>14.0f}\t{:>8.2f}".format(
+                    type(stepper_driver.pulse_executor).__name__.replace("PulseExecutor", ""), f"{axis.name} {speed_percent}%",
+                    n_steps, n_steps / commanded_s, n_steps / achieved_s, commanded_s / achieved_s))
+
+
 def test2():
     print("TEst2")
     board = RPiBoard()
@@ -213,4 +209,4 @@ def test_on_keyboard_input():
 
 
 if __name__ == "__main__":
-    test_on_keyboard_input()
+    benchmark_step_rate()
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import os
+import unittest
+from typing import Iterator, List, Tuple
+
+from app.cnc_programmer.stepper.axis_params import RampProfile, get_axis_params
+from app.cnc_programmer.stepper.position import Axis
+from app.cnc_programmer.stepper.ramp import RampTable, get_distance_class, get_ramp_table
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def dda_step_masks(abs_delta_steps: [int, int, int]) -> Iterator[int]:
+    # Bresenham / DDA interleaving: the axis with the most steps (major axis) steps on every tick,
+    # the other axes step when their accumulated error overflows,
+    # each yielded value is a bit mask of the axes to step in the tick (bit index = Axis.value)
+    n_ticks: int = max(abs_delta_steps)
+    errors: List[int] = [n_ticks // 2] * len(abs_delta_steps)
+    for _ in range(n_ticks):
+        mask: int = 0
+        for axis_index, delta in enumerate(abs_delta_steps):
+            errors[axis_index] -= delta
+            if errors[axis_index] < 0:
+                errors[axis_index] += n_ticks
+                mask |= 1 << axis_index
+        yield mask
+
+
+def estimate_move_duration_s(axes: Tuple[Axis, ...], n_ticks: int, speed_percent: float, wait_time: float = 0.0) -> float:
+    if n_ticks == 0:
+        return wait_time
+    return wait_time + get_ramp_table(axes, speed_percent, n_ticks).duration_s(n_ticks)
+
+
+def estimate_plate_travel_time_s(plate_config: "PlateConfig", z_moving_height_mm: float, speed_percent: float, coordinated: bool) -> float:
+    steps_per_mm: List[int] = [get_axis_params(axis)['steps_per_mm'] for axis in Axis]
+    z_ticks: int = round(z_moving_height_mm * steps_per_mm[Axis.Z.value])
+    pos_current_step: [int, int] = [0, 0]
+    duration_s: float = 0.0
+
+    for column, row in plate_config.generate_position_sequence(0, 0):
+        pos_target_mm: [float, float] = plate_config.get_position_mm(column, row)
+        delta_x: int = abs(round(pos_target_mm[0] * steps_per_mm[Axis.X.value]) - pos_current_step[0])
+        delta_y: int = abs(round(pos_target_mm[1] * steps_per_mm[Axis.Y.value]) - pos_current_step[1])
+        if coordinated:
+            duration_s += estimate_move_duration_s((Axis.X, Axis.Y), max(delta_x, delta_y), speed_percent, 0.0)
+        else:
+            duration_s += estimate_move_duration_s((Axis.X,), delta_x, speed_percent, 0.0)
+            duration_s += estimate_move_duration_s((Axis.Y,), delta_y, speed_percent, 0.25)
+        # Z down and Z up (the same for both strategies)
+        duration_s += estimate_move_duration_s((Axis.Z,), z_ticks, speed_percent, 0.25)
+        duration_s += estimate_move_duration_s((Axis.Z,), z_ticks, speed_percent, 0.0)
+        pos_current_step = [round(pos_target_mm[0] * steps_per_mm[Axis.X.value]), round(pos_target_mm[1] * steps_per_mm[Axis.Y.value])]
+
+    return duration_s
+
+
+class TestTrajectory(unittest.TestCase):
+
+    def test_dda_step_counts(self):
+        masks = list(dda_step_masks([7596, 5760, 0]))
+        self.assertEqual(len(masks), 7596, "Major axis should step on every tick")
+        self.assertEqual(sum(1 for mask in masks if mask & 0b001), 7596)
+        self.assertEqual(sum(1 for mask in masks if mask & 0b010), 5760)
+        self.assertEqual(sum(1 for mask in masks if mask & 0b100), 0)
+
+
+def benchmark_plate_cycle_time():
+    from app.cnc_programmer.config.config_parser import CNCProgrammerConfigParser
+
+    config = CNCProgrammerConfigParser(f"{ROOT_DIR}/../resources/config_cnc_programmer.conf").parse_config()
+    for plate_config in config.plate_configs.values():
+        sequential_s = estimate_plate_travel_time_s(plate_config, config.z_moving_height_mm, 100, coordinated=False)
+        coordinated_s = estimate_plate_travel_time_s(plate_config, config.z_moving_height_mm, 100, coordinated=True)
+        positions = plate_config.columns * plate_config.rows
+        print(f"Plate {plate_config.name} ({positions} positions)")
+        print(f"  sequential X, Y moves:  {sequential_s:.2f} s ({sequential_s / positions:.3f} s per position)")
+        print(f"  coordinated XY moves:   {coordinated_s:.2f} s ({coordinated_s / positions:.3f} s per position)")
+        print(f"  saved:                  {sequential_s - coordinated_s:.2f} s ({100 * (1 - coordinated_s / sequential_s):.1f} %)")
+
+
+def benchmark_ramp_profile_comparison():
+    # move duration of the plate spacings for both ramp profiles, simulated from the ramp tables
+    # the last setting is a candidate for the S-curve: faster cruise and shorter ramps while the peak acceleration
+    # stays below the one of the current trapezoid (to be verified on the machine before it is used in the config file)
+    from app.cnc_programmer.config.config_parser import CNCProgrammerConfigParser
+
+    config = CNCProgrammerConfigParser(f"{ROOT_DIR}/../resources/config_cnc_programmer.conf").parse_config()
+    plate_config = list(config.plate_configs.values())[0]
+    settings: List[Tuple[str, dict]] = [
+        ("trapezoid", {'profile': RampProfile.TRAPEZOID}),
+        ("s_curve", {'profile': RampProfile.S_CURVE}),
+        ("s_curve, max 90 us, ramps 300", {'profile': RampProfile.S_CURVE, 'max_speed': 90, 'acc_ramp': 300, 'decc_ramp': 300}),
+    ]
+
+    print("{:>32}\t{:>6}\t{:>10}\t{:>12}\t{:>20}".format('Profile', 'Axis', 'Move [mm]', 'Duration [s]', 'Max acc [steps/s^2]'))
+    for axis, move_mm in ((Axis.X, plate_config.x_spacing), (Axis.Y, plate_config.y_spacing)):
+        for name, overrides in settings:
+            axis_params: dict = dict(get_axis_params(axis), **overrides)
+            n_steps: int = round(move_mm * axis_params['steps_per_mm'])
+            delays_us: List[int] = list(RampTable(axis_params, 100, get_distance_class(axis_params, n_steps)).delays_us(n_steps))
+            # acceleration over a window of pulses (step rate change over the window duration),
+            # the window smooths out the rounding of the delays to whole microseconds
+            window: int = 20
+            rates: List[float] = [1000000 / (2 * delay_us) for delay_us in delays_us]
+            max_acceleration: float = max(abs(rates[i + window] - rates[i]) / (2 * sum(delays_us[i:i + window]) / 1000000.0)
+                                          for i in range(len(rates) - window))
+            print("{:>32}\t{:>6}\t{:>10.2f}\t{:>12.3f}\t{:>20.0f}".format(name, axis.name, move_mm, 2 * sum(delays_us) / 1000000.0, max_acceleration))
+
+
+if __name__ == "__main__":
+    benchmark_plate_cycle_time()
+    benchmark_ramp_profile_comparison()
@@ -1,50 +1,144 @@
 import logging
+import math
 import time
+import unittest
 
-from app.cnc_programmer.cnc_programmer_adc import CNCProgrammerADC
+import numpy as np
+
+from app.cnc_programmer.cnc_programmer_adc import CNCProgrammerADC, DPSMeasurement, Quantity
 from app.cnc_programmer.config.firmware import FirmwareConfig
 from app.cnc_programmer.dps_log import DPSLog
 from app.cnc_programmer.dps_mode import DPSMode, DPSFlashMode, DPSMaxOnlyMode, FirmwareType
 from app.cnc_programmer.rpi_board import RPiBoard
+from lib.adc import GAIN, ADCStream, SquareWave, analyze_square_wave, student_t_cdf
+from lib.tracing import tracer
 
 
 class Tester:
+    # the ACS723 offset (output at zero LED current) is calibrated once per plate while the DPS is powered off,
+    # then only when it gets old (drift check), see CNCRunner.cycle
+    LED_CURRENT_OFFSET_MAX_AGE_S: float = 120.0
+    LED_CURRENT_OFFSET_DRIFT_WARNING_MV: float = 5.0
+    # quantities measured in one pass in the mode with the button LED and feedback resistor checks
+    DPS_QUANTITIES: (Quantity, ...) = (Quantity.BUTTON_LED_VOLTAGE, Quantity.R_FEEDBACK_VOLTAGE, Quantity.LED_CURRENT_ON_ACS723)
+    # settle detection on the streamed ACS723 output: the trend of the last 100 ms (at 860 SPS) drifts less than 2 mV (5 mA)
+    # and the samples are spread less than 5 mV around it, not earlier than the response time of the DPS firmware
+    SETTLE_WINDOW_SAMPLES: int = 86
+    SETTLE_MAX_DRIFT_MV: float = 2.0
+    SETTLE_MAX_STD_MV: float = 5.0
+    SETTLE_MIN_TIME_S: float = 0.02
+    # the LED current must have moved away from its level before the power on / mode change by 10 mV (25 mA),
+    # otherwise the level before the transition (the firmware did not react yet) would be reported as settled
+    SETTLE_MIN_CHANGE_MV: float = 10.0
+    # samples dropped before the blinking capture (response of the DPS firmware and the LED current to the mode change)
+    BLINKING_CAPTURE_DELAY_S: float = 0.05
 
     def __init__(self, board: RPiBoard) -> None:
         self.board: RPiBoard = board
         self.adc: CNCProgrammerADC = CNCProgrammerADC(board)
 
         self.dps_under_test_mode: DPSMode = None
+        self.adc_stream: ADCStream | None = None if self.adc.adc is None else ADCStream(self.adc)
+        # test --> confidence of its pass/fail decision (see _check_in_range_with_confidence), samples taken, of the DPS under test
+        self.confidences: dict[str, float] = {}
+        self.samples: int = 0
 
+        # time.monotonic() of the last offset calibration, None --> not calibrated (for this plate)
+        self._led_current_offset_calibrated_at: float | None = None
+        # change of the offset found by the last calibration
+        self._led_current_offset_drift_mV: float | None = None
 
-    def prepare_dps(self) -> None:
-        # set offset of ADC for ACS723 (inactivate ISCP pins to do so)
+    @property
+    def led_current_offset_mV(self) -> float:
+        return self.adc.acs723_voltage_offset_mV
+
+    @property
+    def led_current_offset_age_s(self) -> float | None:
+        if self._led_current_offset_calibrated_at is None:
+            return None
+        return time.monotonic() - self._led_current_offset_calibrated_at
+
+    @property
+    def led_current_offset_drift_mV(self) -> float | None:
+        return self._led_current_offset_drift_mV
+
+    def invalidate_LED_current_offset(self) -> None:
+        self._led_current_offset_calibrated_at = None
+
+    def is_LED_current_offset_calibration_due(self) -> bool:
+        age_s: float | None = self.led_current_offset_age_s
+        return age_s is None or age_s > Tester.LED_CURRENT_OFFSET_MAX_AGE_S
+
+    def calibrate_LED_current_offset(self) -> None:
+        # NOTE: the DPS must be powered off (no LED current), ISCP pins are inactivated to do so,
+        #       may run in another thread while the head moves (the ADC is not used by the runner meanwhile)
+        previous_offset_mV: float | None = None if self._led_current_offset_calibrated_at is None else self.adc.acs723_voltage_offset_mV
         self.board.inactivate_ISCP_pins()
         self.set_LED_current_offset()
+        self._led_current_offset_calibrated_at = time.monotonic()
+        if previous_offset_mV is not None:
+            self._led_current_offset_drift_mV = self.adc.acs723_voltage_offset_mV - previous_offset_mV
+            if abs(self._led_current_offset_drift_mV) > Tester.LED_CURRENT_OFFSET_DRIFT_WARNING_MV:
+                logging.warning(f"ADC ACS723 voltage offset drifted by {self._led_current_offset_drift_mV:.1f} mV")
+
+    def prepare_dps(self) -> None:
+        # the offset is calibrated ahead by the runner, here only when it is missing or too old
+        if self.is_LED_current_offset_calibration_due():
+            self.calibrate_LED_current_offset()
+        else:
+            self.board.inactivate_ISCP_pins()
         # turn on power supply of DPS
         self.board.dps_activate()
 
 
+    def _start_dps_test(self) -> None:
+        self.confidences = {}
+        self.samples = 0
+
+    def _log_confidence(self, dps_log: DPSLog) -> None:
+        confidences: [float] = [confidence for confidence in self.confidences.values() if confidence is not None]
+        dps_log.test_confidence = min(confidences) if confidences else None
+        dps_log.adc_samples = self.samples
+
+    def measure_dps(self, config: FirmwareConfig, firmware_type: FirmwareType, quantities: (Quantity, ...) = DPS_QUANTITIES) -> DPSMeasurement | None:
+        # the quantities in one pass, with the limits of the mode under test for the sequential sampling
+        limits: dict[Quantity, (int, int)] = {Quantity.BUTTON_LED_VOLTAGE: config.button_led_voltage, Quantity.R_FEEDBACK_VOLTAGE: config.r_feedback_voltage}
+        if Quantity.LED_CURRENT_ON_ACS723 in quantities:
+            limits[Quantity.LED_CURRENT_ON_ACS723] = self._get_allowed_led_current_range(config, firmware_type, self.dps_under_test_mode)
+        measurement: DPSMeasurement | None = self.adc.measure_all(*quantities, limits=limits)
+        if measurement is not None:
+            self.samples += measurement.samples
+        return measurement
+
+    @tracer.traced("tester")
     def test_dps_flash(self, config: FirmwareConfig, dps_log: DPSLog) -> None:
+        self._start_dps_test()
         self.dps_under_test_mode = DPSFlashMode.STRONG
-        # wait until stable
-        time.sleep(0.5)
-        # measure button LED voltage (in the strong lighting mode)
-        button_led_voltage_passed, button_led_voltage = self.test_button_LED_voltage(config)
-        # measure r_feedback voltage (in the strong lighting mode)
-        r_feedback_voltage_passed, r_feedback_voltage = self.test_r_feedback_voltage(config)
-        # measure current in the strong lighting mode
-        led_current_strong_mode_passed, led_current_strong_mode = self.test_LED_current(config, FirmwareType.FLASH, self.dps_under_test_mode)
+        # wait until stable (the LED was off before the power on)
+        settle_time_mode1: float = self.wait_until_stable(config, baseline_mV=self.adc.acs723_voltage_offset_mV)
+        # measure button LED voltage, r_feedback voltage and current (in the strong lighting mode) in one pass
+        measurement: DPSMeasurement | None = self.measure_dps(config, FirmwareType.FLASH)
+        button_led_voltage_passed, button_led_voltage = self.test_button_LED_voltage(config, measurement)
+        r_feedback_voltage_passed, r_feedback_voltage = self.test_r_feedback_voltage(config, measurement)
+        led_current_strong_mode_passed, led_current_strong_mode = self.test_LED_current(config, FirmwareType.FLASH, self.dps_under_test_mode, measurement)
         # increase the lighting mode
         self.increase_dps_under_test_mode(config)
-        # wait until stable
-        time.sleep(0.5)
+        # wait until stable (away from the current of the strong mode)
+        settle_time_mode2: float = self.wait_until_stable(config, baseline_mV=measurement and measurement.acs723_voltage_mV)
         # measure current in the low lighting mode
-        led_current_light_mode_passed, led_current_light_mode = self.test_LED_current(config, FirmwareType.FLASH, self.dps_under_test_mode)
+        measurement = self.measure_dps(config, FirmwareType.FLASH, (Quantity.LED_CURRENT_ON_ACS723,))
+        led_current_light_mode_passed, led_current_light_mode = self.test_LED_current(config, FirmwareType.FLASH, self.dps_under_test_mode, measurement)
+        # increase to the blinking mode and capture it (when specified)
+        if config.is_blinking_tested:
+            self.increase_dps_under_test_mode(config)
+            self.test_blinking(config, dps_log)
         # turn off DPS power supply
         self.board.dps_inactivate()
 
         # set DPS log
+        dps_log.settle_time_mode1 = settle_time_mode1
+        dps_log.settle_time_mode2 = settle_time_mode2
+        self._log_confidence(dps_log)
         dps_log.led_current_mode1_passed = led_current_strong_mode_passed
         dps_log.led_current_mode1 = led_current_strong_mode
         dps_log.led_current_mode2_passed = led_current_light_mode_passed
@@ -54,24 +148,27 @@ class Tester:
         dps_log.r_feedback_voltage_passed = r_feedback_voltage_passed
         dps_log.r_feedback_voltage = r_feedback_voltage
 
+    @tracer.traced("tester")
     def test_dps_maxonly(self, config: FirmwareConfig, dps_log: DPSLog) -> None:
+        self._start_dps_test()
         self.dps_under_test_mode = DPSMaxOnlyMode.NO
-        # wait until stable
-        time.sleep(0.5)
+        # wait until stable (the LED is off, the button LED shows the DPS is running)
+        self.wait_until_stable(config, self.adc.channel_button_led, GAIN.GAIN_23.value)
         # increase the lighting mode
         self.increase_dps_under_test_mode(config)
-        # wait until stable
-        time.sleep(0.5)
-        # measure button LED voltage
-        button_led_voltage_passed, button_led_voltage = self.test_button_LED_voltage(config)
-        # measure r_feedback voltage
-        r_feedback_voltage_passed, r_feedback_voltage = self.test_r_feedback_voltage(config)
-        # measure current in the low lighting mode
-        led_current_strong_mode_passed, led_current_strong_mode = self.test_LED_current(config, FirmwareType.MAX_ONLY, self.dps_under_test_mode)
+        # wait until stable (the LED was off)
+        settle_time_mode1: float = self.wait_until_stable(config, baseline_mV=self.adc.acs723_voltage_offset_mV)
+        # measure button LED voltage, r_feedback voltage and current in one pass
+        measurement: DPSMeasurement | None = self.measure_dps(config, FirmwareType.MAX_ONLY)
+        button_led_voltage_passed, button_led_voltage = self.test_button_LED_voltage(config, measurement)
+        r_feedback_voltage_passed, r_feedback_voltage = self.test_r_feedback_voltage(config, measurement)
+        led_current_strong_mode_passed, led_current_strong_mode = self.test_LED_current(config, FirmwareType.MAX_ONLY, self.dps_under_test_mode, measurement)
         # turn off DPS power supply
         self.board.dps_inactivate()
 
         # set DPS log
+        dps_log.settle_time_mode1 = settle_time_mode1
+        self._log_confidence(dps_log)
         dps_log.led_current_mode1_passed = led_current_strong_mode_passed
         dps_log.led_current_mode1 = led_current_strong_mode
         dps_log.button_led_voltage_passed = button_led_voltage_passed
@@ -79,33 +176,84 @@ class Tester:
         dps_log.r_feedback_voltage_passed = r_feedback_voltage_passed
         dps_log.r_feedback_voltage = r_feedback_voltage
 
+    @tracer.traced("tester")
+    def test_blinking(self, config: FirmwareConfig, dps_log: DPSLog) -> bool:
+        # frequency, duty cycle and on/off LED current of a burst of the ACS723 samples
+        wave: SquareWave | None = None
+        if self.adc_stream is not None:
+            with self.adc_stream:
+                timestamps, voltages = self.adc_stream.capture(self.adc.channel_acs723_D, GAIN.GAIN_8.value, config.blinking_capture_duration / 1000,
+                                                               Tester.BLINKING_CAPTURE_DELAY_S)
+            led_currents: np.ndarray = (voltages * 1000 - self.adc.acs723_voltage_offset_mV) * CNCProgrammerADC.ACS723_VOLTAGE_TO_CURRENT_RATIO
+            wave = analyze_square_wave(timestamps, led_currents)
+        if wave is None:
+            # not blinking (or no ADC)
+            dps_log.blinking_frequency = 0.0
+            dps_log.blinking_passed = False
+            return False
+        dps_log.blinking_frequency = wave.frequency_Hz
+        dps_log.blinking_duty_cycle = wave.duty_cycle * 100
+        dps_log.blinking_on_current = wave.high_level
+        dps_log.blinking_off_current = wave.low_level
+        dps_log.blinking_passed = (self._check_in_range(dps_log.blinking_frequency, config.blinking_frequency) and
+                                   (config.blinking_duty_cycle is None or self._check_in_range(dps_log.blinking_duty_cycle, config.blinking_duty_cycle)) and
+                                   (config.blinking_on_current is None or self._check_in_range(dps_log.blinking_on_current, config.blinking_on_current)) and
+                                   (config.blinking_off_current is None or self._check_in_range(dps_log.blinking_off_current, config.blinking_off_current)))
+        logging.info(f"Measured blinking: {wave.frequency_Hz:.2f} Hz, duty cycle {wave.duty_cycle * 100:.1f} %, "
+                     f"{wave.high_level:.0f}/{wave.low_level:.0f} mA, test passed: {dps_log.blinking_passed}")
+        return dps_log.blinking_passed
 
+    @tracer.traced("tester", "settle")
+    def wait_until_stable(self, config: FirmwareConfig, channel=None, gain: float = GAIN.GAIN_8.value, baseline_mV: float | None = None) -> float:
+        # streams the channel (the ACS723 output by default) until it settles, at most config.settle_timeout,
+        # baseline_mV: level of the channel before the transition, the settled level has to differ (see SETTLE_MIN_CHANGE_MV),
+        # returns the settle time [s] (the timeout when the signal did not settle)
+        timeout_s: float = config.settle_timeout / 1000
+        if self.adc_stream is None:
+            time.sleep(timeout_s)
+            return timeout_s
+        with self.adc_stream:
+            stable, settle_time_s = self.adc_stream.wait_until_stable(
+                self.adc.channel_acs723_D if channel is None else channel, gain, Tester.SETTLE_WINDOW_SAMPLES,
+                Tester.SETTLE_MAX_DRIFT_MV / 1000, Tester.SETTLE_MAX_STD_MV / 1000, timeout_s, Tester.SETTLE_MIN_TIME_S,
+                None if baseline_mV is None else baseline_mV / 1000, Tester.SETTLE_MIN_CHANGE_MV / 1000)
+        if not stable:
+            logging.warning(f"Signal not settled in {timeout_s} s")
+        return settle_time_s
 
+
+    @tracer.traced("tester")
     def increase_dps_under_test_mode(self, config: FirmwareConfig) -> None:
         self.dps_under_test_mode = self.dps_under_test_mode.__class__.increase_mode(self.dps_under_test_mode)
         self.board.dps_button_hold(config.button_led_mode_change_duration / 1000)
 
 
+    @tracer.traced("tester")
     def set_LED_current_offset(self) -> None:
         voltage_offset: float = self.adc.measure_voltage_on_acs723_mV()
         logging.info(f"ADC ACS723 voltage offset set to {voltage_offset} mV")
         self.adc.acs723_voltage_offset_mV = voltage_offset
 
-    def test_LED_current(self, config: FirmwareConfig, firmware_type: FirmwareType, mode: DPSMode) -> (bool, float):
-        led_current: float = self.adc.measure_led_current_on_acs723_mA()
-        test_passed: bool = self._check_in_range(led_current, self._get_allowed_led_current_range(config, firmware_type, mode))
+    # measurement: values measured ahead (Tester.DPS_QUANTITIES), measured by the test when None
+
+    def test_LED_current(self, config: FirmwareConfig, firmware_type: FirmwareType, mode: DPSMode, measurement: DPSMeasurement | None = None) -> (bool, float):
+        led_current: float = self.adc.measure_led_current_on_acs723_mA() if measurement is None else measurement.led_current_on_acs723_mA
+        test_passed, self.confidences[f"led_current_{mode.value}"] = self._check_in_range_with_confidence(
+            led_current, self._get_allowed_led_current_range(config, firmware_type, mode), *self._uncertainty(measurement, Quantity.LED_CURRENT_ON_ACS723))
         logging.info(f"Measured LED current in mode: {mode.value}, current {led_current} mA, test passed: {test_passed}")
         return test_passed, led_current
 
-    def test_button_LED_voltage(self, config: FirmwareConfig) -> (bool, float):
-        button_led_voltage = self.adc.measure_voltage_on_button_led_mV()
-        test_passed: bool = self._check_in_range(button_led_voltage, config.button_led_voltage)
-        return True, test_passed, button_led_voltage
+    def test_button_LED_voltage(self, config: FirmwareConfig, measurement: DPSMeasurement | None = None) -> (bool, float):
+        button_led_voltage = self.adc.measure_voltage_on_button_led_mV() if measurement is None else measurement.button_led_voltage_mV
+        test_passed, self.confidences["button_led_voltage"] = self._check_in_range_with_confidence(
+            button_led_voltage, config.button_led_voltage, *self._uncertainty(measurement, Quantity.BUTTON_LED_VOLTAGE))
+        return test_passed, button_led_voltage
 
-    def test_r_feedback_voltage(self, config: FirmwareConfig) -> (bool, float):
-        r_feedback_voltage = self.adc.measure_voltage_on_feedback_resistor_mV()
-        test_passed: bool = self._check_in_range(r_feedback_voltage, config.r_feedback_voltage)
-        return True, test_passed, r_feedback_voltage
+    def test_r_feedback_voltage(self, config: FirmwareConfig, measurement: DPSMeasurement | None = None) -> (bool, float):
+        r_feedback_voltage = self.adc.measure_voltage_on_feedback_resistor_mV() if measurement is None else measurement.r_feedback_voltage_mV
+        test_passed, self.confidences["r_feedback_voltage"] = self._check_in_range_with_confidence(
+            r_feedback_voltage, config.r_feedback_voltage, *self._uncertainty(measurement, Quantity.R_FEEDBACK_VOLTAGE))
+        return test_passed, r_feedback_voltage
 
     def _get_allowed_led_current_range(self, config: FirmwareConfig, firmware_type: FirmwareType, mode: DPSMode):
         if firmware_type == FirmwareType.MAX_ONLY:
@@ -119,4 +267,40 @@ class Tester:
         raise Exception("Blinking mode does not have an allowed range!")
 
     def _check_in_range(self, value: float, allowed_range: (float, float)) -> bool:
-        return allowed_range[0] <= value <= allowed_range[1]
+        return self._check_in_range_with_confidence(value, allowed_range)[0]
+
+    @staticmethod
+    def _uncertainty(measurement: DPSMeasurement | None, quantity: Quantity) -> (float | None, int | None):
+        # standard error of the measured value and the samples it is averaged from, (None, None) when measured by the test
+        if measurement is None:
+            return None, None
+        return measurement.standard_error(quantity), measurement.sample_count(quantity)
+
+    def _check_in_range_with_confidence(self, value: float, allowed_range: (float, float), standard_error: float | None = None,
+                                        samples: int | None = None) -> (bool, float | None):
+        # confidence: probability that the decision is right (the true mean is on the same side of the nearest limit),
+        # Student t with samples - 1 degrees of freedom (normal distribution when the samples are unknown),
+        # None without the standard error of the value (or with a zero one, no spread of the samples to judge from)
+        passed: bool = allowed_range[0] <= value <= allowed_range[1]
+        if standard_error is None or math.isnan(standard_error) or standard_error <= 0:
+            return passed, None
+        distance: float = min(value - allowed_range[0], allowed_range[1] - value) if passed else max(allowed_range[0] - value, value - allowed_range[1])
+        if samples is None or samples < 2:
+            return passed, 0.5 * (1 + math.erf(distance / standard_error / math.sqrt(2)))
+        return passed, student_t_cdf(distance / standard_error, samples - 1)
+
+
+class TestTester(unittest.TestCase):
+
+    def test_confidence(self):
+        tester = Tester.__new__(Tester)
+        # 3 standard errors inside the limits: 0.9987 for the normal distribution, 0.980 for 5 samples (4 degrees of freedom)
+        passed, confidence = tester._check_in_range_with_confidence(10.0, (7.0, 20.0), 1.0, 5)
+        self.assertTrue(passed)
+        self.assertAlmostEqual(confidence, 0.980, delta=0.001)
+        self.assertAlmostEqual(tester._check_in_range_with_confidence(10.0, (7.0, 20.0), 1.0)[1], 0.9987, delta=0.0001)
+        passed, confidence = tester._check_in_range_with_confidence(25.0, (7.0, 20.0), 1.0, 5)
+        self.assertFalse(passed)
+        self.assertGreater(confidence, 0.99)
+        # no spread (noise below the resolution): no confidence instead of a certain decision
+        self.assertEqual(tester._check_in_range_with_confidence(10.0, (7.0, 20.0), 0.0, 5), (True, None))
@@ -1,11 +1,10 @@
 import time
 
-import adafruit_ads1x15.ads1115 as ADS
-from adafruit_ads1x15.analog_in import AnalogIn
 from enum import Enum
 
 from app.final_tester.rpi_board import RPiBoard
 from lib.adc import ADC, GAIN
+from lib.hal import ADS, AnalogIn
 
 
 class FinalTesterADC(ADC):
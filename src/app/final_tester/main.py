@@ -5,6 +5,7 @@ import tkinter as tk
 
 from app.final_tester.gui.gui import create_root_window, GUIView, GUIController
 from app.final_tester.final_tester import FinalTester
+from lib.hal_backend import select_simulated_hal
 
 
 def run():
@@ -31,12 +32,17 @@ def run():
 def main(argv):
     logging.getLogger().setLevel(logging.INFO)
     try:
-        opts, args = getopt.getopt(argv, "hd", ["--help", "debug"])
+        opts, args = getopt.getopt(argv, "hd", ["--help", "debug", "simulated"])
     except getopt.GetoptError:
         sys.exit(2)
 
     for opt, arg in opts:
         if opt in ("-d", "--debug"):
             logging.getLogger().setLevel(logging.DEBUG)
+        elif opt == "--simulated":
+            # NOTE: selected by the entry point (run_*.py) before the hardware modules are imported,
+            #       fails when the real hardware modules were imported already (see lib.hal_backend)
+            select_simulated_hal()
+            logging.info("Running on simulated hardware")
 
     run()
\ No newline at end of file
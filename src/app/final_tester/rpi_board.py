@@ -1,8 +1,6 @@
 import time
 
-import board
-from busio import I2C
-from digitalio import Direction, DigitalInOut, Pull
+from lib.hal import I2C, DigitalInOut, Direction, Pull, board
 
 
 class RPiBoard:
@@ -1,9 +1,14 @@
 import logging
+import math
+import threading
 import time
-
-import adafruit_ads1x15.ads1115 as ADS
-from adafruit_ads1x15.analog_in import AnalogIn
+import unittest
 from enum import Enum
+from typing import Dict, List, NamedTuple, Tuple
+
+import numpy as np
+
+from lib.hal import ADS, AnalogIn, Mode
 
 
 #       GAIN    RANGE (V)
@@ -24,11 +29,178 @@ class GAIN(Enum):
     GAIN_16 = 16
 
 
+# ADS1115: 16 bit signed conversion --> LSB = full scale range of the gain / 2^15
+ADS1115_FULL_SCALE_V: float = 4.096
+
+# two-sided 99 % critical values of the Student t distribution (0.995 quantile) by the degrees of freedom,
+# above the table: the nearest lower entry (conservative), the normal distribution from 120 on
+T_CRITICAL_99: Dict[int, float] = {
+    1: 63.657, 2: 9.925, 3: 5.841, 4: 4.604, 5: 4.032, 6: 3.707, 7: 3.499, 8: 3.355, 9: 3.250, 10: 3.169,
+    11: 3.106, 12: 3.055, 13: 3.012, 14: 2.977, 15: 2.947, 16: 2.921, 17: 2.898, 18: 2.878, 19: 2.861, 20: 2.845,
+    21: 2.831, 22: 2.819, 23: 2.807, 24: 2.797, 25: 2.787, 26: 2.779, 27: 2.771, 28: 2.763, 29: 2.756, 30: 2.750,
+    40: 2.704, 60: 2.660, 120: 2.617,
+}
+Z_CRITICAL_99: float = 2.576
+
+
+def lsb_V(gain: float) -> float:
+    return ADS1115_FULL_SCALE_V / gain / 32768
+
+
+def t_critical_99(df: int) -> float:
+    if df >= 120:
+        return Z_CRITICAL_99
+    return T_CRITICAL_99[max(key for key in T_CRITICAL_99 if key <= df)]
+
+
+def student_t_cdf(t: float, df: int) -> float:
+    # P(T <= t) for df >= 1 degrees of freedom (closed form of Abramowitz & Stegun 26.7.3 and 26.7.4)
+    theta: float = math.atan2(t, math.sqrt(df))
+    cos2: float = math.cos(theta) ** 2
+    term: float = 1.0
+    total: float = 1.0
+    if df % 2:
+        for k in range(1, (df - 1) // 2):
+            term *= cos2 * 2 * k / (2 * k + 1)
+            total += term
+        a: float = 2 / math.pi * (theta + (math.sin(theta) * math.cos(theta) * total if df > 1 else 0.0))
+    else:
+        for k in range(1, df // 2):
+            term *= cos2 * (2 * k - 1) / (2 * k)
+            total += term
+        a: float = math.sin(theta) * total
+    return 0.5 * (1 + a)
+
+
+class SequentialTest:
+    # Sequential test of the mean against the limits [V]: sampling stops as soon as the 99 % confidence interval
+    # of the mean (Student t, n - 1 degrees of freedom) clears the limits by the margin (a fraction of the width of the limits),
+    # inside or outside, but not before min_samples (at least MIN_SAMPLES) and not after max_samples,
+    # lsb: resolution of the readings [V], the standard error never drops below the quantization noise (see standard_error)
+
+    MIN_SAMPLES: int = 5
+
+    def __init__(self, limits: Tuple[float, float], min_samples: int, max_samples: int, lsb: float = 0.0, margin_ratio: float = 0.02) -> None:
+        self.limits: Tuple[float, float] = (min(limits), max(limits))
+        self.min_samples: int = max(SequentialTest.MIN_SAMPLES, min_samples)
+        self.max_samples: int = max(self.min_samples, max_samples)
+        self.lsb: float = lsb
+        self.margin: float = margin_ratio * (self.limits[1] - self.limits[0])
+
+    def is_decided(self, values: List[float]) -> bool:
+        if len(values) < self.min_samples:
+            return False
+        if len(values) >= self.max_samples:
+            return True
+        mean: float = float(np.mean(values))
+        half_width: float = t_critical_99(len(values) - 1) * standard_error(values, self.lsb)
+        lsl, usl = self.limits
+        inside: bool = lsl + self.margin <= mean - half_width and mean + half_width <= usl - self.margin
+        outside: bool = mean + half_width <= lsl - self.margin or usl + self.margin <= mean - half_width
+        return inside or outside
+
+
+def standard_error(values: List[float] | np.ndarray, lsb: float = 0.0) -> float:
+    # standard error of the mean, NaN for less than 2 values,
+    # not below the quantization noise LSB / sqrt(12) (averaging does not remove it when the noise is below the LSB)
+    if len(values) < 2:
+        return float("nan")
+    return max(float(np.std(values, ddof=1) / np.sqrt(len(values))), lsb / math.sqrt(12))
+
+
+class Reading(NamedTuple):
+    name: str
+    channel: AnalogIn
+    gain: float
+    samples: int
+    # sampling stops early when decided (samples is ignored then)
+    test: SequentialTest | None = None
+
+
+class MeasurementPlan:
+    # Readings of one test step executed in one pass by ADC.execute_plan:
+    # the readings are grouped by the gain and the inputs (channel), the same reading is taken only once,
+    # the gain is switched (and settled) once per gain
+
+    def __init__(self) -> None:
+        self._readings: List[Reading] = []
+
+    @property
+    def readings(self) -> List[Reading]:
+        return self._readings
+
+    def add(self, name: str, channel: AnalogIn, gain: float, samples: int, test: SequentialTest | None = None) -> "MeasurementPlan":
+        self._readings.append(Reading(name, channel, gain, samples, test))
+        return self
+
+    def schedule(self, current_gain: float | None = None) -> List[Tuple[float, AnalogIn, int, List[str], SequentialTest | None]]:
+        # (gain, channel, samples, names of the readings, sequential test), the readings at the current gain of the ADC first,
+        # then the gains in the order of the plan, readings with a sequential test are not shared
+        groups: Dict[Tuple[float, int, int], List] = {}
+        for reading in self._readings:
+            key: Tuple[float, int, int] = (reading.gain, id(reading.channel), id(reading.test) if reading.test else 0)
+            group: List | None = groups.get(key)
+            if group is None:
+                groups[key] = [reading.gain, reading.channel, reading.samples, [reading.name], reading.test]
+            else:
+                group[2] = max(group[2], reading.samples)
+                group[3].append(reading.name)
+        gains: List[float] = list(dict.fromkeys(reading.gain for reading in self._readings))
+        if current_gain in gains:
+            gains.remove(current_gain)
+            gains.insert(0, current_gain)
+        return [tuple(group) for gain in gains for group in groups.values() if group[0] == gain]
+
+
+class MeasurementResult:
+
+    def __init__(self, voltages: Dict[str, float], gain_switches: int = 0, duration_s: float = 0.0,
+                 standard_errors: Dict[str, float] | None = None, samples: Dict[str, int] | None = None) -> None:
+        # name of the reading --> average voltage [V], its standard error [V] and the number of samples
+        self._voltages: Dict[str, float] = voltages
+        self._standard_errors: Dict[str, float] = {} if standard_errors is None else standard_errors
+        self._samples: Dict[str, int] = {} if samples is None else samples
+        self._gain_switches: int = gain_switches
+        self._duration_s: float = duration_s
+
+    @property
+    def voltages(self) -> Dict[str, float]:
+        return self._voltages
+
+    @property
+    def standard_errors(self) -> Dict[str, float]:
+        return self._standard_errors
+
+    @property
+    def samples(self) -> Dict[str, int]:
+        return self._samples
+
+    @property
+    def gain_switches(self) -> int:
+        return self._gain_switches
+
+    @property
+    def duration_s(self) -> float:
+        return self._duration_s
+
+    def __getitem__(self, name: str) -> float:
+        return self._voltages[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._voltages
+
+
 class ADC:
-    def __init__(self, board) -> None:
+    SAMPLE_INTERVAL_S: float = 0.01
+    GAIN_SETTLE_S: float = 0.01
+
+    DEFAULT_ADDRESS: int = 0x48
+
+    def __init__(self, board, address: int = DEFAULT_ADDRESS) -> None:
+        # address: I2C address of the ADS1115 (several ADCs on one bus)
         self.board = board
         try:
-            self.adc = ADS.ADS1115(self.board.i2c)
+            self.adc = ADS.ADS1115(self.board.i2c, address=address)
         except ValueError:
             logging.error("ADC initialization failure, I2C cannot read address from ADC")
             self.adc = None
@@ -41,6 +213,457 @@ class ADC:
         total: float = 0
         for i in range(N):
             total += channel.voltage
-            time.sleep(0.01)
+            if i < N - 1:
+                time.sleep(ADC.SAMPLE_INTERVAL_S)
         return total / N
 
+    def sample(self, channel: AnalogIn, samples: int, test: SequentialTest | None = None) -> List[float]:
+        # voltages of the samples, with a sequential test until it is decided (at most test.max_samples)
+        count: int = samples if test is None else test.max_samples
+        voltages: List[float] = []
+        for i in range(count):
+            voltages.append(channel.voltage)
+            if test is not None and test.is_decided(voltages):
+                break
+            if i < count - 1:
+                time.sleep(ADC.SAMPLE_INTERVAL_S)
+        return voltages
+
+    def execute_plan(self, plan: MeasurementPlan) -> MeasurementResult:
+        start: float = time.perf_counter()
+        voltages: Dict[str, float] = {}
+        standard_errors: Dict[str, float] = {}
+        sample_counts: Dict[str, int] = {}
+        gain_switches: int = 0
+        for gain, channel, samples, names, test in plan.schedule(self.adc.gain):
+            if self.adc.gain != gain:
+                self.set_adc_gain(gain)
+                gain_switches += 1
+                time.sleep(ADC.GAIN_SETTLE_S)
+            channel_voltages: List[float] = self.sample(channel, samples, test)
+            for name in names:
+                voltages[name] = float(np.mean(channel_voltages))
+                standard_errors[name] = standard_error(channel_voltages, lsb_V(gain))
+                sample_counts[name] = len(channel_voltages)
+        return MeasurementResult(voltages, gain_switches, time.perf_counter() - start, standard_errors, sample_counts)
+
+
+
+class SampleStats(NamedTuple):
+    mean: float  # [V]
+    std: float  # [V]
+    count: int
+    start: float  # timestamp of the first sample [s, time.perf_counter()]
+    end: float  # timestamp of the last sample
+
+
+def is_signal_stable(timestamps: np.ndarray, values: np.ndarray, max_drift: float, max_std: float) -> bool:
+    # drift: change of the linear fit over the window, std: spread of the samples around the fit
+    duration: float = float(timestamps[-1] - timestamps[0])
+    if len(values) < 3 or duration <= 0:
+        return False
+    slope, intercept = np.polyfit(timestamps - timestamps[0], values, 1)
+    residuals: np.ndarray = values - (slope * (timestamps - timestamps[0]) + intercept)
+    return abs(slope) * duration <= max_drift and float(np.std(residuals)) <= max_std
+
+
+class SquareWave(NamedTuple):
+    frequency_Hz: float
+    duty_cycle: float  # fraction of the period at the high level
+    high_level: float
+    low_level: float
+    periods: int  # whole periods the frequency and duty cycle are measured over
+
+
+def analyze_square_wave(timestamps: np.ndarray, values: np.ndarray) -> SquareWave | None:
+    # levels: medians of the samples above and below the threshold halfway between the 5th and 95th percentiles,
+    # edges: threshold crossings (timestamps interpolated), frequency and duty cycle over the whole periods between
+    # the first and last rising edge, None when the signal has less than two rising edges
+    low, high = np.percentile(values, (5, 95))
+    threshold: float = (low + high) / 2
+    is_high: np.ndarray = values > threshold
+    edges: np.ndarray = np.flatnonzero(np.diff(is_high.astype(np.int8)))
+    if len(edges) == 0:
+        return None
+    # crossing time of every edge, linearly interpolated between the samples around it
+    edge_times: np.ndarray = timestamps[edges] + (threshold - values[edges]) / (values[edges + 1] - values[edges]) * (timestamps[edges + 1] - timestamps[edges])
+    rising: np.ndarray = is_high[edges + 1]
+    rising_times: np.ndarray = edge_times[rising]
+    if len(rising_times) < 2:
+        return None
+    periods: int = len(rising_times) - 1
+    duration: float = float(rising_times[-1] - rising_times[0])
+    falling_times: np.ndarray = edge_times[~rising]
+    falling_times = falling_times[(falling_times > rising_times[0]) & (falling_times < rising_times[-1])]
+    # every whole period: rising edge --> falling edge --> next rising edge
+    high_time: float = float(np.sum(falling_times - rising_times[:len(falling_times)]))
+    return SquareWave(periods / duration, high_time / duration, float(np.median(values[is_high])), float(np.median(values[~is_high])), periods)
+
+
+class SampleRingBuffer:
+    # Timestamps [s, time.perf_counter()] and values of the last `size` samples in NumPy arrays
+
+    def __init__(self, size: int) -> None:
+        self._timestamps: np.ndarray = np.zeros(size)
+        self._values: np.ndarray = np.zeros(size)
+        self._index: int = 0  # next write position
+        self._count: int = 0  # samples written since the last clear
+
+    @property
+    def size(self) -> int:
+        return len(self._values)
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def __len__(self) -> int:
+        return min(self._count, self.size)
+
+    def append(self, timestamp: float, value: float) -> None:
+        self._timestamps[self._index] = timestamp
+        self._values[self._index] = value
+        self._index = (self._index + 1) % self.size
+        self._count += 1
+
+    def last(self, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        # (timestamps, values) of the last n samples (fewer when not available), the oldest first
+        n = min(n, len(self))
+        indices: np.ndarray = np.arange(self._index - n, self._index) % self.size
+        return self._timestamps[indices], self._values[indices]
+
+    def clear(self) -> None:
+        self._index = 0
+        self._count = 0
+
+
+class ADCStream:
+    # ADS1115 in the continuous conversion mode: a background thread reads every conversion of the selected channel
+    # into a ring buffer, statistics of the last N samples are available without waiting when the channel and gain
+    # did not change, otherwise the channel and gain are selected and the new samples are waited for,
+    # NOTE: the single shot measurements of ADC must not be used while the stream is running
+    # (the conversion mode and the gain of the ADS1115 are shared)
+
+    DATA_RATES: Tuple[int, ...] = (8, 16, 32, 64, 128, 250, 475, 860)
+    DEFAULT_DATA_RATE: int = 860
+    DEFAULT_BUFFER_SIZE: int = 4096
+    # conversions dropped after the channel or gain is changed (the conversion in progress uses the previous input)
+    SETTLING_SAMPLES: int = 1
+
+    def __init__(self, adc: ADC, data_rate: int = DEFAULT_DATA_RATE, buffer_size: int = DEFAULT_BUFFER_SIZE) -> None:
+        if data_rate not in ADCStream.DATA_RATES:
+            raise ValueError(f"Data rate {data_rate} not supported, supported: {ADCStream.DATA_RATES}")
+        self.adc: ADC = adc
+        self._data_rate: int = data_rate
+        self._buffer: SampleRingBuffer = SampleRingBuffer(buffer_size)
+        # selection, buffer and running state are guarded by the condition, waiters are notified on every sample
+        self._condition: threading.Condition = threading.Condition()
+        self._channel: AnalogIn | None = None
+        self._gain: float | None = None
+        self._selection: int = 0  # incremented on every selection, samples of an older selection are dropped
+        self._running: bool = False
+        self._thread: threading.Thread | None = None
+
+    @property
+    def data_rate(self) -> int:
+        return self._data_rate
+
+    @property
+    def is_running(self) -> bool:
+        return self._running
+
+    @property
+    def channel(self) -> AnalogIn | None:
+        return self._channel
+
+    @property
+    def gain(self) -> float | None:
+        return self._gain
+
+    def start(self) -> None:
+        if self._running:
+            return
+        self.adc.adc.data_rate = self._data_rate
+        self.adc.adc.mode = Mode.CONTINUOUS
+        self._running = True
+        self._thread = threading.Thread(target=self._read_samples, name="ADCStream", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.adc.adc.mode = Mode.SINGLE
+        # the samples of the next start are not mixed with the older ones
+        self._channel, self._gain = None, None
+        self._buffer.clear()
+
+    def select(self, channel: AnalogIn, gain: float) -> None:
+        # the buffer contains the samples of one channel and gain
+        with self._condition:
+            if channel is self._channel and gain == self._gain:
+                return
+            self._channel = channel
+            self._gain = gain
+            self._selection += 1
+            self._buffer.clear()
+            self._condition.notify_all()
+
+    def last_samples(self, n: int, timeout_s: float = 1.0) -> Tuple[np.ndarray, np.ndarray]:
+        # (timestamps, voltages) of the last n samples of the selected channel, TimeoutError when not available in time
+        with self._condition:
+            if not self._condition.wait_for(lambda: len(self._buffer) >= n or not self._running, timeout_s) or not self._running:
+                raise TimeoutError(f"{n} ADC samples not available in {timeout_s} s (available: {len(self._buffer)})")
+            timestamps, values = self._buffer.last(n)
+            return timestamps.copy(), values.copy()
+
+    def measure(self, channel: AnalogIn, gain: float, n: int, timeout_s: float | None = None) -> SampleStats:
+        # mean and standard deviation of the last n samples of the channel at the gain
+        if n > self._buffer.size:
+            raise ValueError(f"{n} samples do not fit the buffer of {self._buffer.size} samples")
+        self.select(channel, gain)
+        if timeout_s is None:
+            # all the samples and the settling ones with a margin
+            timeout_s = 2 * (n + ADCStream.SETTLING_SAMPLES + 1) / self._data_rate + 0.1
+        timestamps, voltages = self.last_samples(n, timeout_s)
+        return SampleStats(float(np.mean(voltages)), float(np.std(voltages)), len(voltages), float(timestamps[0]), float(timestamps[-1]))
+
+    def capture(self, channel: AnalogIn, gain: float, duration_s: float, delay_s: float = 0.0) -> Tuple[np.ndarray, np.ndarray]:
+        # burst of the samples of the channel over duration_s (at the data rate) after delay_s
+        n: int = int(np.ceil(duration_s * self._data_rate))
+        skipped: int = int(np.ceil(delay_s * self._data_rate))
+        if n + skipped > self._buffer.size:
+            raise ValueError(f"Capture of {n + skipped} samples does not fit the buffer of {self._buffer.size} samples")
+        self.select(channel, gain)
+        timestamps, voltages = self.last_samples(n + skipped, 2 * (n + skipped + ADCStream.SETTLING_SAMPLES + 1) / self._data_rate + 0.1)
+        return timestamps[skipped:], voltages[skipped:]
+
+    def wait_until_stable(self, channel: AnalogIn, gain: float, window: int, max_drift_V: float, max_std_V: float,
+                          timeout_s: float, min_time_s: float = 0.0, baseline_V: float | None = None, min_change_V: float = 0.0) -> Tuple[bool, float]:
+        # (stable, time since the call [s]) when the last `window` samples of the channel meet the criterion
+        # (see is_signal_stable) and at least min_time_s elapsed, (False, timeout_s) when not stable in time,
+        # the criterion is evaluated every quarter of the window,
+        # baseline_V: level before the transition being waited for, the mean of the window must have moved away from it
+        # by min_change_V (a signal that did not start to change yet is stable too)
+        start: float = time.perf_counter()
+        deadline: float = start + timeout_s
+        step: int = max(1, window // 4)
+        self.select(channel, gain)
+        with self._condition:
+            checked: int = 0
+            while True:
+                if not self._condition.wait_for(lambda: not self._running or (len(self._buffer) >= window and self._buffer.count >= checked + step),
+                                                deadline - time.perf_counter()) or not self._running:
+                    return False, timeout_s
+                checked = self._buffer.count
+                timestamps, voltages = self._buffer.last(window)
+                if baseline_V is not None and abs(float(np.mean(voltages)) - baseline_V) < min_change_V:
+                    continue
+                if timestamps[0] - start >= min_time_s and is_signal_stable(timestamps, voltages, max_drift_V, max_std_V):
+                    return True, float(timestamps[-1] - start)
+
+    def _read_samples(self) -> None:
+        period_s: float = 1 / self._data_rate
+        next_sample: float = time.perf_counter()
+        selection: int = -1
+        settling: int = 0
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._channel is not None or not self._running)
+                if not self._running:
+                    return
+                channel, gain = self._channel, self._gain
+                if selection != self._selection:
+                    selection = self._selection
+                    settling = ADCStream.SETTLING_SAMPLES
+                    self._select_gain(gain)
+
+            # one read per conversion, the conversion is read after it is finished
+            next_sample = max(next_sample + period_s, time.perf_counter())
+            time.sleep(max(0.0, next_sample - time.perf_counter()))
+            voltage: float = channel.voltage
+            timestamp: float = time.perf_counter()
+
+            with self._condition:
+                if selection != self._selection:
+                    continue
+                if settling > 0:
+                    settling -= 1
+                    continue
+                self._buffer.append(timestamp, voltage)
+                self._condition.notify_all()
+
+    def _select_gain(self, gain: float) -> None:
+        self.adc.set_adc_gain(gain)
+        # adafruit_ads1x15 writes the configuration (with the gain) in the continuous mode only when the inputs change
+        self.adc.adc._last_pin_read = None
+
+    def __enter__(self) -> "ADCStream":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.stop()
+
+
+class TestSampleRingBuffer(unittest.TestCase):
+
+    def test_wrap_around(self):
+        buffer = SampleRingBuffer(4)
+        for i in range(6):
+            buffer.append(i / 10, i)
+        timestamps, values = buffer.last(3)
+        self.assertEqual(values.tolist(), [3, 4, 5])
+        self.assertEqual(timestamps.tolist(), [0.3, 0.4, 0.5])
+        self.assertEqual(buffer.last(10)[1].tolist(), [2, 3, 4, 5])
+        self.assertEqual((len(buffer), buffer.count), (4, 6))
+        buffer.clear()
+        self.assertEqual(len(buffer.last(3)[1]), 0)
+
+
+class TestMeasurementPlan(unittest.TestCase):
+
+    def test_schedule(self):
+        button_led, feedback, acs723 = object(), object(), object()
+        plan = MeasurementPlan()
+        plan.add("button_led", button_led, 2 / 3, 5).add("feedback", feedback, 8, 5).add("acs723", acs723, 8, 5).add("acs723_again", acs723, 8, 10)
+        schedule = plan.schedule(current_gain=8)
+        self.assertEqual([(gain, names) for gain, _, _, names, _ in schedule], [(8, ["feedback"]), (8, ["acs723", "acs723_again"]), (2 / 3, ["button_led"])])
+        self.assertEqual(schedule[1][2], 10)
+
+
+class TestSequentialTest(unittest.TestCase):
+
+    def test_early_stop(self):
+        test = SequentialTest((1.0, 2.0), 3, 20)
+        self.assertEqual(test.min_samples, SequentialTest.MIN_SAMPLES)
+        # far inside and far outside the limits
+        self.assertTrue(test.is_decided([1.5, 1.51, 1.49, 1.5, 1.5]))
+        self.assertTrue(test.is_decided([2.5, 2.51, 2.49, 2.5, 2.5]))
+        # on the limit: until the maximum
+        self.assertFalse(test.is_decided([1.99, 2.01, 2.0, 2.0, 2.0]))
+        self.assertTrue(test.is_decided([1.99, 2.01] * 10))
+        self.assertFalse(test.is_decided([1.5, 1.5, 1.5, 1.5]))
+
+    def test_small_sample(self):
+        # 5 samples just inside the margin: decided with the normal quantile (2.58), not with the t quantile of 4 degrees of freedom (4.6)
+        values = [1.97, 1.975, 1.98, 1.975, 1.97]
+        self.assertGreater(2.0 - 0.02 - float(np.mean(values)), 2.58 * standard_error(values))
+        self.assertFalse(SequentialTest((1.0, 2.0), 5, 20).is_decided(values))
+
+    def test_quantization_floor(self):
+        # identical samples (noise below the LSB): the standard error is the quantization noise, not zero
+        lsb = lsb_V(GAIN.GAIN_23.value)
+        self.assertAlmostEqual(standard_error([1.0] * 5, lsb), lsb / math.sqrt(12))
+        # the confidence interval still has to clear the margin
+        test = SequentialTest((0.0, 1.0), 5, 20, lsb=1.0)
+        self.assertFalse(test.is_decided([0.5] * 5))
+        self.assertTrue(SequentialTest((0.0, 1.0), 5, 20).is_decided([0.5] * 5))
+
+    def test_student_t(self):
+        for df in (1, 2, 5, 10, 30):
+            self.assertAlmostEqual(student_t_cdf(t_critical_99(df), df), 0.995, delta=0.0005)
+            self.assertAlmostEqual(student_t_cdf(-t_critical_99(df), df), 0.005, delta=0.0005)
+        self.assertEqual(student_t_cdf(0.0, 4), 0.5)
+        self.assertEqual(t_critical_99(45), T_CRITICAL_99[40])
+        self.assertAlmostEqual(student_t_cdf(2.0, 1000), 0.5 * (1 + math.erf(2.0 / math.sqrt(2))), delta=0.001)
+
+
+class TestSquareWave(unittest.TestCase):
+
+    def test_analysis(self):
+        timestamps = np.arange(0, 0.6, 1 / 860)
+        # 5 Hz, 30 % duty cycle, 0.1 V / 0.6 V with noise
+        values = np.where((timestamps + 0.03) % 0.2 < 0.06, 0.6, 0.1) + np.random.normal(0, 0.002, len(timestamps))
+        wave = analyze_square_wave(timestamps, values)
+        self.assertAlmostEqual(wave.frequency_Hz, 5, delta=0.05)
+        self.assertAlmostEqual(wave.duty_cycle, 0.3, delta=0.01)
+        self.assertAlmostEqual(wave.high_level, 0.6, delta=0.002)
+        self.assertAlmostEqual(wave.low_level, 0.1, delta=0.002)
+        self.assertEqual(wave.periods, 2)
+
+    def test_constant(self):
+        self.assertIsNone(analyze_square_wave(np.arange(0, 0.5, 1 / 860), np.full(430, 0.5)))
+
+
+class TestADCStream(unittest.TestCase):
+    # NOTE: runs on the simulated hardware (SCILIF_HAL=simulated python -m unittest lib.adc)
+
+    def setUp(self):
+        from lib.hal import I2C, board
+        from lib.simulated_ads1115 import set_channel_signal
+        set_channel_signal(ADS.P2, 1.5, noise_V=0.002)
+        set_channel_signal(ADS.P3, 0.2, noise_V=0.0)
+
+        class TestBoard:
+            i2c = I2C(board.SCL, board.SDA)
+
+        self.adc = ADC(TestBoard())
+        self.stream = ADCStream(self.adc, data_rate=860)
+        self.stream.start()
+
+    def tearDown(self):
+        self.stream.stop()
+
+    def test_measure(self):
+        stats = self.stream.measure(AnalogIn(self.adc.adc, ADS.P2), GAIN.GAIN_1.value, 20)
+        self.assertAlmostEqual(stats.mean, 1.5, delta=0.005)
+        self.assertLess(stats.std, 0.01)
+        self.assertEqual(stats.count, 20)
+        # sample timestamps follow the data rate
+        self.assertGreaterEqual(stats.end - stats.start, 19 / 860 * 0.9)
+
+    def test_switch_channel(self):
+        self.stream.measure(AnalogIn(self.adc.adc, ADS.P2), GAIN.GAIN_1.value, 5)
+        stats = self.stream.measure(AnalogIn(self.adc.adc, ADS.P3), GAIN.GAIN_4.value, 5)
+        self.assertAlmostEqual(stats.mean, 0.2, delta=0.001)
+        self.assertEqual(self.adc.adc.gain, GAIN.GAIN_4.value)
+
+    def test_wait_until_stable(self):
+        from lib.simulated_ads1115 import set_channel_signal
+        start = time.perf_counter()
+        # exponential settling (time constant 20 ms) towards 1 V
+        set_channel_signal(ADS.P2, lambda now: 1.0 - 0.5 * np.exp(-(now - start) / 0.02), noise_V=0.0005)
+        stable, settle_time_s = self.stream.wait_until_stable(AnalogIn(self.adc.adc, ADS.P2), GAIN.GAIN_1.value, 43, 0.003, 0.002, 1.0)
+        self.assertTrue(stable)
+        self.assertGreater(settle_time_s, 0.05)
+        self.assertLess(settle_time_s, 0.3)
+        set_channel_signal(ADS.P2, lambda now: now % 1.0, noise_V=0.0)
+        self.assertEqual(self.stream.wait_until_stable(AnalogIn(self.adc.adc, ADS.P2), GAIN.GAIN_1.value, 43, 0.003, 0.002, 0.2), (False, 0.2))
+
+    def test_wait_until_stable_delayed_step(self):
+        from lib.simulated_ads1115 import set_channel_signal
+        # the response starts 150 ms after the transition (e.g. the firmware reacts to the button release late)
+        delay_s = 0.15
+        start = time.perf_counter()
+        set_channel_signal(ADS.P2, lambda now: 0.5 if now - start < delay_s else 1.0 - 0.5 * np.exp(-(now - start - delay_s) / 0.02), noise_V=0.0005)
+        # the pre-transition level is stable
+        stable, settle_time_s = self.stream.wait_until_stable(AnalogIn(self.adc.adc, ADS.P2), GAIN.GAIN_1.value, 43, 0.003, 0.002, 1.0)
+        self.assertTrue(stable)
+        self.assertLess(settle_time_s, delay_s)
+        start = time.perf_counter()
+        stable, settle_time_s = self.stream.wait_until_stable(AnalogIn(self.adc.adc, ADS.P2), GAIN.GAIN_1.value, 43, 0.003, 0.002, 1.0,
+                                                              baseline_V=0.5, min_change_V=0.1)
+        self.assertTrue(stable)
+        self.assertGreater(settle_time_s, delay_s + 0.05)
+        self.assertAlmostEqual(self.stream.measure(AnalogIn(self.adc.adc, ADS.P2), GAIN.GAIN_1.value, 10).mean, 1.0, delta=0.01)
+        # no transition at all: not stable
+        set_channel_signal(ADS.P2, 0.5, noise_V=0.0005)
+        self.assertEqual(self.stream.wait_until_stable(AnalogIn(self.adc.adc, ADS.P2), GAIN.GAIN_1.value, 43, 0.003, 0.002, 0.2,
+                                                       baseline_V=0.5, min_change_V=0.1), (False, 0.2))
+
+    def test_capture(self):
+        timestamps, voltages = self.stream.capture(AnalogIn(self.adc.adc, ADS.P3), GAIN.GAIN_4.value, 0.05, 0.01)
+        self.assertEqual(len(voltages), 43)
+        self.assertTrue(np.all(np.diff(timestamps) > 0))
+
+    def test_buffered_samples(self):
+        channel = AnalogIn(self.adc.adc, ADS.P2)
+        self.stream.measure(channel, GAIN.GAIN_1.value, 10)
+        # the samples of the same channel and gain are already in the buffer
+        start = time.perf_counter()
+        self.stream.measure(channel, GAIN.GAIN_1.value, 10)
+        self.assertLess(time.perf_counter() - start, 5 / 860)
@@ -7,6 +7,8 @@ class CustomConfigParser:
     OVERALL_SECTION_NAME = "OVERALL"
     FIRMWARE_SECTION_PREFIX = "FW_"
     PLATE_SECTION_PREFIX = "PLATE_"
+    AXIS_SECTION_PREFIX = "AXIS_"
+    HEAD_SECTION_PREFIX = "HEAD_"
 
     def __init__(self, config_path: str) -> None:
         self.config_parser: ConfigParser = ConfigParser()
@@ -16,6 +18,17 @@ class CustomConfigParser:
     def get(self, config_section: str, config_parameter: str) -> str:
         return self.config_parser.get(config_section, config_parameter)
 
+    def has(self, config_section: str, config_parameter: str) -> bool:
+        return self.config_parser.has_option(config_section, config_parameter)
+
+    def get_or_default(self, config_section: str, config_parameter: str, default: str) -> str:
+        # optional parameter
+        return self.config_parser.get(config_section, config_parameter, fallback=default)
+
+    def get_bool(self, config_section: str, config_parameter: str, default: bool = False) -> bool:
+        # optional flag (1/0, true/false, yes/no, on/off)
+        return self.config_parser.getboolean(config_section, config_parameter, fallback=default)
+
     def get_all_sections_starting_with(self, section_prefix: str) -> List[str]:
         return list(filter(lambda s: s.startswith(section_prefix), self.config_parser.sections()))
 
@@ -0,0 +1,116 @@
+import json
+import os
+import random
+import sys
+import time
+
+# Fake pickle n14 (PIC14 ICSP programmer) for the simulated hardware,
+# it accepts the commands used by the DPS programmer and takes about as long as the real programmer:
+#   fake_n14.py program <hex file> [erase]
+#   fake_n14.py verify <hex file>
+#   fake_n14.py blank
+#   fake_n14.py session
+# like n14 it prints nothing when the command succeeded
+#
+# session: the process is started once and executes one command per line of stdin (e.g. "program app.hex 1"),
+# the result of every command is a JSON line on stdout: {"returncode": 0, "stdout": "", "stderr": ""},
+# only the programming mode entry of the next device is paid per command, the hex files are loaded once
+#
+# environment variables:
+# - FAKE_N14_TIME_SCALE: multiplier of all latencies (0 --> no waiting)
+# - FAKE_N14_FAILURE_RATE: probability of a failed command (bad contact, the device is not found, 0.0 - 1.0)
+# - FAKE_N14_PROGRAMMED_RATE: probability that the device already holds the firmware (verify succeeds, 0.0 - 1.0),
+#   otherwise the device is blank and verify fails at the first word
+
+FAKE_N14_COMMAND = f"{sys.executable} {os.path.abspath(__file__)}"
+
+# NOTE: latencies estimated for a bit-banged ICSP of a 2K word PIC16F on the Raspberry Pi
+PROCESS_STARTUP_S: float = 0.35  # process start, GPIO setup
+DEVICE_ENTRY_S: float = 0.05  # entering the programming mode, device id
+STARTUP_S: float = PROCESS_STARTUP_S + DEVICE_ENTRY_S
+BULK_ERASE_S: float = 0.1
+WORD_WRITE_S: float = 0.0015
+WORD_VERIFY_S: float = 0.0008
+
+
+def count_hex_words(hex_path: str) -> int:
+    # number of program words of the data records (Intel HEX, 2 bytes per word)
+    data_bytes: int = 0
+    with open(hex_path) as hex_file:
+        for line in hex_file:
+            line = line.strip()
+            if line.startswith(":") and line[7:9] == "00":
+                data_bytes += int(line[1:3], 16)
+    return data_bytes // 2
+
+
+class FakeN14:
+    # Commands of the fake programmer, the word counts of the hex files are cached (path, mtime)
+
+    COMMANDS = ("program", "verify", "blank")
+
+    def __init__(self) -> None:
+        self.time_scale: float = float(os.environ.get("FAKE_N14_TIME_SCALE", "1"))
+        self.failure_rate: float = float(os.environ.get("FAKE_N14_FAILURE_RATE", "0"))
+        self.programmed_rate: float = float(os.environ.get("FAKE_N14_PROGRAMMED_RATE", "0"))
+        self.hex_words: dict[tuple[str, float], int] = {}
+
+    def load_hex(self, hex_path: str) -> int:
+        key: tuple[str, float] = (hex_path, os.path.getmtime(hex_path))
+        if key not in self.hex_words:
+            self.hex_words[key] = count_hex_words(hex_path)
+        return self.hex_words[key]
+
+    def execute(self, argv: [str]) -> tuple[int, str, str]:
+        # (return code, stdout, stderr) of a command, the programming mode is entered for every command
+        if len(argv) == 0 or argv[0] not in FakeN14.COMMANDS:
+            return 2, "", "Usage: n14 program|verify FILE [ERASE] | blank | session\n"
+        command: str = argv[0]
+
+        duration_s: float = DEVICE_ENTRY_S
+        if command == "blank":
+            duration_s += BULK_ERASE_S
+        else:
+            if len(argv) < 2 or not os.path.isfile(os.path.expanduser(argv[1])):
+                return 1, "", f"{sys.argv[0]}: Error: cannot open file\n"
+            words: int = self.load_hex(os.path.expanduser(argv[1]))
+            if command == "program":
+                duration_s += (BULK_ERASE_S if len(argv) < 3 or argv[2] != "0" else 0.0) + words * (WORD_WRITE_S + WORD_VERIFY_S)
+            elif random.random() >= self.programmed_rate:
+                time.sleep((duration_s + WORD_VERIFY_S) * self.time_scale)
+                return 1, f"{sys.argv[0]}: Error: verify failed at 0x0000\n", ""
+            else:
+                duration_s += words * WORD_VERIFY_S
+        time.sleep(duration_s * self.time_scale)
+
+        if random.random() < self.failure_rate:
+            return 1, f"{sys.argv[0]}: Error: device not found\n", ""
+        return 0, "", ""
+
+    def session(self, stdin, stdout) -> int:
+        for line in stdin:
+            argv: [str] = line.split()
+            if not argv:
+                continue
+            if argv[0] == "exit":
+                break
+            returncode, out, err = self.execute(argv)
+            stdout.write(json.dumps({"returncode": returncode, "stdout": out, "stderr": err}) + "\n")
+            stdout.flush()
+        return 0
+
+
+def run(argv: [str]) -> int:
+    n14: FakeN14 = FakeN14()
+    time.sleep(PROCESS_STARTUP_S * n14.time_scale)
+    if len(argv) > 0 and argv[0] == "session":
+        return n14.session(sys.stdin, sys.stdout)
+
+    returncode, out, err = n14.execute(argv)
+    sys.stdout.write(out)
+    sys.stderr.write(err)
+    return returncode
+
+
+if __name__ == "__main__":
+    sys.exit(run(sys.argv[1:]))
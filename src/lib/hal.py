@@ -0,0 +1,19 @@
+from lib.hal_backend import is_simulated
+
+# Hardware abstraction layer: the board, digital pins, I2C and ADS1115 of the Raspberry Pi (Adafruit Blinka)
+# or their simulated counterparts (lib.simulated_hw, lib.simulated_ads1115),
+# the backend is selected when this module is imported for the first time (see lib.hal_backend)
+
+SIMULATED: bool = is_simulated()
+
+if SIMULATED:
+    from lib.simulated_hw import I2C, DigitalInOut, Direction, Pull, board
+    from lib import simulated_ads1115 as ADS
+    from lib.simulated_ads1115 import AnalogIn, Mode
+else:
+    import board
+    from busio import I2C
+    from digitalio import Direction, DigitalInOut, Pull
+    import adafruit_ads1x15.ads1115 as ADS
+    from adafruit_ads1x15.analog_in import AnalogIn
+    from adafruit_ads1x15.ads1x15 import Mode
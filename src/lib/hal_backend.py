@@ -0,0 +1,24 @@
+import os
+import sys
+
+# Selection of the hardware abstraction layer backend (see lib.hal), kept apart from lib.hal
+# so it can be checked without importing any hardware module:
+# - environment variable SCILIF_HAL=simulated
+# - select_simulated_hal() called by the entry point before the hardware modules are imported
+#   (e.g. for the command line flag --simulated of run_cnc_programmer.py / run_final_tester.py)
+# NOTE: the selection is stored in the environment variable, so child processes (e.g. the motion process) inherit it
+
+HAL_ENV_VAR = "SCILIF_HAL"
+HAL_SIMULATED = "simulated"
+HAL_SIMULATED_FLAG = "--simulated"
+
+
+def is_simulated() -> bool:
+    return os.environ.get(HAL_ENV_VAR, "").lower() == HAL_SIMULATED
+
+
+def select_simulated_hal() -> None:
+    # to be called before lib.hal is imported (entry points, benchmarks)
+    if "lib.hal" in sys.modules and not sys.modules["lib.hal"].SIMULATED:
+        raise RuntimeError("Hardware modules were already imported, simulated hardware cannot be selected")
+    os.environ[HAL_ENV_VAR] = HAL_SIMULATED
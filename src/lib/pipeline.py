@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import queue
+import threading
+import time
+import unittest
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Tuple
+
+# Pipeline of stages with resource locks: every stage has its worker thread, the items pass the stages in order
+# (item i + 1 enters a stage after item i left it), the stages of different items run concurrently where the resources permit:
+# a resource is held by an item from the first to the last of its stages using it (e.g. the fixture stays on a DPS
+# from the motion to the measurement), the resources are acquired in the order of the items (no deadlock)
+
+
+class PipelineStage(NamedTuple):
+    name: str
+    # processes the item, False (or an error) --> the item leaves the pipeline and no more items enter it
+    function: Callable[[Any], bool | None]
+    resources: Tuple[str, ...] = ()
+
+
+class PipelineStats:
+
+    def __init__(self, stages: List[str]) -> None:
+        # stage --> time [s] spent processing the items, waiting for the resources
+        self.busy_s: Dict[str, float] = {stage: 0.0 for stage in stages}
+        self.wait_s: Dict[str, float] = {stage: 0.0 for stage in stages}
+        self.items: int = 0
+        self.duration_s: float = 0.0
+
+    def __str__(self) -> str:
+        stages: str = ", ".join(f"{stage} {busy_s:.2f} s (waiting {self.wait_s[stage]:.2f} s)" for stage, busy_s in self.busy_s.items())
+        return f"PipelineStats({self.items} items in {self.duration_s:.2f} s: {stages})"
+
+
+class PipelineScheduler:
+    _END = object()
+
+    def __init__(self, stages: List[PipelineStage]) -> None:
+        self.stages: List[PipelineStage] = stages
+        self._locks: Dict[str, threading.Lock] = {resource: threading.Lock() for stage in stages for resource in stage.resources}
+        # resource --> index of the last stage using it (released after it)
+        self._last_use: Dict[str, int] = {resource: index for index, stage in enumerate(stages) for resource in stage.resources}
+        self._stopped: threading.Event = threading.Event()
+        self.stats: PipelineStats = PipelineStats([stage.name for stage in stages])
+
+    @property
+    def stopped(self) -> bool:
+        return self._stopped.is_set()
+
+    def stop(self) -> None:
+        # no item enters the pipeline anymore, the items in the pipeline pass the remaining stages
+        self._stopped.set()
+
+    def run(self, items: Iterable[Any]) -> List[Any]:
+        # items that passed all the stages (in order), the first error of a stage is raised when the pipeline is finished
+        self._stopped.clear()
+        self.stats = PipelineStats([stage.name for stage in self.stages])
+        queues: List[queue.Queue] = [queue.Queue() for _ in range(len(self.stages) + 1)]
+        errors: List[BaseException] = []
+        # index of the item --> resources held
+        held: Dict[int, List[str]] = {}
+
+        def release(item_id: int, resources: List[str]) -> None:
+            for resource in resources:
+                held[item_id].remove(resource)
+                self._locks[resource].release()
+
+        def worker(index: int) -> None:
+            stage: PipelineStage = self.stages[index]
+            while True:
+                entry = queues[index].get()
+                if entry is PipelineScheduler._END:
+                    queues[index + 1].put(entry)
+                    return
+                item_id, item = entry
+                if index == 0 and self.stopped:
+                    continue
+                start: float = time.perf_counter()
+                for resource in sorted(set(stage.resources) - set(held[item_id])):
+                    self._locks[resource].acquire()
+                    held[item_id].append(resource)
+                started: float = time.perf_counter()
+                try:
+                    proceed: bool = stage.function(item) is not False
+                except BaseException as e:
+                    errors.append(e)
+                    proceed = False
+                self.stats.wait_s[stage.name] += started - start
+                self.stats.busy_s[stage.name] += time.perf_counter() - started
+                if not proceed:
+                    self.stop()
+                    release(item_id, list(held[item_id]))
+                    continue
+                release(item_id, [resource for resource in held[item_id] if self._last_use[resource] == index])
+                queues[index + 1].put(entry)
+
+        start: float = time.perf_counter()
+        threads: List[threading.Thread] = [threading.Thread(target=worker, args=(index,), name=f"pipeline-{stage.name}") for index, stage in enumerate(self.stages)]
+        for thread in threads:
+            thread.start()
+        for item_id, item in enumerate(items):
+            held[item_id] = []
+            queues[0].put((item_id, item))
+        queues[0].put(PipelineScheduler._END)
+        for thread in threads:
+            thread.join()
+        self.stats.duration_s = time.perf_counter() - start
+
+        finished: List[Any] = []
+        while (entry := queues[-1].get()) is not PipelineScheduler._END:
+            finished.append(entry[1])
+        self.stats.items = len(finished)
+        if errors:
+            raise errors[0]
+        return finished
+
+
+def simulate_plate(stage_durations_s: Dict[str, float], stage_resources: Dict[str, Tuple[str, ...]], positions: int) -> float:
+    # plate time [s] of the stages (sleeps of the durations) with the resources of the stages
+    stages: List[PipelineStage] = [PipelineStage(name, lambda item, duration_s=duration_s: time.sleep(duration_s), stage_resources[name])
+                                   for name, duration_s in stage_durations_s.items()]
+    scheduler: PipelineScheduler = PipelineScheduler(stages)
+    scheduler.run(list(range(positions)))
+    return scheduler.stats.duration_s
+
+
+class TestPipelineScheduler(unittest.TestCase):
+
+    def test_order_and_overlap(self):
+        log: List[Tuple[str, int]] = []
+        stages = [PipelineStage(name, lambda item, name=name: (log.append((name, item)), time.sleep(0.02))[0], resources)
+                  for name, resources in (("move", ("fixture",)), ("test", ("fixture",)), ("report", ()))]
+        scheduler = PipelineScheduler(stages)
+        self.assertEqual(scheduler.run([0, 1, 2]), [0, 1, 2])
+        # the fixture stays on the item from the move to the test, the report overlaps the next move
+        self.assertEqual([entry for entry in log if entry[0] != "report"], [("move", 0), ("test", 0), ("move", 1), ("test", 1), ("move", 2), ("test", 2)])
+        self.assertLess(scheduler.stats.duration_s, 9 * 0.02)
+
+    def test_independent_resources(self):
+        # every stage has its own resource --> the stages of consecutive items overlap completely
+        duration_s = simulate_plate({"a": 0.02, "b": 0.02, "c": 0.02}, {"a": ("x",), "b": ("y",), "c": ("z",)}, 5)
+        self.assertLess(duration_s, (5 + 2) * 0.02 + 0.04)
+
+    def test_stop(self):
+        stages = [PipelineStage("first", lambda item: item < 2, ("r",)), PipelineStage("second", lambda item: time.sleep(0.01), ("r",))]
+        scheduler = PipelineScheduler(stages)
+        # the items in the pipeline are finished
+        self.assertEqual(scheduler.run(range(5)), [0, 1])
+        self.assertTrue(scheduler.stopped)
+        # the resources were released
+        self.assertFalse(scheduler._locks["r"].locked())
+
+    def test_error(self):
+        def fail(item):
+            raise ValueError(item)
+
+        scheduler = PipelineScheduler([PipelineStage("ok", lambda item: None, ("r",)), PipelineStage("fail", fail)])
+        with self.assertRaises(ValueError):
+            scheduler.run(range(3))
+        self.assertFalse(scheduler._locks["r"].locked())
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import random
+import time
+import unittest
+from typing import Callable
+
+# Simulated ADS1115 (adafruit_ads1x15.ads1115 and adafruit_ads1x15.analog_in API),
+# the voltage of every input is a configurable signal (constant or function of time) with gaussian noise,
+# a reading takes the conversion time of the data rate and is quantized and clipped by the programmable gain amplifier
+
+P0: int = 0
+P1: int = 1
+P2: int = 2
+P3: int = 3
+
+# gain: full scale range [V]
+GAIN_FULL_SCALE: dict[float, float] = {2 / 3: 6.144, 1: 4.096, 2: 2.048, 4: 1.024, 8: 0.512, 16: 0.256}
+DEFAULT_DATA_RATE: int = 128
+DATA_RATES: tuple[int, ...] = (8, 16, 32, 64, 128, 250, 475, 860)
+
+
+class Mode:
+    CONTINUOUS = 0x0000
+    SINGLE = 0x0100
+
+
+class ChannelSignal:
+    def __init__(self, signal: float | Callable[[float], float] = 0.0, noise_V: float = 0.0) -> None:
+        # signal: voltage [V] or a function of time.perf_counter() returning the voltage
+        self.signal: float | Callable[[float], float] = signal
+        self.noise_V: float = noise_V
+
+    def sample(self, now: float) -> float:
+        voltage: float = self.signal(now) if callable(self.signal) else self.signal
+        return voltage + (random.gauss(0.0, self.noise_V) if self.noise_V > 0 else 0.0)
+
+
+DEFAULT_ADDRESS: int = 0x48
+
+# I2C address of the ADS1115 --> channel --> signal (several ADS1115 on one bus)
+channel_signals: dict[int, dict[int, ChannelSignal]] = {}
+
+
+def get_channel_signals(address: int = DEFAULT_ADDRESS) -> dict[int, ChannelSignal]:
+    if address not in channel_signals:
+        channel_signals[address] = {channel: ChannelSignal() for channel in (P0, P1, P2, P3)}
+    return channel_signals[address]
+
+
+def set_channel_signal(channel: int, signal: float | Callable[[float], float], noise_V: float = 0.0, address: int = DEFAULT_ADDRESS) -> None:
+    get_channel_signals(address)[channel] = ChannelSignal(signal, noise_V)
+
+
+class ADS1115:
+    # NOTE: simulate_conversion_time=False returns readings immediately (e.g. for unit tests)
+    simulate_conversion_time: bool = True
+
+    def __init__(self, i2c, gain: float = 1, data_rate: int | None = None, mode: int = Mode.SINGLE, address: int = DEFAULT_ADDRESS) -> None:
+        self.i2c = i2c
+        self.address: int = address
+        self._gain: float = gain
+        self.data_rate: int = DEFAULT_DATA_RATE if data_rate is None else data_rate
+        self.mode: int = mode
+        # continuous mode: the conversions of the last configured inputs run since the configuration (like adafruit_ads1x15,
+        # the inputs are configured again only when they change)
+        self._last_pin_read: tuple[int, int | None] | None = None
+        self._continuous_started_at: float = 0.0
+        self._last_conversion: tuple[int, int] = (-1, 0)  # (index of the conversion, value)
+
+    @property
+    def gain(self) -> float:
+        return self._gain
+
+    @gain.setter
+    def gain(self, gain: float) -> None:
+        if gain not in GAIN_FULL_SCALE:
+            raise ValueError("Gain must be one of: {}".format(list(GAIN_FULL_SCALE)))
+        self._gain = gain
+
+    def read(self, positive_pin: int, negative_pin: int | None = None) -> int:
+        if self.mode == Mode.CONTINUOUS:
+            if self._last_pin_read != (positive_pin, negative_pin):
+                self._last_pin_read = (positive_pin, negative_pin)
+                self._continuous_started_at = time.perf_counter()
+                self._last_conversion = (-1, 0)
+                if ADS1115.simulate_conversion_time:
+                    time.sleep(1 / self.data_rate)
+            # latest finished conversion
+            index: int = int((time.perf_counter() - self._continuous_started_at) * self.data_rate)
+            if index != self._last_conversion[0]:
+                self._last_conversion = (index, self._convert(positive_pin, negative_pin))
+            return self._last_conversion[1]
+
+        self._last_pin_read = None
+        if ADS1115.simulate_conversion_time:
+            time.sleep(1 / self.data_rate)
+        return self._convert(positive_pin, negative_pin)
+
+    def _convert(self, positive_pin: int, negative_pin: int | None) -> int:
+        now: float = time.perf_counter()
+        signals: dict[int, ChannelSignal] = get_channel_signals(self.address)
+        voltage: float = signals[positive_pin].sample(now)
+        if negative_pin is not None:
+            voltage -= signals[negative_pin].sample(now)
+        full_scale: float = GAIN_FULL_SCALE[self._gain]
+        return max(-32768, min(32767, round(voltage / full_scale * 32768)))
+
+
+class AnalogIn:
+    def __init__(self, ads: ADS1115, positive_pin: int, negative_pin: int | None = None) -> None:
+        self._ads: ADS1115 = ads
+        self._positive_pin: int = positive_pin
+        self._negative_pin: int | None = negative_pin
+
+    @property
+    def value(self) -> int:
+        return self._ads.read(self._positive_pin, self._negative_pin)
+
+    @property
+    def voltage(self) -> float:
+        return self.value / 32768 * GAIN_FULL_SCALE[self._ads.gain]
+
+
+class TestSimulatedADS1115(unittest.TestCase):
+
+    def setUp(self):
+        ADS1115.simulate_conversion_time = False
+        self.ads = ADS1115(None)
+
+    def tearDown(self):
+        ADS1115.simulate_conversion_time = True
+
+    def test_differential_voltage(self):
+        set_channel_signal(P0, 2.9)
+        set_channel_signal(P1, 2.5)
+        self.ads.gain = 1
+        self.assertAlmostEqual(AnalogIn(self.ads, P0, P1).voltage, 0.4, places=3)
+
+    def test_gain_clipping(self):
+        set_channel_signal(P2, 1.0)
+        self.ads.gain = 8
+        self.assertAlmostEqual(AnalogIn(self.ads, P2).voltage, 0.512, places=3)
+
+    def test_continuous_mode(self):
+        set_channel_signal(P2, lambda now: now, noise_V=0.0)
+        self.ads.gain = 2 / 3
+        self.ads.mode = Mode.CONTINUOUS
+        self.ads.data_rate = 8
+        channel = AnalogIn(self.ads, P2)
+        # the same conversion until the next one finishes
+        self.assertEqual(channel.value, channel.value)
+
+    def test_addresses(self):
+        set_channel_signal(P2, 1.0)
+        set_channel_signal(P2, 2.0, address=0x49)
+        self.ads.gain = 1
+        self.assertAlmostEqual(AnalogIn(self.ads, P2).voltage, 1.0, places=3)
+        self.assertAlmostEqual(AnalogIn(ADS1115(None, gain=1, address=0x49), P2).voltage, 2.0, places=3)
+
+    def test_noise(self):
+        set_channel_signal(P3, lambda now: 2.0, noise_V=0.01)
+        self.ads.gain = 2 / 3
+        readings = [AnalogIn(self.ads, P3).voltage for _ in range(200)]
+        self.assertAlmostEqual(sum(readings) / len(readings), 2.0, delta=0.005)
+        self.assertGreater(max(readings) - min(readings), 0.01)
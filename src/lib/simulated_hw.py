@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import threading
+import time
+import unittest
+from collections import deque
+from enum import Enum
+from types import SimpleNamespace
+from typing import Callable, Deque, List, Tuple
+
+# Simulated Adafruit Blinka (board, digitalio, busio) for running the applications off the Raspberry Pi,
+# every change of an output pin is recorded with its timestamp (see PinRecorder)
+
+
+class Pin:
+    def __init__(self, name: str, pin_id: int) -> None:
+        self.name: str = name
+        self.id: int = pin_id
+
+    def __repr__(self) -> str:
+        return self.name
+
+
+# board module: D0 - D27, I2C pins are aliases of D2 and D3
+board = SimpleNamespace(**{f"D{pin_id}": Pin(f"D{pin_id}", pin_id) for pin_id in range(28)})
+board.SDA = board.D2
+board.SCL = board.D3
+
+
+class Direction(Enum):
+    INPUT = 0
+    OUTPUT = 1
+
+
+class Pull(Enum):
+    UP = 1
+    DOWN = 2
+
+
+class PinRecorder:
+    # Timestamped pin changes (time.perf_counter_ns, pin name, value) of the whole process,
+    # listeners are called on every change (e.g. a simulated device reacting to its inputs)
+
+    MAX_EVENTS: int = 1000000
+
+    def __init__(self) -> None:
+        self.events: Deque[Tuple[int, str, bool]] = deque(maxlen=PinRecorder.MAX_EVENTS)
+        self.levels: dict[int, bool] = {}
+        self.listeners: List[Callable[[str, bool], None]] = []
+        self.lock: threading.Lock = threading.Lock()
+
+    def write(self, pin: Pin, value: bool) -> None:
+        value = bool(value)
+        with self.lock:
+            if self.levels.get(pin.id) == value:
+                return
+            self.levels[pin.id] = value
+            self.events.append((time.perf_counter_ns(), pin.name, value))
+        for listener in self.listeners:
+            listener(pin.name, value)
+
+    def read(self, pin: Pin) -> bool:
+        return self.levels.get(pin.id, False)
+
+    def set_input(self, pin: Pin, value: bool) -> None:
+        # drive an input pin from the simulation (not recorded)
+        self.levels[pin.id] = bool(value)
+
+    def add_listener(self, listener: Callable[[str, bool], None]) -> None:
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[str, bool], None]) -> None:
+        self.listeners.remove(listener)
+
+    def count(self, pin: Pin, value: bool = True) -> int:
+        # number of changes of the pin to the value (e.g. number of step pulses)
+        return sum(1 for _, name, level in list(self.events) if name == pin.name and level == value)
+
+    def clear(self) -> None:
+        self.events.clear()
+
+
+pin_recorder: PinRecorder = PinRecorder()
+
+
+class DigitalInOut:
+    def __init__(self, pin: Pin) -> None:
+        self._pin: Pin = pin
+        self.direction: Direction = Direction.INPUT
+        self.pull: Pull | None = None
+
+    @property
+    def value(self) -> bool:
+        return pin_recorder.read(self._pin)
+
+    @value.setter
+    def value(self, value: bool) -> None:
+        if self.direction == Direction.OUTPUT:
+            pin_recorder.write(self._pin, value)
+
+    def deinit(self) -> None:
+        pass
+
+
+class I2C:
+    def __init__(self, scl: Pin, sda: Pin) -> None:
+        self.scl: Pin = scl
+        self.sda: Pin = sda
+
+    def deinit(self) -> None:
+        pass
+
+
+class TestSimulatedHW(unittest.TestCase):
+
+    def setUp(self):
+        pin_recorder.clear()
+
+    def test_pin_changes_recorded(self):
+        pin = DigitalInOut(board.D20)
+        pin.direction = Direction.OUTPUT
+        for _ in range(3):
+            pin.value = True
+            pin.value = True
+            pin.value = False
+        self.assertEqual(pin_recorder.count(board.D20), 3)
+        self.assertEqual(pin_recorder.count(board.D20, False), 3)
+        timestamps = [timestamp for timestamp, _, _ in pin_recorder.events]
+        self.assertEqual(timestamps, sorted(timestamps))
+
+    def test_input_pin(self):
+        pin = DigitalInOut(board.D16)
+        pin.value = True
+        self.assertFalse(pin.value, "Input should not be written")
+        pin_recorder.set_input(board.D16, True)
+        self.assertTrue(pin.value)
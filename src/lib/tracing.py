@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import functools
+import json
+import os
+import threading
+import time
+import unittest
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Iterator, List, Tuple
+
+# Tracing spans: (name, category, start [ns], end [ns], thread id, args) in a bounded in-memory ring buffer,
+# the oldest spans are dropped when the buffer is full,
+# spans can be exported as a Chrome trace (chrome://tracing, https://ui.perfetto.dev)
+
+Span = Tuple[str, str, int, int, int, dict | None]
+
+
+class Tracer:
+    MAX_SPANS: int = 100000
+
+    def __init__(self, max_spans: int = MAX_SPANS) -> None:
+        # NOTE: deque.append is atomic, spans can be recorded from any thread without a lock
+        self.spans: Deque[Span] = deque(maxlen=max_spans)
+        self.enabled: bool = True
+
+    @contextmanager
+    def span(self, name: str, category: str = "", **args) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        start_ns: int = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.spans.append((name, category, start_ns, time.perf_counter_ns(), threading.get_ident(), args or None))
+
+    def traced(self, category: str = "", name: str | None = None) -> Callable:
+        # decorator, the span is named after the function
+        def decorator(function: Callable) -> Callable:
+            span_name: str = function.__qualname__ if name is None else name
+
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.span(span_name, category):
+                    return function(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def now_ns(self) -> int:
+        return time.perf_counter_ns()
+
+    def get_spans(self, since_ns: int = 0) -> List[Span]:
+        return [span for span in list(self.spans) if span[2] >= since_ns]
+
+    def clear(self) -> None:
+        self.spans.clear()
+
+    def export_chrome_trace(self, path: str, since_ns: int = 0) -> None:
+        # complete events ("X"), timestamps in microseconds relative to the first exported span
+        spans: List[Span] = self.get_spans(since_ns)
+        origin_ns: int = min((span[2] for span in spans), default=0)
+        pid: int = os.getpid()
+        events: List[dict] = []
+        for name, category, start_ns, end_ns, thread_id, args in spans:
+            event: dict = {"name": name, "cat": category, "ph": "X", "ts": (start_ns - origin_ns) / 1000, "dur": (end_ns - start_ns) / 1000,
+                           "pid": pid, "tid": thread_id}
+            if args:
+                event["args"] = args
+            events.append(event)
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as trace_file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, trace_file)
+
+
+# tracer of the process
+tracer: Tracer = Tracer()
+
+
+class TestTracer(unittest.TestCase):
+
+    def test_nested_spans(self):
+        test_tracer = Tracer()
+        with test_tracer.span("outer", "test", position=(1, 2)):
+            with test_tracer.span("inner", "test"):
+                pass
+        inner, outer = test_tracer.get_spans()
+        self.assertEqual((inner[0], outer[0]), ("inner", "outer"))
+        self.assertLessEqual(outer[2], inner[2])
+        self.assertLessEqual(inner[3], outer[3])
+        self.assertEqual(outer[5], {"position": (1, 2)})
+
+    def test_ring_buffer(self):
+        test_tracer = Tracer(max_spans=10)
+
+        @test_tracer.traced("test")
+        def work():
+            pass
+
+        for _ in range(25):
+            work()
+        self.assertEqual(len(test_tracer.get_spans()), 10)
+        self.assertTrue(test_tracer.get_spans()[0][0].endswith("work"))
+
+    def test_chrome_trace_export(self):
+        import tempfile
+        test_tracer = Tracer()
+        start_ns = test_tracer.now_ns()
+        with test_tracer.span("plate", "cycle"):
+            time.sleep(0.001)
+        with tempfile.TemporaryDirectory() as directory:
+            test_tracer.export_chrome_trace(f"{directory}/trace.json", start_ns)
+            with open(f"{directory}/trace.json") as trace_file:
+                events = json.load(trace_file)["traceEvents"]
+        self.assertEqual(events[0]["name"], "plate")
+        self.assertEqual(events[0]["ph"], "X")
+        self.assertGreaterEqual(events[0]["dur"], 1000)
@@ -1,7 +1,11 @@
 import sys
 
-from app.final_tester.main import main
+from lib.hal_backend import HAL_SIMULATED_FLAG, select_simulated_hal
 
 if __name__ == "__main__":
     print(sys.argv)
+    # the backend is selected before the hardware modules are imported (see lib.hal_backend)
+    if HAL_SIMULATED_FLAG in sys.argv[1:]:
+        select_simulated_hal()
+    from app.final_tester.main import main
     main(sys.argv[1:])